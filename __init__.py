@@ -1,3 +1,4 @@
+from . import controllers
 from . import models
 from . import wizard
 
@@ -8,8 +9,10 @@ def uninstall_hook(env):
 
     This ensures:
     1. Orphaned database columns are removed
-    2. View inheritances are properly cleaned up
-    3. Standard project form continues to work after uninstallation
+    2. The analytic line cube (materialized view), its dirty table and the
+       analytics indexes on account_move_line/account_analytic_line are dropped
+    3. View inheritances are properly cleaned up
+    4. Standard project form continues to work after uninstallation
     """
     import logging
     _logger = logging.getLogger(__name__)
@@ -45,16 +48,31 @@ def uninstall_hook(env):
                 )
                 env.cr.execute(query)
             except Exception as field_error:
-                _logger.warning(f"Could not drop column {field}: {field_error}")
+                _logger.warning("Could not drop column %s: %s", field, field_error)
         _logger.info("Successfully removed project_statistic database columns")
     except Exception as e:
-        _logger.warning(f"Error during database cleanup: {e}")
+        _logger.warning("Error during database cleanup: %s", e)
 
-    # 2. Remove view inheritance (Odoo will handle this automatically via cascade delete)
+    # 2. Drop the materialized view, the tables and the indexes managed outside of the ORM
+    for statement in (
+        "DROP MATERIALIZED VIEW IF EXISTS project_analytics_line_cube",
+        "DROP TABLE IF EXISTS project_analytics_line_cube_dirty",
+    ):
+        try:
+            env.cr.execute(statement)
+        except Exception as e:
+            _logger.warning("Could not execute %s: %s", statement, e)
+    try:
+        from .models.analytics_indexes import drop_analytics_indexes
+        drop_analytics_indexes(env.cr)
+    except Exception as e:
+        _logger.warning("Could not drop project analytics indexes: %s", e)
+
+    # 3. Remove view inheritance (Odoo will handle this automatically via cascade delete)
     # The view inheritance record will be deleted when the module is uninstalled
     # No manual cleanup needed - Odoo's ORM handles this
 
-    # 3. Verify standard project form still works
+    # 4. Verify standard project form still works
     try:
         # Check if standard project form view exists and is accessible
         standard_form = env.ref('project.edit_project', raise_if_not_found=False)
@@ -63,6 +81,6 @@ def uninstall_hook(env):
         else:
             _logger.warning("Standard project form not found - may need manual verification")
     except Exception as e:
-        _logger.warning(f"Error verifying standard project form: {e}")
+        _logger.warning("Error verifying standard project form: %s", e)
 
     env.cr.commit()
\ No newline at end of file
@@ -25,9 +25,16 @@
     'license': 'LGPL-3',
     'data': [
         'security/ir.model.access.csv',
+        'security/project_analytics_security.xml',
         'data/system_parameters.xml',
+        'data/ir_cron.xml',
+        'wizard/project_analytics_export_wizard_views.xml',
         'views/project_analytics_views.xml',
+        'views/project_analytics_bucket_views.xml',
+        'views/project_analytics_contribution_views.xml',
         'views/hr_employee_views.xml',
+        'views/project_analytics_profile_views.xml',
+        'views/project_analytics_refresh_job_views.xml',
         'wizard/project_refresh_wizard_views.xml',
         'data/menuitem.xml',
     ],
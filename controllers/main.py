@@ -0,0 +1,35 @@
+from odoo import api, http
+from odoo.http import request, content_disposition
+
+from ..models.analytics_export import EXPORT_FORMATS
+
+
+class ProjectAnalyticsExportController(http.Controller):
+
+    @http.route('/project_statistic/export/<int:wizard_id>', type='http', auth='user')
+    def export_project_analytics(self, wizard_id):
+        """
+        Stream the Projektstatistik export configured in a project.analytics.export.wizard.
+
+        The response body is a generator: rows are computed, written and sent chunk by
+        chunk. It runs after this method has returned and the request cursor is closed,
+        so it works with a cursor of its own.
+        """
+        wizard = request.env['project.analytics.export.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            raise request.not_found()
+        wizard.check_access('read')
+
+        content_type = EXPORT_FORMATS[wizard.file_format][0]
+        filename = wizard._get_export_filename()
+        registry, uid, context = request.env.registry, request.env.uid, dict(request.env.context)
+
+        def stream():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                yield from env['project.analytics.export.wizard'].browse(wizard_id)._iter_export()
+
+        return request.make_response(stream(), headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
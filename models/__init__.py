@@ -1,3 +1,17 @@
 from . import project_analytics
+from . import project_analytics_snapshot
+from . import project_analytics_bucket
+from . import project_analytics_contribution
+from . import project_analytics_baseline
+from . import project_analytics_line_cube
+from . import project_analytics_queue
+from . import project_analytics_profile
+from . import project_analytics_refresh_job
+from . import account_analytic_account
+from . import account_analytic_line
+from . import account_move
+from . import account_partial_reconcile
 from . import account_move_line
-from . import hr_employee
\ No newline at end of file
+from . import hr_employee
+from . import ir_config_parameter
+from . import res_company
\ No newline at end of file
@@ -0,0 +1,16 @@
+from odoo import models
+
+
+class AccountAnalyticAccount(models.Model):
+    _inherit = 'account.analytic.account'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'plan_id' in vals:
+            self.env.registry.clear_cache()  # project.project._get_project_account_map
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()  # project.project._get_project_account_map
+        return result
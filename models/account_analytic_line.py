@@ -0,0 +1,35 @@
+from odoo import models, api
+
+from .analytics_indexes import create_analytics_indexes
+
+# Fields aggregated in the project.analytics.line.cube
+CUBE_FIELDS = (
+    'account_id', 'company_id', 'date', 'amount', 'unit_amount', 'is_timesheet', 'employee_id', 'move_line_id',
+)
+
+
+class AccountAnalyticLine(models.Model):
+    _inherit = 'account.analytic.line'
+
+    def init(self):
+        super().init()
+        create_analytics_indexes(self.env.cr, self._table)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['project.analytics.line.cube']._mark_dirty(lines.account_id.ids)
+        return lines
+
+    def write(self, vals):
+        if not any(key in vals for key in CUBE_FIELDS):
+            return super().write(vals)
+        account_ids = set(self.account_id.ids)
+        result = super().write(vals)
+        account_ids.update(self.account_id.ids)
+        self.env['project.analytics.line.cube']._mark_dirty(account_ids)
+        return result
+
+    def unlink(self):
+        self.env['project.analytics.line.cube']._mark_dirty(self.account_id.ids)
+        return super().unlink()
@@ -0,0 +1,38 @@
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def write(self, vals):
+        """
+        Override write to update project analytics when entries are posted, reset to
+        draft or cancelled. The state is stored on the lines as related parent_state,
+        so the account.move.line hooks do not see these changes.
+        """
+        if 'state' not in vals:
+            return super().write(vals)
+
+        lines = self.line_ids
+        before, before_project_ids = lines._get_project_analytics_contributions()
+        result = super().write(vals)
+        after, after_project_ids = lines._get_project_analytics_contributions()
+        lines._apply_project_analytics_changes(before, after, before_project_ids | after_project_ids)
+        return result
+
+    def _get_project_analytics_payments(self):
+        """
+        Paid figures of these entries per project, for reconciliation changes.
+
+        Only customer invoices are evaluated (payments and bank statement lines
+        have no analytic distribution); their invoiced amount does not change on
+        reconciliation, so only the paid part is returned.
+
+        Returns:
+            tuple: ({(project_id, company_id): [0.0, paid, 0.0]}, set of project ids
+                   to recompute instead), see account.move.line._get_project_analytics_contributions()
+        """
+        invoices = self.filtered(lambda move: move.state == 'posted' and move.move_type in ('out_invoice', 'out_refund'))
+        contributions, project_ids = invoices.line_ids._get_project_analytics_contributions()
+        payments = {key: [0.0, paid, 0.0] for key, (_invoiced, paid, _vendor) in contributions.items()}
+        return payments, project_ids
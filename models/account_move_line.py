@@ -1,156 +1,192 @@
 from odoo import models, api
 import logging
 
+from .analytics_indexes import create_analytics_indexes
+
 _logger = logging.getLogger(__name__)
 
+# Fields whose change affects the project analytics of a line
+PROJECT_ANALYTICS_FIELDS = (
+    'analytic_distribution', 'price_subtotal', 'price_total', 'debit', 'credit', 'balance', 'account_id',
+)
+
+# Invoice types updated with deltas -> account types counted for them
+DELTA_ACCOUNT_TYPES = {
+    'out_invoice': ('income', 'income_other'),
+    'in_invoice': ('expense',),
+    'in_refund': ('expense',),
+}
+
 
 class AccountMoveLine(models.Model):
     _inherit = 'account.move.line'
 
+    def init(self):
+        super().init()
+        create_analytics_indexes(self.env.cr, self._table)
+
     @api.model_create_multi
     def create(self, vals_list):
         """
-        Override create to trigger project analytics recomputation.
-        Uses batch processing for better performance.
+        Override create to update the project analytics of posted lines.
         """
         lines = super().create(vals_list)
-        self._trigger_project_analytics_recompute(lines)
+        lines._apply_project_analytics_changes({}, *lines._get_project_analytics_contributions())
         return lines
 
     def write(self, vals):
         """
-        Override write to trigger project analytics recomputation.
-        Only triggers when relevant fields change.
+        Override write to update project analytics incrementally.
+        Only triggers when relevant fields change: the contribution of the changed
+        lines before and after the write is applied as a delta.
         """
+        if not any(key in vals for key in PROJECT_ANALYTICS_FIELDS):
+            return super().write(vals)
+
+        before, before_project_ids = self._get_project_analytics_contributions()
+        if 'analytic_distribution' in vals:
+            distribution_account_ids = self._get_distribution_account_ids()
         result = super().write(vals)
-        
-        # Only trigger recompute if fields that affect project analytics changed
-        if any(key in vals for key in ['analytic_distribution', 'price_subtotal', 'price_total', 'debit', 'credit', 'balance']):
-            self._trigger_project_analytics_recompute(self)
-        
+        after, after_project_ids = self._get_project_analytics_contributions()
+        self._apply_project_analytics_changes(before, after, before_project_ids | after_project_ids)
+        if 'analytic_distribution' in vals:
+            # Locked journal items may still get a new distribution, their baselines are outdated then
+            self.env['project.analytics.baseline']._invalidate_for_move_lines(
+                self, distribution_account_ids | self._get_distribution_account_ids())
+        if 'account_id' in vals:
+            # The financial account decides about Skonto in project.analytics.line.cube
+            self.env['project.analytics.line.cube']._mark_dirty(self.analytic_line_ids.account_id.ids)
         return result
 
     def unlink(self):
         """
-        Override unlink to trigger project analytics recomputation.
-        Captures project IDs before deletion.
+        Override unlink to take the contribution of the deleted lines out of the
+        project analytics. Computed BEFORE deletion so we can still access the data.
         """
-        # Trigger BEFORE deletion so we can still access the data
-        self._trigger_project_analytics_recompute(self)
+        before, project_ids = self._get_project_analytics_contributions()
+        self._apply_project_analytics_changes(before, {}, project_ids)
         return super().unlink()
 
-    def _trigger_project_analytics_recompute(self, lines):
-        """
-        Trigger recomputation of project analytics when move lines with analytic distribution change.
-        
-        Optimizations:
-        - Prefetching for performance
-        - Batch processing in chunks
-        - Error handling per batch
-        - Deduplication of project IDs
-        
-        Args:
-            lines: Recordset of account.move.line records that changed
+    def _get_project_analytics_contributions(self):
         """
-        if not lines:
-            return
+        Contribution of these lines to the stored invoice and bill figures.
+
+        Uses the same rules as project.project._get_customer_invoices_batch() and
+        _get_vendor_bills_batch() (posted, no display lines, income/expense accounts,
+        percentage of price_total, refunds negative, paid via payment ratio), but
+        only reads the given lines, so an edit costs O(changed lines).
 
+        Lines whose change can not be expressed as such a delta are returned as
+        projects to recompute instead:
+        - reversal entries (Storno) and reversed entries, which cancel each other
+        - lines that also produce other costs (customer refunds, debit lines of
+          customer invoices) and lines of other journal entries (e.g. Skonto)
+
+        Returns:
+            tuple: ({(project_id, company_id): [invoiced, paid, vendor]}, set of project ids)
+        """
+        contributions = {}
         project_ids = set()
+        lines = self.filtered(lambda l: l.analytic_distribution and l.parent_state == 'posted')
+        if not lines:
+            return contributions, project_ids
 
-        # Prefetch analytic_distribution for all lines at once
         try:
-            lines_with_distribution = lines.filtered(lambda l: l.analytic_distribution)
-            
-            if not lines_with_distribution:
-                return
-            
-            # Get project plan reference once
-            try:
-                project_plan = self.env.ref('analytic.analytic_plan_projects', raise_if_not_found=False)
-            except Exception as e:
-                _logger.warning(f"Could not load project plan reference: {e}")
-                return
-            
-            if not project_plan:
-                _logger.debug("Project analytic plan not found - skipping recompute trigger")
-                return
-
-            # Collect all analytic account IDs from all lines
-            analytic_account_ids = set()
-            
-            for line in lines_with_distribution:
+            # Cached {analytic_account_id: project_ids} for project plan accounts
+            Project = self.env['project.project']
+            projects_by_account = Project._get_analytic_account_project_map()
+            if not projects_by_account:
+                return contributions, project_ids
+            reversal_move_ids = Project._get_reversal_move_ids(lines.move_id.ids)
+            payment_ratios = Project._get_payment_ratios(lines.move_id.ids)
+
+            for line in lines:
                 try:
-                    for analytic_account_id_str in line.analytic_distribution.keys():
-                        try:
-                            analytic_account_id = int(analytic_account_id_str)
-                            analytic_account_ids.add(analytic_account_id)
-                        except (ValueError, TypeError):
-                            continue
+                    affected = [
+                        (project_id, percentage)
+                        for key, percentage in line.analytic_distribution.items()
+                        for project_id in projects_by_account.get(_to_int(key), ())
+                    ]
+                    if not affected:
+                        continue
+                    move = line.move_id
+                    if not line._is_project_analytics_delta_line(reversal_move_ids):
+                        project_ids.update(project_id for project_id, _percentage in affected)
+                        continue
+                    if line.display_type or line.account_id.account_type not in DELTA_ACCOUNT_TYPES[move.move_type]:
+                        continue
+
+                    payment_ratio = payment_ratios.get(move.id, 0.0)
+                    for project_id, percentage in affected:
+                        line_amount = line.price_total * (percentage or 0.0) / 100.0
+                        if move.move_type == 'in_refund':
+                            line_amount = -abs(line_amount)
+                        totals = contributions.setdefault((project_id, line.company_id.id), [0.0, 0.0, 0.0])
+                        if move.move_type == 'out_invoice':
+                            totals[0] += line_amount
+                            totals[1] += line_amount * payment_ratio
+                        else:
+                            totals[2] += line_amount
                 except Exception as e:
-                    _logger.warning(f"Error parsing analytic_distribution for line {line.id}: {e}")
+                    _logger.warning("Error parsing analytic_distribution for line %s: %s", line.id, e)
                     continue
 
-            if not analytic_account_ids:
-                return
-
-            # Batch-fetch all analytic accounts at once (performance optimization)
-            analytic_accounts = self.env['account.analytic.account'].browse(list(analytic_account_ids))
-            
-            # Filter for project plan accounts only
-            project_analytic_accounts = analytic_accounts.filtered(
-                lambda a: a.exists() and a.plan_id == project_plan
-            )
+        except Exception as e:
+            _logger.error("Error collecting projects for analytics recompute: %s", e, exc_info=True)
 
-            if not project_analytic_accounts:
-                return
+        return contributions, project_ids
 
-            # Find all projects linked to these analytic accounts in one query
-            projects = self.env['project.project'].search([
-                '|',
-                ('analytic_account_id', 'in', project_analytic_accounts.ids),
-                ('account_id', 'in', project_analytic_accounts.ids)
-            ])
+    def _get_distribution_account_ids(self):
+        """Analytic account ids in the distributions of these lines (also from multi-plan keys)."""
+        return {
+            account_id
+            for line in self
+            for key in (line.analytic_distribution or {})
+            for account_id in map(_to_int, key.split(','))
+            if account_id
+        }
 
-            if not projects:
-                return
+    def _is_project_analytics_delta_line(self, reversal_move_ids):
+        """
+        Whether the effect of this posted line on the project figures is exactly its
+        invoice/bill contribution, see _get_project_analytics_contributions().
 
-            project_ids = set(projects.ids)
+        Args:
+            reversal_move_ids: ids of reversal and reversed entries, see
+                project.project._get_reversal_move_ids()
+        """
+        self.ensure_one()
+        move = self.move_id
+        if move.move_type not in DELTA_ACCOUNT_TYPES:
+            return False
+        if move.id in reversal_move_ids:
+            return False
+        # A debit on a customer invoice books a negative analytic line (other costs)
+        return move.move_type != 'out_invoice' or self.balance <= 0
+
+    def _apply_project_analytics_changes(self, before, after, project_ids=()):
+        """
+        Apply the difference between two contribution maps to the project snapshots
+        and queue the projects that need a full recomputation. The line-level
+        contributions of these lines are refreshed right away.
+        """
+        if before or after or project_ids:
+            self.env['project.analytics.contribution'].sudo()._refresh_move_lines(self)
+        deltas = {}
+        for key in set(before) | set(after):
+            old = before.get(key, (0.0, 0.0, 0.0))
+            new = after.get(key, (0.0, 0.0, 0.0))
+            delta = [new_value - old_value for new_value, old_value in zip(new, old)]
+            if any(delta):
+                deltas[key] = delta
+        if deltas:
+            self.env['project.analytics.snapshot']._add_deltas(deltas)
+        if project_ids:
+            self.env['project.analytics.queue']._enqueue(project_ids)
 
-        except Exception as e:
-            _logger.error(f"Error collecting projects for analytics recompute: {e}", exc_info=True)
-            return
 
-        # Batch process projects to avoid memory issues
-        if project_ids:
-            project_ids_list = list(project_ids)
-            chunk_size = 50  # Process 50 projects at a time
-            total_projects = len(project_ids_list)
-            
-            _logger.info(f"Triggering recompute for {total_projects} project(s) in {(total_projects + chunk_size - 1) // chunk_size} batch(es)")
-            
-            for i in range(0, total_projects, chunk_size):
-                chunk = project_ids_list[i:i + chunk_size]
-                chunk_projects = self.env['project.project'].browse(chunk)
-                
-                try:
-                    # Recompute financial data for this batch
-                    chunk_projects._compute_financial_data()
-                    
-                    # Commit after each batch to avoid locking issues
-                    # and to ensure progress is saved even if later batches fail
-                    if not self.env.context.get('defer_commit'):
-                        self.env.cr.commit()
-                    
-                    _logger.info(f"Recomputed financial data for batch {(i // chunk_size) + 1}: {len(chunk_projects)} project(s)")
-                    
-                except Exception as e:
-                    # Log error but continue with next batch
-                    _logger.error(
-                        f"Error recomputing financial data for batch {(i // chunk_size) + 1} "
-                        f"(project IDs: {chunk}): {e}",
-                        exc_info=True
-                    )
-                    # Rollback this batch but continue
-                    if not self.env.context.get('defer_commit'):
-                        self.env.cr.rollback()
-                    continue
\ No newline at end of file
+def _to_int(key):
+    try:
+        return int(key)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,37 @@
+from odoo import models, api
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = 'account.partial.reconcile'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Override create to update the paid figures of projects when invoices are
+        reconciled. A payment run reconciles all its lines in one call, so the
+        affected invoices are evaluated once per batch.
+        """
+        line_ids = {
+            vals[fname]
+            for vals in vals_list
+            for fname in ('debit_move_id', 'credit_move_id')
+            if vals.get(fname)
+        }
+        moves = self.env['account.move.line'].browse(line_ids).move_id
+        before, before_project_ids = moves._get_project_analytics_payments()
+        partials = super().create(vals_list)
+        after, after_project_ids = moves._get_project_analytics_payments()
+        moves.line_ids._apply_project_analytics_changes(before, after, before_project_ids | after_project_ids)
+        return partials
+
+    def unlink(self):
+        """
+        Override unlink to update the paid figures of projects when invoices are
+        unreconciled.
+        """
+        moves = (self.debit_move_id | self.credit_move_id).move_id
+        before, before_project_ids = moves._get_project_analytics_payments()
+        result = super().unlink()
+        after, after_project_ids = moves._get_project_analytics_payments()
+        moves.line_ids._apply_project_analytics_changes(before, after, before_project_ids | after_project_ids)
+        return result
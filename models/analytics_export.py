@@ -0,0 +1,58 @@
+"""
+Streaming file writers for the Projektstatistik export.
+
+The rows come from project.project._iter_analytics_export_rows(), the files are sent
+by the export controller (controllers/main.py) while they are being written.
+"""
+import csv
+import io
+import tempfile
+
+import xlsxwriter
+
+# Projects computed and written per chunk
+EXPORT_CHUNK_SIZE = 200
+
+# Size of the byte blocks handed to the HTTP response
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# file format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv;charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def iter_csv(rows):
+    """CSV file of the rows as byte blocks, each block is sent as soon as it is full."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_BLOCK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_xlsx(rows, sheet_name):
+    """
+    XLSX file of the rows as byte blocks.
+
+    An XLSX file is a zip archive and can only be sent once it is complete. The rows
+    are written in constant_memory mode, which flushes every row to a temporary file,
+    and the finished archive is streamed from disk.
+    """
+    with tempfile.TemporaryFile() as xlsx_file:
+        workbook = xlsxwriter.Workbook(xlsx_file, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        header_format = workbook.add_format({'bold': True})
+        for row_index, row in enumerate(rows):
+            worksheet.write_row(row_index, 0, row, header_format if row_index == 0 else None)
+        workbook.close()
+
+        xlsx_file.seek(0)
+        while block := xlsx_file.read(STREAM_BLOCK_SIZE):
+            yield block
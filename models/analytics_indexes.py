@@ -0,0 +1,50 @@
+"""
+Database indexes supporting the project analytics queries.
+
+Created by the init() of the inherited account.move.line and account.analytic.line
+models and dropped by the module's uninstall_hook.
+"""
+from odoo.tools import sql
+
+# index name -> (table, indexed expressions, method, partial index predicate, required columns)
+ANALYTICS_INDEXES = {
+    # Invoice/bill line candidates: analytic_distribution ?| <analytic account ids>
+    'project_statistic_aml_analytic_distribution_gin': (
+        'account_move_line', ['analytic_distribution'], 'gin',
+        "analytic_distribution IS NOT NULL AND parent_state = 'posted' AND display_type IS NULL",
+        ('analytic_distribution', 'parent_state', 'display_type'),
+    ),
+    # Grouped analytic line query: account_id IN ... AND company_id IN ... AND date range
+    'project_statistic_aal_account_company_date': (
+        'account_analytic_line', ['account_id', 'company_id', 'date'], 'btree',
+        'account_id IS NOT NULL',
+        ('account_id', 'company_id', 'date'),
+    ),
+    # Timesheets per analytic account (ORM engine)
+    'project_statistic_aal_timesheet': (
+        'account_analytic_line', ['account_id', 'date'], 'btree',
+        'is_timesheet',
+        ('account_id', 'date', 'is_timesheet'),
+    ),
+    # Other costs per analytic account (ORM engine)
+    'project_statistic_aal_costs': (
+        'account_analytic_line', ['account_id', 'date'], 'btree',
+        'amount < 0',
+        ('account_id', 'date', 'amount'),
+    ),
+}
+
+
+def create_analytics_indexes(cr, table):
+    """Create the indexes of the given table, skipping those whose columns do not exist."""
+    for name, (index_table, expressions, method, where, columns) in ANALYTICS_INDEXES.items():
+        if index_table != table:
+            continue
+        if not all(sql.column_exists(cr, table, column) for column in columns):
+            continue
+        sql.create_index(cr, name, table, expressions, method=method, where=where)
+
+
+def drop_analytics_indexes(cr):
+    for name in ANALYTICS_INDEXES:
+        cr.execute(f'DROP INDEX IF EXISTS "{name}"')
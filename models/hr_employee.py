@@ -9,3 +9,13 @@ class HrEmployee(models.Model):
         default=1.0,
         help="Human Factor Coefficient - Used to adjust hours booked for this employee in project calculations. Default is 1.0 (100%)."
     )
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'faktor_hfc' in vals:
+            # Adjusted hours are pre-aggregated in project.analytics.line.cube
+            self.env.cr.execute(
+                "SELECT DISTINCT account_id FROM account_analytic_line WHERE employee_id = ANY(%s)", [self.ids]
+            )
+            self.env['project.analytics.line.cube']._mark_dirty(row[0] for row in self.env.cr.fetchall())
+        return result
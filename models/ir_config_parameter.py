@@ -0,0 +1,85 @@
+from collections import namedtuple
+import logging
+
+from odoo import models, api, tools
+
+_logger = logging.getLogger(__name__)
+
+
+def _parse_float(value):
+    return float(value)
+
+
+def _parse_int(value):
+    return int(value)
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _parse_code_list(value):
+    return tuple(code.strip() for code in value.split(',') if code.strip())
+
+
+# System parameters read by the analytics compute path:
+# key -> (attribute name, parser, default value)
+ANALYTICS_PARAMETERS = {
+    'project_analytics.default_hourly_rate': ('default_hourly_rate', _parse_float, 66.0),
+    # Defaults for German SKR03/SKR04
+    'project_analytics.customer_skonto_accounts': (
+        'customer_skonto_accounts', _parse_code_list, ('7300', '7301', '7302', '7303', '2130'),
+    ),
+    'project_analytics.vendor_skonto_accounts': (
+        'vendor_skonto_accounts', _parse_code_list, ('4730', '4731', '4732', '4733', '2670'),
+    ),
+    'project_analytics.queue_batch_size': ('queue_batch_size', _parse_int, 50),
+    'project_analytics.refresh_workers': ('refresh_workers', _parse_int, 1),
+    'project_analytics.snapshot_ttl_minutes': ('snapshot_ttl_minutes', _parse_int, 1560),
+    'project_analytics.profiling_enabled': ('profiling_enabled', _parse_bool, False),
+}
+
+AnalyticsConfig = namedtuple('AnalyticsConfig', [attr for attr, _parser, _default in ANALYTICS_PARAMETERS.values()])
+
+
+def parse_analytics_config(raw_values):
+    """
+    Parse raw project_analytics.* parameter values into an AnalyticsConfig.
+
+    Missing or invalid values fall back to their defaults.
+
+    Args:
+        raw_values: {key: value} as stored in ir.config_parameter
+    """
+    values = {}
+    for key, (attr, parser, default) in ANALYTICS_PARAMETERS.items():
+        raw = raw_values.get(key)
+        if raw in (None, False, ''):
+            values[attr] = default
+            continue
+        try:
+            values[attr] = parser(raw)
+        except (TypeError, ValueError):
+            _logger.warning("Invalid value %r for system parameter %s, using default %r", raw, key, default)
+            values[attr] = default
+    return AnalyticsConfig(**values)
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model
+    @tools.ormcache()
+    def _get_project_analytics_config(self):
+        """
+        All project_analytics.* system parameters, parsed once into typed values.
+
+        Cached per registry. ir.config_parameter create/write/unlink clear the registry
+        cache, and the cache invalidation is signalled to the other workers, so every
+        worker sees new values without reading the parameters per project.
+
+        Returns:
+            AnalyticsConfig
+        """
+        params = self.sudo().search_read([('key', '=like', 'project_analytics.%')], ['key', 'value'])
+        return parse_analytics_config({param['key']: param['value'] for param in params})
@@ -1,9 +1,36 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 import logging
 import json
+from datetime import timedelta
+
+import psycopg2
+
+from odoo.osv import expression
+
+from .analytics_export import EXPORT_CHUNK_SIZE
+from .analytics_profiler import AnalyticsProfiler
+from .skonto_matcher import SkontoPrefixMatcher
 
 _logger = logging.getLogger(__name__)
 
+# All financial figures computed by ProjectAnalytics._compute_financial_data
+FINANCIAL_FIELDS = (
+    'customer_invoiced_amount',
+    'customer_paid_amount',
+    'customer_outstanding_amount',
+    'vendor_bills_total',
+    'customer_skonto_taken',
+    'vendor_skonto_received',
+    'total_costs_net',
+    'total_costs_with_tax',
+    'profit_loss',
+    'negative_difference',
+    'total_hours_booked',
+    'total_hours_booked_adjusted',
+    'labor_costs',
+    'labor_costs_adjusted',
+)
+
 
 class ProjectAnalytics(models.Model):
     _inherit = 'project.project'
@@ -25,19 +52,19 @@ class ProjectAnalytics(models.Model):
     # Customer Invoice fields
     customer_invoiced_amount = fields.Float(
         string='Total Invoiced Amount',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total amount invoiced to customers for this project (NET/NETTO). This includes all posted customer invoices and credit notes that are linked to this project via analytic distribution."
     )
     customer_paid_amount = fields.Float(
         string='Total Paid Amount',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total amount actually paid by customers for this project (NET/NETTO). This is calculated from invoice payments and shows how much money has actually been received."
     )
     customer_outstanding_amount = fields.Float(
         string='Outstanding Amount',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Amount still owed by customers for this project (NET/NETTO). This is the difference between what has been invoiced and what has been paid (Invoiced - Paid). A positive value means money is still owed."
     )
@@ -45,7 +72,7 @@ class ProjectAnalytics(models.Model):
     # Vendor Bill fields
     vendor_bills_total = fields.Float(
         string='Vendor Bills Total',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total amount of vendor bills for this project (NET/NETTO). This includes all posted vendor bills and refunds linked to this project via analytic distribution. These are external costs from suppliers."
     )
@@ -53,13 +80,13 @@ class ProjectAnalytics(models.Model):
     # Skonto (Cash Discount) fields
     customer_skonto_taken = fields.Float(
         string='Customer Cash Discounts (Skonto)',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Cash discounts granted to customers for early payment (Gewährte Skonti). This reduces project revenue. Calculated from expense accounts 7300-7303 and liability account 2130."
     )
     vendor_skonto_received = fields.Float(
         string='Vendor Cash Discounts Received',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Cash discounts received from vendors for early payment (Erhaltene Skonti). This reduces project costs and increases profit. Calculated from income accounts 4730-4733 and asset account 2670."
     )
@@ -67,13 +94,13 @@ class ProjectAnalytics(models.Model):
     # Cost fields
     total_costs_net = fields.Float(
         string='Net Costs (without tax)',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Internal project costs without tax (Nettokosten). This includes labor costs from timesheets plus other internal costs. Vendor bills are tracked separately. This is the net amount before tax."
     )
     total_costs_with_tax = fields.Float(
         string='Total Costs (with tax)',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Internal project costs with tax included (Bruttokosten). This is the total internal costs including VAT. Vendor bills are tracked separately and already include their taxes. NOTE: This field is deprecated - use total_costs_net for accurate calculations."
     )
@@ -81,13 +108,13 @@ class ProjectAnalytics(models.Model):
     # Summary fields
     profit_loss = fields.Float(
         string='Profit/Loss Amount',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Project profitability (Gewinn/Verlust). Calculated as NET amounts: (Invoiced Amount - Customer Skonto) - (Vendor Bills - Vendor Skonto + Internal Net Costs). A positive value indicates profit, negative indicates loss."
     )
     negative_difference = fields.Float(
         string='Negative Differences (losses)',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total project losses as a positive number (Verluste). This shows the absolute value of negative profit/loss. If profit/loss is positive, this field is 0. Useful for tracking and reporting total losses."
     )
@@ -95,190 +122,969 @@ class ProjectAnalytics(models.Model):
     # Labor/Timesheet fields
     total_hours_booked = fields.Float(
         string='Total Hours Booked',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total hours logged in timesheets for this project (Gebuchte Stunden). This includes all timesheet entries from employees working on this project. Used to track resource utilization and calculate labor costs."
     )
     total_hours_booked_adjusted = fields.Float(
         string='Total Hours Booked Bereinigt',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Adjusted total hours based on employee Faktor HFC (Bereinigte Stunden). Calculated as sum of (timesheet hours × employee Faktor HFC) for more accurate project resource tracking."
     )
     labor_costs = fields.Float(
         string='Labor Costs',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Total cost of labor based on timesheets (Personalkosten). Calculated from timesheet entries multiplied by employee hourly rates. This is a major component of internal project costs."
     )
     labor_costs_adjusted = fields.Float(
         string='Labor Costs Bereinigt',
-        compute='_compute_financial_data',
+        compute='_compute_financial_snapshot',
         store=False,
         help="Adjusted labor costs calculated using custom hourly rate (Bereinigte Personalkosten). Calculated as Total Hours Booked Bereinigt × Hourly Rate from system parameter."
     )
 
+    analytics_contribution_ids = fields.One2many(
+        'project.analytics.contribution',
+        'project_id',
+        string='Financial Contributions',
+        readonly=True,
+        help="Invoice and bill lines making up the invoiced, paid and vendor bill figures, with their share in this project."
+    )
+
+    financial_data_as_of = fields.Datetime(
+        string='Figures As Of',
+        compute='_compute_financial_snapshot',
+        store=False,
+        help="When the financial figures were last fully recomputed (the oldest snapshot of the selected companies). Invoices, bills and payments posted since are already included, all other changes after the next recomputation."
+    )
+
     @api.depends()
+    def _compute_financial_snapshot(self):
+        """
+        Read all financial fields from the stored project.analytics.snapshot rows.
+
+        List, pivot, graph and form views only read stored figures; projects without
+        a snapshot for one of the allowed companies are computed once and stored.
+        Use _compute_financial_data() to force a recomputation.
+        """
+        Snapshot = self.env['project.analytics.snapshot']
+        snapshot_values = Snapshot._get_project_values(self._origin)
+        last_computed = Snapshot._get_last_computed(self._origin)
+        for project in self:
+            values = snapshot_values.get(project._origin.id)
+            project.update(values or dict.fromkeys(FINANCIAL_FIELDS, 0.0))
+            project.financial_data_as_of = last_computed.get(project._origin.id, False)
+
     def _compute_financial_data(self):
         """
-        Compute all financial data for the project based on analytic account lines.
+        Recompute all financial data for the projects and store it in their snapshots.
         This is the single source of truth for Odoo v18 accounting.
 
         Uses the standard Odoo project analytic plan (analytic.analytic_plan_projects).
 
         IMPORTANT:
         - All amounts are NET (without tax) for consistency in German accounting.
-        - All computed fields use store=False for real-time calculation.
-        - Fields are computed on-demand whenever displayed (no caching).
-        - This ensures data is always up-to-date with latest invoices/payments/timesheets.
+        - Results are stored per project and company in project.analytics.snapshot,
+          the financial fields on project.project read from there.
+        - Called by the refresh wizard and whenever invoice/bill lines change.
 
         The actual financial data is computed from:
         - account.move.line records (for invoices and vendor bills)
         - account.analytic.line records (for timesheets and other costs)
+
+        The whole recordset is computed in one batch, see _compute_financial_values().
+        Query count, rows and time per phase are collected by an AnalyticsProfiler,
+        see project.analytics.snapshot._refresh_projects().
         """
-        _logger.info(f"=== _compute_financial_data called for {len(self)} project(s) ===")
+        _logger.debug("_compute_financial_data called for %d project(s)", len(self))
 
-        for project in self:
-            _logger.info(f"Computing financial data for project: {project.name} (ID: {project.id})")
-
-            # Initialize all fields
-            customer_invoiced_amount = 0.0
-            customer_paid_amount = 0.0
-            customer_outstanding_amount = 0.0
-            vendor_bills_total = 0.0
-            customer_skonto_taken = 0.0
-            vendor_skonto_received = 0.0
-            total_costs_net = 0.0
-            total_costs_with_tax = 0.0
-            profit_loss = 0.0
-            negative_difference = 0.0
-            total_hours_booked = 0.0
-            total_hours_booked_adjusted = 0.0
-            labor_costs = 0.0
-            labor_costs_adjusted = 0.0
-
-            # Get the analytic account associated with the project (projects plan ONLY)
-            analytic_account = self._get_project_analytic_account(project)
+        self.env['project.analytics.snapshot']._refresh_projects(self)
+        self.invalidate_recordset(list(FINANCIAL_FIELDS) + ['financial_data_as_of'])
+
+    def action_force_refresh_financial_data(self):
+        """
+        Recompute the financial figures of the project now, regardless of the age
+        of its snapshots. Called from the analytics form view button.
+        """
+        self.with_context(
+            project_analytics_operation='force_refresh',
+            project_analytics_rebuild_contributions=True,
+        )._compute_financial_data()
+        return True
+
+    def _compute_financial_values(self):
+        """
+        Batch engine behind _compute_financial_data.
 
+        Resolves the analytic account of every project first and then aggregates
+        customer invoices and vendor bills for all of them in a single pass over the
+        candidate move lines, instead of rescanning every posted line once per project.
+
+        The context keys project_analytics_date_from / project_analytics_date_to
+        restrict all figures to a period, see _get_analytics_date_range().
+
+        Returns:
+            dict: {project_id: {field_name: value}} for every project in self
+        """
+        account_by_project, analytic_accounts = self._get_project_analytic_accounts()
+
+        # Locked periods come from a frozen baseline, only the rest is aggregated live
+        lock_date = self._get_baseline_lock_date()
+        totals = lock_date and analytic_accounts and self._get_totals_with_baseline(analytic_accounts, lock_date)
+        if totals:
+            customer_totals, vendor_totals, analytic_totals = totals
+        else:
+            # 1. + 2. Customer invoices and vendor bills - one scan for all projects
+            customer_totals, vendor_totals = self._get_move_line_totals(analytic_accounts)
+
+            # 3. - 5. Skonto, timesheets and other costs - one analytic line query for all projects
+            analytic_totals = self._get_analytic_line_totals(analytic_accounts)
+
+        # Use custom hourly rate from context or system parameter
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
+        hourly_rate = self.env.context.get('custom_hourly_rate') or config.default_hourly_rate
+
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        values_by_project = {}
+        for project in self:
+            analytic_account = account_by_project[project.id]
             if not analytic_account:
-                _logger.warning(f"No analytic account found for project {project.name} (ID: {project.id})")
-                project.customer_invoiced_amount = 0.0
-                project.customer_paid_amount = 0.0
-                project.customer_outstanding_amount = 0.0
-                project.vendor_bills_total = 0.0
-                project.customer_skonto_taken = 0.0
-                project.vendor_skonto_received = 0.0
-                project.total_costs_net = 0.0
-                project.total_costs_with_tax = 0.0
-                project.profit_loss = 0.0
-                project.negative_difference = 0.0
-                project.total_hours_booked = 0.0
-                project.total_hours_booked_adjusted = 0.0
-                project.labor_costs = 0.0
-                project.labor_costs_adjusted = 0.0
+                _logger.warning("No analytic account found for project %s (ID: %s)", project.name, project.id)
+                values_by_project[project.id] = dict.fromkeys(FINANCIAL_FIELDS, 0.0)
                 continue
 
-            _logger.info(f"Found analytic account: {analytic_account.name} (ID: {analytic_account.id})")
-
-            # 1. Calculate Customer Invoices (Revenue) - NET amounts only
-            customer_data = self._get_customer_invoices_from_analytic(analytic_account)
-            customer_invoiced_amount = customer_data['invoiced']
-            customer_paid_amount = customer_data['paid']
-            _logger.info(f"Customer invoices: invoiced={customer_invoiced_amount}, paid={customer_paid_amount}")
-
-            # 2. Calculate Vendor Bills (Direct Costs) - NET amounts only
-            vendor_data = self._get_vendor_bills_from_analytic(analytic_account)
-            vendor_bills_total = vendor_data['total']
-            _logger.info(f"Vendor bills: total={vendor_bills_total}")
-
-            # 3. Calculate Skonto (Cash Discounts) from analytic lines
-            skonto_data = self._get_skonto_from_analytic(analytic_account)
-            customer_skonto_taken = skonto_data['customer_skonto']
-            vendor_skonto_received = skonto_data['vendor_skonto']
-            _logger.info(f"Skonto: customer={customer_skonto_taken}, vendor={vendor_skonto_received}")
-
-            # 4. Calculate Labor Costs (Timesheets)
-            timesheet_data = self._get_timesheet_costs(analytic_account)
-            total_hours_booked = timesheet_data['hours']
-            total_hours_booked_adjusted = timesheet_data['hours_adjusted']
-            labor_costs = timesheet_data['costs']
-            _logger.info(f"Timesheets: hours={total_hours_booked}, hours_adj={total_hours_booked_adjusted}, costs={labor_costs}")
-
-            # 4b. Calculate Labor Costs Bereinigt (Adjusted Labor Costs)
-            # Use custom hourly rate from context or system parameter
-            hourly_rate = self.env.context.get('custom_hourly_rate')
-            if not hourly_rate:
-                hourly_rate = float(self.env['ir.config_parameter'].sudo().get_param(
-                    'project_analytics.default_hourly_rate', '66.0'
+            values_by_project[project.id] = self._build_financial_values(
+                customer_totals[analytic_account.id],
+                vendor_totals[analytic_account.id],
+                analytic_totals[analytic_account.id],
+                hourly_rate,
+            )
+            if debug:
+                _logger.debug("Computed financial data for project %s (ID: %s): %s",
+                              project.name, project.id, values_by_project[project.id])
+
+        return values_by_project
+
+    def _get_baseline_lock_date(self):
+        """
+        Lock date up to which the frozen baseline is used, or None for a full scan.
+
+        The baseline is only used by the SQL engine, for whole-history figures (no
+        context period) of a single company - which is how snapshots are computed.
+        """
+        if (self._get_aggregation_engine() != 'sql' or any(self._get_analytics_date_range())
+                or len(self.env.companies) != 1):
+            return None
+        return self.env.company._get_project_analytics_lock_date()
+
+    def _get_totals_with_baseline(self, analytic_accounts, lock_date):
+        """
+        Aggregate the figures of all given analytic accounts from the frozen baseline
+        up to lock_date plus what can still change:
+        - invoices, bills and analytic lines dated after the lock date
+        - the outstanding amount of invoices before the lock date that are still open
+        - entries before the lock date that were reversed after it
+        - analytic lines without journal item (timesheets, manual costs), which the
+          lock date does not protect
+
+        So the cost of a recompute scales with the activity in the open period, not
+        with the whole history.
+
+        Returns:
+            tuple: (customer_totals, vendor_totals, analytic_totals) like
+            _get_move_line_totals() and _get_analytic_line_totals(), or None if the
+            aggregation failed and the caller should fall back to the full scan
+        """
+        profiler = AnalyticsProfiler.current()
+        before_lock = self.with_context(project_analytics_date_to=lock_date)
+        after_lock = self.with_context(project_analytics_date_from=lock_date + timedelta(days=1))
+        try:
+            with self.env.cr.savepoint():
+                with profiler.phase('baseline'):
+                    baselines = self.env['project.analytics.baseline']._get_baselines(analytic_accounts, lock_date)
+                with profiler.phase('move_lines'):
+                    live_totals = after_lock._get_move_line_totals_sql(analytic_accounts)
+                    open_totals = before_lock._get_move_line_totals_sql(
+                        analytic_accounts, open_moves_only=True, reversals_until=lock_date)
+                    reversed_totals = before_lock._get_move_line_totals_sql(
+                        analytic_accounts, reversed_after=lock_date)
+                with profiler.phase('analytic_lines'):
+                    analytic_totals = self._get_analytic_line_totals_sql(analytic_accounts, frozen_until=lock_date)
+        except psycopg2.Error as e:
+            _logger.warning("Aggregation with frozen baseline failed, falling back to a full scan: %s", e)
+            return None
+
+        customer_totals = {}
+        vendor_totals = {}
+        for account_id in analytic_accounts.ids:
+            baseline = baselines[account_id]
+            frozen = self._get_frozen_move_totals(baseline, open_totals[account_id], reversed_totals[account_id])
+            live = live_totals[account_id]
+            customer_totals[account_id] = {
+                'invoiced': frozen['invoiced'] + live['invoiced'],
+                'paid': frozen['paid'] + live['paid'],
+            }
+            vendor_totals[account_id] = {'total': frozen['vendor'] + live['vendor']}
+            for key in ('customer_skonto', 'vendor_skonto', 'other_costs'):
+                analytic_totals[account_id][key] += baseline[key]
+        return customer_totals, vendor_totals, analytic_totals
+
+    @api.model
+    def _get_frozen_move_totals(self, baseline, open_totals, reversed_totals):
+        """
+        Current invoice and bill figures of the journal items before a lock date.
+
+        Invoiced and vendor amounts are frozen, minus the entries reversed after the
+        lock date. The paid amount is derived from the outstanding amount, which only
+        still open invoices can have, so fully paid invoices are never rescanned.
+
+        Args:
+            baseline: frozen {'invoiced', 'vendor'}
+            open_totals: {'invoiced', 'paid', 'vendor'} of the still open entries
+            reversed_totals: {'invoiced', 'paid', 'vendor'} of the entries reversed
+                after the lock date
+
+        Returns:
+            dict: {'invoiced', 'paid', 'vendor'}
+        """
+        invoiced = baseline['invoiced'] - reversed_totals['invoiced']
+        outstanding = (
+            (open_totals['invoiced'] - open_totals['paid'])
+            - (reversed_totals['invoiced'] - reversed_totals['paid'])
+        )
+        return {
+            'invoiced': invoiced,
+            'paid': invoiced - outstanding,
+            'vendor': baseline['vendor'] - reversed_totals['vendor'],
+        }
+
+    def _get_project_analytic_accounts(self):
+        """
+        Resolve the project plan analytic account of every project in self.
+
+        Returns:
+            tuple: ({project_id: account.analytic.account or None}, all accounts as recordset)
+        """
+        with AnalyticsProfiler.current().phase('resolve_accounts'):
+            account_by_project = {
+                project.id: self._get_project_analytic_account(project) for project in self
+            }
+            analytic_accounts = self.env['account.analytic.account'].union(
+                *[account for account in account_by_project.values() if account]
+            )
+        return account_by_project, analytic_accounts
+
+    def _compute_monthly_totals(self, move_options=None, analytic_options=None):
+        """
+        Raw figures per project and month, for the monthly buckets.
+
+        Always aggregated in PostgreSQL (one move line and one analytic line query for
+        all projects), restricted to the context date range like
+        _compute_financial_values().
+
+        Args:
+            move_options: keyword arguments for _get_move_line_totals_sql(),
+                False to skip invoices and bills
+            analytic_options: keyword arguments for _get_analytic_line_totals_sql(),
+                False to skip analytic lines
+
+        Returns:
+            dict: {project_id: {month: {'invoiced', 'paid', 'vendor', 'customer_skonto',
+                   'vendor_skonto', 'hours', 'hours_adjusted', 'costs', 'other_costs'}}}
+        """
+        account_by_project, analytic_accounts = self._get_project_analytic_accounts()
+        profiler = AnalyticsProfiler.current()
+        move_totals = analytic_totals = {}
+        if move_options is not False:
+            with profiler.phase('move_lines'):
+                move_totals = self._get_move_line_totals_sql(
+                    analytic_accounts, by_month=True, **(move_options or {}))
+        if analytic_options is not False:
+            with profiler.phase('analytic_lines'):
+                analytic_totals = self._get_analytic_line_totals_sql(
+                    analytic_accounts, by_month=True, **(analytic_options or {}))
+
+        totals_by_account = {}
+        for totals in (move_totals, analytic_totals):
+            for (account_id, month), data in totals.items():
+                month_totals = totals_by_account.setdefault(account_id, {}).setdefault(month, dict(
+                    invoiced=0.0, paid=0.0, vendor=0.0, customer_skonto=0.0, vendor_skonto=0.0,
+                    hours=0.0, hours_adjusted=0.0, costs=0.0, other_costs=0.0,
                 ))
-            labor_costs_adjusted = total_hours_booked_adjusted * hourly_rate
-            _logger.info(f"Labor costs adjusted: {labor_costs_adjusted} (rate: {hourly_rate})")
+                for key, value in data.items():
+                    month_totals[key] += value
+
+        return {
+            project_id: totals_by_account.get(account.id, {})
+            for project_id, account in account_by_project.items()
+            if account
+        }
+
+    def _get_analytics_date_range(self):
+        """
+        Period to aggregate, from the context keys project_analytics_date_from and
+        project_analytics_date_to (dates or ISO strings). Either bound may be None.
+
+        Journal items are filtered on their accounting date, analytic lines on their
+        date.
+
+        Returns:
+            tuple: (date_from, date_to)
+        """
+        context = self.env.context
+        return (
+            fields.Date.to_date(context.get('project_analytics_date_from')),
+            fields.Date.to_date(context.get('project_analytics_date_to')),
+        )
+
+    def _get_analytics_date_domain(self):
+        """Domain on `date` for the context date range, see _get_analytics_date_range()."""
+        date_from, date_to = self._get_analytics_date_range()
+        domain = []
+        if date_from:
+            domain.append(('date', '>=', date_from))
+        if date_to:
+            domain.append(('date', '<=', date_to))
+        return domain
+
+    def _get_aggregation_engine(self):
+        """
+        Return the engine used to aggregate invoice and bill lines.
+
+        'sql' (default) aggregates in PostgreSQL, 'orm' walks the move lines in Python.
+        The ORM path can be forced with the context key project_analytics_engine='orm',
+        e.g. to cross-check results.
+        """
+        return 'orm' if self.env.context.get('project_analytics_engine') == 'orm' else 'sql'
+
+    def _get_move_line_totals(self, analytic_accounts):
+        """
+        Get customer invoice and vendor bill totals for all given analytic accounts.
+
+        Uses the SQL aggregation by default and falls back to the ORM scan if the
+        query fails (e.g. unexpected data in analytic_distribution).
+
+        Returns:
+            tuple: ({account_id: {'invoiced', 'paid'}}, {account_id: {'total'}})
+        """
+        profiler = AnalyticsProfiler.current()
+        if self._get_aggregation_engine() == 'sql':
+            try:
+                with profiler.phase('move_lines'), self.env.cr.savepoint():
+                    totals = self._get_move_line_totals_sql(analytic_accounts)
+            except psycopg2.Error as e:
+                _logger.warning("SQL aggregation of move lines failed, falling back to ORM: %s", e)
+            else:
+                customer_totals = {
+                    account_id: {'invoiced': data['invoiced'], 'paid': data['paid']}
+                    for account_id, data in totals.items()
+                }
+                vendor_totals = {
+                    account_id: {'total': data['vendor']}
+                    for account_id, data in totals.items()
+                }
+                return customer_totals, vendor_totals
+
+        with profiler.phase('customer'):
+            customer_totals = self._get_customer_invoices_batch(analytic_accounts)
+        with profiler.phase('vendor'):
+            vendor_totals = self._get_vendor_bills_batch(analytic_accounts)
+        return customer_totals, vendor_totals
+
+    def _get_move_line_totals_sql(self, analytic_accounts, by_month=False, open_moves_only=False,
+                                  reversals_until=None, reversed_after=None):
+        """
+        Aggregate customer invoices and vendor bills per analytic account in PostgreSQL.
+
+        Expands analytic_distribution with jsonb_each_text and groups by analytic
+        account and move_type, so no account.move.line records are loaded. Applies the
+        same rules as _get_customer_invoices_batch() and _get_vendor_bills_batch():
+        posted lines only, no display lines, income/expense account types, reversal
+        entries (Storno) skipped, refunds negative, paid amount via payment ratio.
+        Lines are restricted to the context date range, see _get_analytics_date_range().
+
+        Args:
+            analytic_accounts: Recordset of account.analytic.account
+            by_month: group by accounting month as well
+            open_moves_only: only moves that are not fully paid (residual left, or a
+                zero total which never counts as paid)
+            reversals_until: only reversals dated on or before this date exclude their
+                original entry (stable figures for a locked period)
+            reversed_after: instead of skipping reversed entries, return only the
+                entries reversed by a reversal dated after this date
+
+        Returns:
+            dict: {analytic_account_id: {'invoiced': amount, 'paid': amount, 'vendor': amount}},
+            keyed by (analytic_account_id, month) if by_month
+        """
+        if by_month:
+            result = {}
+        else:
+            result = {
+                account.id: {'invoiced': 0.0, 'paid': 0.0, 'vendor': 0.0}
+                for account in analytic_accounts
+            }
+        if not analytic_accounts:
+            return result
+
+        self.env['account.move.line'].flush_model([
+            'analytic_distribution', 'parent_state', 'display_type', 'company_id',
+            'price_total', 'account_id', 'move_id', 'date',
+        ])
+        self.env['account.move'].flush_model([
+            'move_type', 'amount_total', 'amount_residual', 'reversed_entry_id', 'date',
+        ])
+        self.env['account.account'].flush_model(['account_type'])
+
+        date_from, date_to = self._get_analytics_date_range()
+        filters = []
+        if date_from:
+            filters.append("AND line.date >= %(date_from)s")
+        if date_to:
+            filters.append("AND line.date <= %(date_to)s")
+        if open_moves_only:
+            filters.append("AND (move.amount_residual <> 0 OR move.amount_total = 0)")
+        if reversed_after:
+            reversal_filter = """AND EXISTS (
+                            SELECT 1 FROM account_move reversal
+                             WHERE reversal.reversed_entry_id = move.id
+                               AND reversal.date > %(reversed_after)s
+                       )"""
+        elif reversals_until:
+            reversal_filter = """AND NOT EXISTS (
+                            SELECT 1 FROM account_move reversal
+                             WHERE reversal.reversed_entry_id = move.id
+                               AND reversal.date <= %(reversals_until)s
+                       )"""
+        else:
+            reversal_filter = """AND NOT EXISTS (
+                            SELECT 1 FROM account_move reversal
+                             WHERE reversal.reversed_entry_id = move.id
+                       )"""
+        month = "date_trunc('month', line.date)::date" if by_month else "NULL::date"
+
+        self.env.cr.execute(f"""
+            SELECT contribution.analytic_account_id,
+                   contribution.month,
+                   contribution.move_type,
+                   SUM(contribution.amount) AS amount,
+                   SUM(contribution.amount * contribution.payment_ratio) AS paid,
+                   COUNT(*) AS allocations
+              FROM (
+                    SELECT dist.account_key::integer AS analytic_account_id,
+                           {month} AS month,
+                           move.move_type,
+                           CASE WHEN move.move_type IN ('out_refund', 'in_refund')
+                                THEN -ABS(line.price_total * dist.percentage::numeric / 100.0)
+                                ELSE line.price_total * dist.percentage::numeric / 100.0
+                           END AS amount,
+                           CASE WHEN move.amount_total <> 0
+                                THEN (move.amount_total - move.amount_residual) / move.amount_total
+                                ELSE 0.0
+                           END AS payment_ratio
+                      FROM account_move_line line
+                      JOIN account_move move ON move.id = line.move_id
+                      JOIN account_account account ON account.id = line.account_id
+                     CROSS JOIN LATERAL jsonb_each_text(line.analytic_distribution) AS dist(account_key, percentage)
+                     WHERE line.analytic_distribution IS NOT NULL
+                       AND line.parent_state = 'posted'
+                       AND line.display_type IS NULL
+                       AND line.analytic_distribution ?| %(account_key_list)s
+                       AND line.company_id IN %(company_ids)s
+                       AND dist.account_key IN %(account_keys)s
+                       {' '.join(filters)}
+                       AND move.reversed_entry_id IS NULL
+                       {reversal_filter}
+                       AND (
+                            (move.move_type IN ('out_invoice', 'out_refund')
+                             AND account.account_type IN ('income', 'income_other'))
+                         OR (move.move_type IN ('in_invoice', 'in_refund')
+                             AND account.account_type = 'expense')
+                       )
+                   ) contribution
+             GROUP BY contribution.analytic_account_id, contribution.month, contribution.move_type
+        """, {
+            'company_ids': tuple(self.env.companies.ids),
+            'account_keys': tuple(str(account_id) for account_id in analytic_accounts.ids),
+            # Key existence on the distribution, served by the partial GIN index
+            'account_key_list': [str(account_id) for account_id in analytic_accounts.ids],
+            'date_from': date_from,
+            'date_to': date_to,
+            'reversals_until': reversals_until,
+            'reversed_after': reversed_after,
+        })
+
+        profiler = AnalyticsProfiler.current()
+        for analytic_account_id, month, move_type, amount, paid, allocations in self.env.cr.fetchall():
+            profiler.count(rows=allocations, matched=allocations)
+            key = (analytic_account_id, month) if by_month else analytic_account_id
+            totals = result.setdefault(key, {'invoiced': 0.0, 'paid': 0.0, 'vendor': 0.0})
+            if move_type in ('out_invoice', 'out_refund'):
+                totals['invoiced'] += float(amount or 0.0)
+                totals['paid'] += float(paid or 0.0)
+            else:
+                totals['vendor'] += float(amount or 0.0)
+
+        return result
+
+    def _get_analytic_line_totals(self, analytic_accounts):
+        """
+        Get skonto, timesheet and other cost figures for all given analytic accounts.
+
+        Uses one grouped SQL query by default and falls back to the per-account ORM
+        helpers if the query fails or the ORM engine is forced.
+
+        Returns:
+            dict: {analytic_account_id: {'customer_skonto', 'vendor_skonto', 'hours',
+                   'hours_adjusted', 'costs', 'other_costs'}}
+        """
+        profiler = AnalyticsProfiler.current()
+        if self._get_aggregation_engine() == 'sql':
+            try:
+                with profiler.phase('analytic_lines'), self.env.cr.savepoint():
+                    return self._get_analytic_line_totals_sql(analytic_accounts)
+            except psycopg2.Error as e:
+                _logger.warning("SQL aggregation of analytic lines failed, falling back to ORM: %s", e)
+
+        result = {}
+        for analytic_account in analytic_accounts:
+            with profiler.phase('skonto'):
+                skonto_data = self._get_skonto_from_analytic(analytic_account)
+            with profiler.phase('timesheet'):
+                timesheet_data = self._get_timesheet_costs(analytic_account)
+            with profiler.phase('other_costs'):
+                other_costs = self._get_other_costs_from_analytic(analytic_account)
+            result[analytic_account.id] = {
+                'customer_skonto': skonto_data['customer_skonto'],
+                'vendor_skonto': skonto_data['vendor_skonto'],
+                'hours': timesheet_data['hours'],
+                'hours_adjusted': timesheet_data['hours_adjusted'],
+                'costs': timesheet_data['costs'],
+                'other_costs': other_costs,
+            }
+        return result
+
+    def _get_analytic_line_totals_sql(self, analytic_accounts, by_month=False, moveless_only=False,
+                                      frozen_until=None, frozen_only=False):
+        """
+        Aggregate skonto, timesheet and other cost figures with one analytic line query.
+
+        Replaces the three account.analytic.line searches of _get_skonto_from_analytic(),
+        _get_timesheet_costs() and _get_other_costs_from_analytic() per project by a
+        single scan grouped by analytic account, so the same rules apply:
+        - Timesheets (is_timesheet): hours, adjusted hours (weighted with the employee
+          Faktor HFC in the database) and costs
+        - Other costs: negative non-timesheet lines not coming from vendor bills
+        - Skonto: lines of non-invoice journal entries whose move line account is one of
+          the precomputed Skonto account ids, see _get_skonto_account_ids()
+        Lines are restricted to the context date range, see _get_analytics_date_range().
+
+        Analytic accounts without changes since the last refresh of
+        project.analytics.line.cube are read from its monthly rows when all date
+        bounds fall on month boundaries; all others are aggregated live.
+
+        Args:
+            analytic_accounts: Recordset of account.analytic.account
+            by_month: group by month of the analytic line date as well
+            moveless_only: only lines without journal item (timesheets, manual costs)
+            frozen_until: skip the lines of journal items dated on or before this date
+                (they are part of a frozen baseline), lines without journal item stay
+            frozen_only: with frozen_until, return only those skipped lines instead
+
+        Returns:
+            dict: {analytic_account_id: {'customer_skonto', 'vendor_skonto', 'hours',
+                   'hours_adjusted', 'costs', 'other_costs'}},
+            keyed by (analytic_account_id, month) if by_month
+        """
+        def empty_totals():
+            return {
+                'customer_skonto': 0.0, 'vendor_skonto': 0.0,
+                'hours': 0.0, 'hours_adjusted': 0.0, 'costs': 0.0,
+                'other_costs': 0.0,
+            }
 
-            # 5. Calculate Other Costs (non-timesheet, non-bill analytic lines)
-            other_costs = self._get_other_costs_from_analytic(analytic_account)
-            _logger.info(f"Other costs: {other_costs}")
+        result = {} if by_month else {account.id: empty_totals() for account in analytic_accounts}
+        if not analytic_accounts:
+            return result
 
-            # 6. Calculate totals - all NET amounts
-            total_costs_net = labor_costs + other_costs
+        self.env['account.analytic.line'].flush_model([
+            'account_id', 'move_line_id', 'unit_amount', 'amount', 'is_timesheet',
+            'employee_id', 'company_id', 'date',
+        ])
+        self.env['account.move.line'].flush_model(['account_id', 'move_id'])
+        self.env['account.move'].flush_model(['move_type'])
+        self.env['hr.employee'].flush_model(['faktor_hfc'])
+
+        # Skonto accounts are resolved to ids once, so the database filters by id
+        skonto_account_ids = self._get_skonto_account_ids()
+
+        date_from, date_to = self._get_analytics_date_range()
+        params = {
+            'company_ids': tuple(self.env.companies.ids),
+            'date_from': date_from,
+            'date_to': date_to,
+            'frozen_until': frozen_until,
+            'customer_skonto_ids': sorted(skonto_account_ids['customer']),
+            'vendor_skonto_ids': sorted(skonto_account_ids['vendor']),
+        }
+
+        # Fast path: pre-aggregated months of the cube, changed accounts stay live
+        live_account_ids = set(analytic_accounts.ids)
+        rows = []
+        Cube = self.env['project.analytics.line.cube']
+        if self._use_analytic_cube(date_from, date_to, frozen_until) and Cube._is_populated():
+            cube_account_ids = live_account_ids - Cube._get_dirty_account_ids(live_account_ids)
+            live_account_ids -= cube_account_ids
+            if cube_account_ids:
+                rows += self._query_analytic_cube(cube_account_ids, params, by_month, moveless_only,
+                                                  frozen_only)
+        if live_account_ids:
+            rows += self._query_analytic_lines(live_account_ids, params, by_month, moveless_only,
+                                               frozen_only)
+
+        profiler = AnalyticsProfiler.current()
+        for (account_id, month, is_timesheet, is_vendor_bill, hours, hours_adjusted, amount_abs, cost_abs,
+                customer_skonto, vendor_skonto, line_count) in rows:
+            profiler.count(rows=line_count)
+            key = (account_id, month) if by_month else account_id
+            totals = result.setdefault(key, empty_totals())
+
+            # Timesheets
+            if is_timesheet:
+                totals['hours'] += float(hours or 0.0)
+                totals['hours_adjusted'] += float(hours_adjusted or 0.0)
+                totals['costs'] += float(amount_abs or 0.0)
+
+            # Other costs (vendor bills are counted separately in vendor_bills_total)
+            elif not is_vendor_bill:
+                totals['other_costs'] += float(cost_abs or 0.0)
+
+            # Skonto - only lines that don't belong to invoices/bills
+            totals['customer_skonto'] += float(customer_skonto or 0.0)
+            totals['vendor_skonto'] += float(vendor_skonto or 0.0)
+
+        return result
+
+    def _use_analytic_cube(self, date_from, date_to, frozen_until):
+        """
+        Whether project.analytics.line.cube can answer an analytic line query: it
+        holds whole months, so all date bounds must fall on month boundaries.
+        """
+        if date_from and date_from != fields.Date.start_of(date_from, 'month'):
+            return False
+        return all(
+            not date or date == fields.Date.end_of(date, 'month')
+            for date in (date_to, frozen_until)
+        )
+
+    def _query_analytic_lines(self, account_ids, params, by_month, moveless_only, frozen_only):
+        """Aggregate account_analytic_line live, see _get_analytic_line_totals_sql()."""
+        filters = []
+        if params['date_from']:
+            filters.append("AND analytic_line.date >= %(date_from)s")
+        if params['date_to']:
+            filters.append("AND analytic_line.date <= %(date_to)s")
+        if moveless_only:
+            filters.append("AND analytic_line.move_line_id IS NULL")
+        if params['frozen_until'] and frozen_only:
+            filters.append("AND analytic_line.move_line_id IS NOT NULL AND analytic_line.date <= %(frozen_until)s")
+        elif params['frozen_until']:
+            filters.append("AND (analytic_line.move_line_id IS NULL OR analytic_line.date > %(frozen_until)s)")
+        month = "date_trunc('month', analytic_line.date)::date" if by_month else "NULL::date"
+
+        # Adjusted hours: hours x employee Faktor HFC, where no employee and a
+        # faktor of 0 count as 1.0 - exactly like `employee.faktor_hfc or 1.0`
+        self.env.cr.execute(f"""
+            SELECT analytic_line.account_id,
+                   {month} AS month,
+                   analytic_line.is_timesheet IS TRUE AS is_timesheet,
+                   move.move_type IN ('in_invoice', 'in_refund') AS is_vendor_bill,
+                   SUM(COALESCE(analytic_line.unit_amount, 0.0)) AS hours,
+                   SUM(COALESCE(analytic_line.unit_amount, 0.0)
+                       * COALESCE(NULLIF(employee.faktor_hfc, 0.0), 1.0)) AS hours_adjusted,
+                   SUM(ABS(COALESCE(analytic_line.amount, 0.0))) AS amount_abs,
+                   SUM(CASE WHEN analytic_line.amount < 0 THEN -analytic_line.amount ELSE 0.0 END) AS cost_abs,
+                   SUM(CASE WHEN line.account_id = ANY(%(customer_skonto_ids)s)
+                             AND move.move_type NOT IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+                            THEN ABS(COALESCE(analytic_line.amount, 0.0)) ELSE 0.0 END) AS customer_skonto,
+                   SUM(CASE WHEN line.account_id = ANY(%(vendor_skonto_ids)s)
+                             AND move.move_type NOT IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+                            THEN ABS(COALESCE(analytic_line.amount, 0.0)) ELSE 0.0 END) AS vendor_skonto,
+                   COUNT(*) AS line_count
+              FROM account_analytic_line analytic_line
+              LEFT JOIN account_move_line line ON line.id = analytic_line.move_line_id
+              LEFT JOIN account_move move ON move.id = line.move_id
+              LEFT JOIN hr_employee employee ON employee.id = analytic_line.employee_id
+             WHERE analytic_line.account_id IN %(account_ids)s
+               AND analytic_line.company_id IN %(company_ids)s
+               {' '.join(filters)}
+             GROUP BY 1, 2, 3, 4
+        """, dict(params, account_ids=tuple(account_ids)))
+        return self.env.cr.fetchall()
+
+    def _query_analytic_cube(self, account_ids, params, by_month, moveless_only, frozen_only):
+        """
+        Same aggregation as _query_analytic_lines(), read from the monthly rows of
+        project.analytics.line.cube. Month bounds are checked by _use_analytic_cube(),
+        so comparing the month start with them is exact.
+        """
+        filters = []
+        if params['date_from']:
+            filters.append("AND cube.month >= %(date_from)s")
+        if params['date_to']:
+            filters.append("AND cube.month <= %(date_to)s")
+        if moveless_only:
+            filters.append("AND NOT cube.has_move_line")
+        if params['frozen_until'] and frozen_only:
+            filters.append("AND cube.has_move_line AND cube.month <= %(frozen_until)s")
+        elif params['frozen_until']:
+            filters.append("AND (NOT cube.has_move_line OR cube.month > %(frozen_until)s)")
+        month = "cube.month" if by_month else "NULL::date"
+
+        self.env.cr.execute(f"""
+            SELECT cube.account_id,
+                   {month} AS month,
+                   cube.is_timesheet,
+                   cube.is_vendor_bill,
+                   SUM(cube.hours) AS hours,
+                   SUM(cube.hours_adjusted) AS hours_adjusted,
+                   SUM(cube.amount_abs) AS amount_abs,
+                   SUM(cube.cost_abs) AS cost_abs,
+                   SUM(CASE WHEN cube.skonto_account_id = ANY(%(customer_skonto_ids)s)
+                            THEN cube.skonto_abs ELSE 0.0 END) AS customer_skonto,
+                   SUM(CASE WHEN cube.skonto_account_id = ANY(%(vendor_skonto_ids)s)
+                            THEN cube.skonto_abs ELSE 0.0 END) AS vendor_skonto,
+                   SUM(cube.line_count) AS line_count
+              FROM project_analytics_line_cube cube
+             WHERE cube.account_id IN %(account_ids)s
+               AND cube.company_id IN %(company_ids)s
+               {' '.join(filters)}
+             GROUP BY 1, 2, 3, 4
+        """, dict(params, account_ids=tuple(account_ids)))
+        return self.env.cr.fetchall()
+
+    def _build_financial_values(self, customer_data, vendor_data, analytic_data, hourly_rate):
+        """
+        Combine the raw aggregates of one analytic account into the financial fields.
+
+        Args:
+            customer_data: {'invoiced', 'paid'}
+            vendor_data: {'total'}
+            analytic_data: {'customer_skonto', 'vendor_skonto', 'hours', 'hours_adjusted',
+                            'costs', 'other_costs'}
+            hourly_rate: rate for the adjusted labor costs
+
+        Returns:
+            dict: {field_name: value} for all fields in FINANCIAL_FIELDS
+        """
+        customer_invoiced_amount = customer_data['invoiced']
+        customer_paid_amount = customer_data['paid']
+        vendor_bills_total = vendor_data['total']
+        customer_skonto_taken = analytic_data['customer_skonto']
+        vendor_skonto_received = analytic_data['vendor_skonto']
+        total_hours_booked_adjusted = analytic_data['hours_adjusted']
+        labor_costs = analytic_data['costs']
+        other_costs = analytic_data['other_costs']
+
+        # 4b. Labor Costs Bereinigt (Adjusted Labor Costs)
+        labor_costs_adjusted = total_hours_booked_adjusted * hourly_rate
+
+        # 6. Calculate totals - all NET amounts
+        total_costs_net = labor_costs + other_costs
+
+        # 7. Calculate Profit/Loss (NET basis with Skonto adjustments)
+        # Revenue: Invoiced amount (NET) - Skonto taken by customers
+        # Costs: Vendor bills (NET) - Skonto received + internal costs (NET)
+        adjusted_revenue = customer_invoiced_amount - customer_skonto_taken
+        adjusted_vendor_costs = vendor_bills_total - vendor_skonto_received
+        profit_loss = adjusted_revenue - (adjusted_vendor_costs + total_costs_net)
 
+        return {
+            'customer_invoiced_amount': customer_invoiced_amount,
+            'customer_paid_amount': customer_paid_amount,
+            'customer_outstanding_amount': customer_invoiced_amount - customer_paid_amount,
+            'vendor_bills_total': vendor_bills_total,
+            'customer_skonto_taken': customer_skonto_taken,
+            'vendor_skonto_received': vendor_skonto_received,
+            'total_costs_net': total_costs_net,
             # total_costs_with_tax is deprecated but kept for backwards compatibility
-            total_costs_with_tax = total_costs_net
-
-            customer_outstanding_amount = customer_invoiced_amount - customer_paid_amount
-
-            # 7. Calculate Profit/Loss (NET basis with Skonto adjustments)
-            # All amounts are NET (without tax) for consistency
-            # Revenue: Invoiced amount (NET) - Skonto taken by customers
-            # Costs: Vendor bills (NET) - Skonto received + internal costs (NET)
-            adjusted_revenue = customer_invoiced_amount - customer_skonto_taken
-            adjusted_vendor_costs = vendor_bills_total - vendor_skonto_received
-            profit_loss = adjusted_revenue - (adjusted_vendor_costs + total_costs_net)
-            negative_difference = abs(min(0, profit_loss))
-
-            _logger.info(f"Final totals: revenue={adjusted_revenue}, costs={adjusted_vendor_costs + total_costs_net}, profit={profit_loss}")
-
-            # Update all computed fields
-            project.customer_invoiced_amount = customer_invoiced_amount
-            project.customer_paid_amount = customer_paid_amount
-            project.customer_outstanding_amount = customer_outstanding_amount
-            project.vendor_bills_total = vendor_bills_total
-            project.customer_skonto_taken = customer_skonto_taken
-            project.vendor_skonto_received = vendor_skonto_received
-            project.total_costs_net = total_costs_net
-            project.total_costs_with_tax = total_costs_with_tax
-            project.profit_loss = profit_loss
-            project.negative_difference = negative_difference
-            project.total_hours_booked = total_hours_booked
-            project.total_hours_booked_adjusted = total_hours_booked_adjusted
-            project.labor_costs = labor_costs
-            project.labor_costs_adjusted = labor_costs_adjusted
-
-            _logger.info(f"=== Finished computing for project {project.name} ===")
+            'total_costs_with_tax': total_costs_net,
+            'profit_loss': profit_loss,
+            'negative_difference': abs(min(0, profit_loss)),
+            'total_hours_booked': analytic_data['hours'],
+            'total_hours_booked_adjusted': total_hours_booked_adjusted,
+            'labor_costs': labor_costs,
+            'labor_costs_adjusted': labor_costs_adjusted,
+        }
 
-    def _get_project_analytic_account(self, project):
+    def _iter_analytics_export_rows(self, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Rows of the Projektstatistik export, computed chunk by chunk.
+
+        Without period, one row per project with the figures of its snapshots (stale
+        snapshots of a chunk are recomputed in one batch, see
+        project.analytics.snapshot._get_project_values()). With a period, one row per
+        project and month with figures, aggregated in PostgreSQL per chunk, see
+        _compute_monthly_totals().
+
+        Only one chunk of projects is held in memory: the record cache is cleared
+        after each chunk, so the memory use does not grow with the number of projects.
+
+        Yields:
+            list: the header row, then one row per project (and month)
+        """
+        months = None
+        if date_from:
+            months = self.env['project.analytics.bucket']._month_range(
+                date_from, date_to or fields.Date.context_today(self))
+
+        header = [self._fields[fname]._description_string(self.env)
+                  for fname in ('name', 'client_name', 'head_of_project')]
+        if months:
+            header.append(self.env['project.analytics.bucket']._fields['month']._description_string(self.env))
+        yield header + [self._fields[fname]._description_string(self.env) for fname in FINANCIAL_FIELDS]
+
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
+        hourly_rate = self.env.context.get('custom_hourly_rate') or config.default_hourly_rate
+        project_ids = self.ids
+        for start in range(0, len(project_ids), chunk_size):
+            chunk = self.browse(project_ids[start:start + chunk_size])
+            if months:
+                monthly_totals = self.env['project.analytics.bucket']._with_period(
+                    chunk, months)._compute_monthly_totals()
+            else:
+                values_by_project = self.env['project.analytics.snapshot']._get_project_values(chunk)
+
+            for project in chunk:
+                dimensions = [project.name, project.partner_id.name or '', project.user_id.name or '']
+                if not months:
+                    values = values_by_project[project.id]
+                    yield dimensions + [values[fname] for fname in FINANCIAL_FIELDS]
+                    continue
+                project_totals = monthly_totals.get(project.id, {})
+                for month in months:
+                    totals = project_totals.get(month)
+                    if not totals:
+                        continue
+                    values = self._build_financial_values(
+                        {'invoiced': totals['invoiced'], 'paid': totals['paid']},
+                        {'total': totals['vendor']},
+                        totals,
+                        hourly_rate,
+                    )
+                    yield dimensions + [fields.Date.to_string(month)] + [values[fname] for fname in FINANCIAL_FIELDS]
+
+            self.env.invalidate_all()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super().create(vals_list)
+        self.env.registry.clear_cache()  # _get_project_account_map
+        return projects
+
+    def write(self, vals):
+        result = super().write(vals)
+        if any(key in vals for key in ('analytic_account_id', 'account_id')):
+            self.env.registry.clear_cache()  # _get_project_account_map
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()  # _get_project_account_map
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_project_account_map(self):
         """
-        Get project's analytic account with proper error handling.
-        Returns the analytic account that belongs to plan_id=1 (project plan), or None.
+        Project plan analytic account of every project, archived ones included.
+
+        The single place where projects are mapped to analytic accounts: the snapshot
+        computation, the journal item delta hooks and the contributions all resolve
+        accounts through it. analytic_account_id is preferred over account_id, only
+        accounts of the project plan (analytic.analytic_plan_projects) count. Cached
+        per registry and invalidated (across workers) whenever a project or an
+        analytic account changes in a way that affects the mapping.
+
+        Returns:
+            frozendict: {project_id: analytic_account_id}
+        """
+        project_plan = self.env.ref('analytic.analytic_plan_projects', raise_if_not_found=False)
+        if not project_plan:
+            _logger.debug("Project analytic plan not found - empty analytic account map")
+            return tools.frozendict()
+
+        account_fields = [fname for fname in ('analytic_account_id', 'account_id') if fname in self._fields]
+        projects = self.sudo().with_context(active_test=False).search_read([], account_fields)
+
+        account_ids = {
+            project[fname][0]
+            for project in projects
+            for fname in account_fields
+            if project[fname]
+        }
+        project_plan_account_ids = set(self.env['account.analytic.account'].sudo().with_context(active_test=False).search([
+            ('id', 'in', list(account_ids)),
+            ('plan_id', '=', project_plan.id),
+        ]).ids)
+
+        account_by_project = {}
+        for project in projects:
+            for fname in account_fields:
+                if project[fname] and project[fname][0] in project_plan_account_ids:
+                    account_by_project[project['id']] = project[fname][0]
+                    break
+        return tools.frozendict(account_by_project)
+
+    @api.model
+    @tools.ormcache()
+    def _get_analytic_account_project_map(self):
         """
-        # Check analytic_account_id first
-        if hasattr(project, 'analytic_account_id') and project.analytic_account_id:
-            # Verify this is plan_id=1 (project plan in German accounting)
-            if hasattr(project.analytic_account_id, 'plan_id') and project.analytic_account_id.plan_id.id == 1:
-                return project.analytic_account_id
+        Reverse index of _get_project_account_map(), used by the account.move.line
+        hooks to resolve affected projects with a dict lookup.
 
-        # Fallback to account_id
-        if hasattr(project, 'account_id') and project.account_id:
-            if hasattr(project.account_id, 'plan_id') and project.account_id.plan_id.id == 1:
-                return project.account_id
+        Returns:
+            frozendict: {analytic_account_id: tuple of project ids}
+        """
+        project_ids_by_account = {}
+        for project_id, account_id in self._get_project_account_map().items():
+            project_ids_by_account.setdefault(account_id, []).append(project_id)
+        return tools.frozendict({
+            account_id: tuple(sorted(project_ids))
+            for account_id, project_ids in project_ids_by_account.items()
+        })
 
-        _logger.info(f"Project '{project.name}' (ID: {project.id}) has no analytic account linked to plan_id=1")
-        return None
+    def _get_project_analytic_account(self, project):
+        """
+        Get the project plan analytic account of a project, see _get_project_account_map().
+        Returns the analytic account, or None.
+        """
+        account_id = self._get_project_account_map().get(project.id)
+        if not account_id:
+            _logger.debug("Project '%s' (ID: %s) has no project plan analytic account", project.name, project.id)
+            return None
+        return self.env['account.analytic.account'].browse(account_id)
 
     def _get_customer_invoices_from_analytic(self, analytic_account):
+        """
+        Get customer invoices and credit notes for a single analytic account.
+        Thin wrapper around _get_customer_invoices_batch().
+
+        Returns:
+            dict: {'invoiced': amount, 'paid': amount}
+        """
+        return self._get_customer_invoices_batch(analytic_account)[analytic_account.id]
+
+    def _get_customer_invoices_batch(self, analytic_accounts):
         """
         Get customer invoices and credit notes via analytic_distribution in account.move.line.
         This is the Odoo v18 way to link invoices to projects.
 
+        All candidate lines are scanned once and each line's distribution is fanned
+        out to every requested analytic account it touches.
+
         IMPORTANT:
         - We calculate project portion based on invoice LINE amounts
         - Uses price_total (includes taxes) to match invoice.amount_total
@@ -288,13 +1094,20 @@ class ProjectAnalytics(models.Model):
         Handles both:
         - out_invoice: Customer invoices (positive revenue)
         - out_refund: Customer credit notes (negative revenue)
-        """
-        result = {'invoiced': 0.0, 'paid': 0.0}
 
-        _logger.info(f"Searching for customer invoices for analytic account: {analytic_account.name} (ID: {analytic_account.id})")
+        Args:
+            analytic_accounts: Recordset of account.analytic.account
 
-        # Find all posted customer invoice/credit note lines with this analytic account
-        invoice_lines = self.env['account.move.line'].search([
+        Returns:
+            dict: {analytic_account_id: {'invoiced': amount, 'paid': amount}}
+        """
+        result = {account.id: {'invoiced': 0.0, 'paid': 0.0} for account in analytic_accounts}
+        if not result:
+            return result
+        account_keys = {str(account_id): account_id for account_id in result}
+
+        # Find all posted customer invoice/credit note lines with an analytic distribution
+        invoice_lines = self.env['account.move.line'].search(self._get_analytics_date_domain() + [
             ('analytic_distribution', '!=', False),
             ('parent_state', '=', 'posted'),
             ('move_id.move_type', 'in', ['out_invoice', 'out_refund']),
@@ -304,12 +1117,15 @@ class ProjectAnalytics(models.Model):
             ('account_id.account_type', '=', 'income_other')
         ])
 
-        _logger.info(f"Found {len(invoice_lines)} invoice lines with analytic_distribution")
+        _logger.debug("Found %d invoice lines with analytic_distribution for %d analytic account(s)",
+                      len(invoice_lines), len(result))
 
         # Prefetch for performance
-        invoice_lines.mapped('move_id.payment_state')
         invoice_lines.mapped('move_id.move_type')
-        invoice_lines.mapped('move_id.reversed_entry_id')
+        # Reversal entries (Storno) and reversed entries, one query for the whole batch
+        reversal_move_ids = self._get_reversal_move_ids(invoice_lines.move_id.ids)
+        # Payment ratio of every invoice, shared by all lines and projects it is split across
+        payment_ratios = self._get_payment_ratios(invoice_lines.move_id.ids)
 
         matched_lines = 0
         for line in invoice_lines:
@@ -317,7 +1133,7 @@ class ProjectAnalytics(models.Model):
                 continue
 
             # Skip reversal entries (Storno) - they cancel out the original entry
-            if line.move_id.reversed_entry_id or line.move_id.reversal_move_id:
+            if line.move_id.id in reversal_move_ids:
                 continue
 
             # Parse the analytic_distribution JSON
@@ -326,13 +1142,19 @@ class ProjectAnalytics(models.Model):
                 if isinstance(distribution, str):
                     distribution = json.loads(distribution)
 
-                # Check if this project's analytic account is in the distribution
-                if str(analytic_account.id) in distribution:
+                invoice = line.move_id
+
+                # Payment proportion = (invoice.amount_total - invoice.amount_residual) / invoice.amount_total
+                payment_ratio = payment_ratios.get(invoice.id)
+
+                # Fan the line out to every requested analytic account in its distribution
+                for key, account_percentage in distribution.items():
+                    analytic_account_id = account_keys.get(key)
+                    if analytic_account_id is None:
+                        continue
                     matched_lines += 1
                     # Get the percentage allocated to this project for THIS LINE
-                    percentage = distribution.get(str(analytic_account.id), 0.0) / 100.0
-
-                    invoice = line.move_id
+                    percentage = (account_percentage or 0.0) / 100.0
 
                     # Calculate this line's contribution to the project
                     # Use price_total (includes taxes) to match invoice.amount_total
@@ -342,29 +1164,80 @@ class ProjectAnalytics(models.Model):
                     if invoice.move_type == 'out_refund':
                         line_amount = -abs(line_amount)  # Ensure negative
 
-                    result['invoiced'] += line_amount
-
-                    _logger.debug(f"Matched invoice line {line.id}: {invoice.name}, amount={line_amount}, payment_state={invoice.payment_state}")
-
-                    # Calculate paid amount for this line
-                    # Payment proportion = (invoice.amount_total - invoice.amount_residual) / invoice.amount_total
-                    if abs(invoice.amount_total) > 0:
-                        payment_ratio = (invoice.amount_total - invoice.amount_residual) / invoice.amount_total
-                        line_paid = line_amount * payment_ratio
-                        result['paid'] += line_paid
+                    totals = result[analytic_account_id]
+                    totals['invoiced'] += line_amount
+                    if payment_ratio is not None:
+                        totals['paid'] += line_amount * payment_ratio
 
             except Exception as e:
-                _logger.warning(f"Error parsing analytic_distribution for invoice line {line.id}: {e}")
+                _logger.warning("Error parsing analytic_distribution for invoice line %s: %s", line.id, e)
                 continue
 
-        _logger.info(f"Matched {matched_lines} invoice lines for this project. Total invoiced: {result['invoiced']}, paid: {result['paid']}")
+        AnalyticsProfiler.current().count(rows=len(invoice_lines), matched=matched_lines)
+        _logger.debug("Matched %d invoice line allocation(s) for %d analytic account(s)", matched_lines, len(result))
         return result
 
+    @api.model
+    def _get_reversal_move_ids(self, move_ids):
+        """
+        Ids among move_ids that are reversal entries (Storno) or have been reversed.
+
+        One query per batch instead of reading reversed_entry_id and the reverse
+        relation of every move, the same rule as the anti-join of
+        _get_move_line_totals_sql().
+
+        Returns:
+            set: account.move ids
+        """
+        if not move_ids:
+            return set()
+        self.env['account.move'].flush_model(['reversed_entry_id'])
+        self.env.cr.execute("""
+            SELECT id FROM account_move WHERE id = ANY(%(move_ids)s) AND reversed_entry_id IS NOT NULL
+             UNION
+            SELECT reversed_entry_id FROM account_move WHERE reversed_entry_id = ANY(%(move_ids)s)
+        """, {'move_ids': list(move_ids)})
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _get_payment_ratios(self, move_ids):
+        """
+        Paid share of every given move: (amount_total - amount_residual) / amount_total.
+
+        Read with one query per batch, so an invoice split across many lines and
+        projects is evaluated once.
+
+        Returns:
+            dict: {move_id: ratio}, moves with an amount_total of 0 are left out
+        """
+        if not move_ids:
+            return {}
+        self.env['account.move'].flush_model(['amount_total', 'amount_residual'])
+        self.env.cr.execute("""
+            SELECT id, (amount_total - amount_residual) / amount_total
+              FROM account_move
+             WHERE id = ANY(%s) AND amount_total != 0
+        """, [list(move_ids)])
+        return dict(self.env.cr.fetchall())
+
     def _get_vendor_bills_from_analytic(self, analytic_account):
+        """
+        Get vendor bills and refunds for a single analytic account.
+        Thin wrapper around _get_vendor_bills_batch().
+
+        Returns:
+            dict: {'total': amount}
+        """
+        return self._get_vendor_bills_batch(analytic_account)[analytic_account.id]
+
+    def _get_vendor_bills_batch(self, analytic_accounts):
         """
         Get vendor bills and refunds via analytic_distribution in account.move.line.
         This is the Odoo v18 way to link bills to projects.
 
+        All candidate lines are scanned once and each line's distribution is fanned
+        out to every requested analytic account it touches.
+
         IMPORTANT:
         - We calculate project portion based on bill LINE amounts
         - Uses price_total (includes taxes) to match bill.amount_total
@@ -373,13 +1246,20 @@ class ProjectAnalytics(models.Model):
         Handles both:
         - in_invoice: Vendor bills (positive cost)
         - in_refund: Vendor refunds (negative cost)
-        """
-        result = {'total': 0.0}
 
-        _logger.info(f"Searching for vendor bills for analytic account: {analytic_account.name} (ID: {analytic_account.id})")
+        Args:
+            analytic_accounts: Recordset of account.analytic.account
+
+        Returns:
+            dict: {analytic_account_id: {'total': amount}}
+        """
+        result = {account.id: {'total': 0.0} for account in analytic_accounts}
+        if not result:
+            return result
+        account_keys = {str(account_id): account_id for account_id in result}
 
-        # Find all posted vendor bill/refund lines with this analytic account
-        bill_lines = self.env['account.move.line'].search([
+        # Find all posted vendor bill/refund lines with an analytic distribution
+        bill_lines = self.env['account.move.line'].search(self._get_analytics_date_domain() + [
             ('analytic_distribution', '!=', False),
             ('parent_state', '=', 'posted'),
             ('move_id.move_type', 'in', ['in_invoice', 'in_refund']),
@@ -387,11 +1267,13 @@ class ProjectAnalytics(models.Model):
             ('account_id.account_type', '=', 'expense')
         ])
 
-        _logger.info(f"Found {len(bill_lines)} vendor bill lines with analytic_distribution")
+        _logger.debug("Found %d vendor bill lines with analytic_distribution for %d analytic account(s)",
+                      len(bill_lines), len(result))
 
         # Prefetch for performance
         bill_lines.mapped('move_id.move_type')
-        bill_lines.mapped('move_id.reversed_entry_id')
+        # Reversal entries (Storno) and reversed entries, one query for the whole batch
+        reversal_move_ids = self._get_reversal_move_ids(bill_lines.move_id.ids)
 
         matched_lines = 0
         for line in bill_lines:
@@ -399,7 +1281,7 @@ class ProjectAnalytics(models.Model):
                 continue
 
             # Skip reversal entries (Storno) - they cancel out the original entry
-            if line.move_id.reversed_entry_id or line.move_id.reversal_move_id:
+            if line.move_id.id in reversal_move_ids:
                 continue
 
             # Parse the analytic_distribution JSON
@@ -408,13 +1290,16 @@ class ProjectAnalytics(models.Model):
                 if isinstance(distribution, str):
                     distribution = json.loads(distribution)
 
-                # Check if this project's analytic account is in the distribution
-                if str(analytic_account.id) in distribution:
+                bill = line.move_id
+
+                # Fan the line out to every requested analytic account in its distribution
+                for key, account_percentage in distribution.items():
+                    analytic_account_id = account_keys.get(key)
+                    if analytic_account_id is None:
+                        continue
                     matched_lines += 1
                     # Get the percentage allocated to this project for THIS LINE
-                    percentage = distribution.get(str(analytic_account.id), 0.0) / 100.0
-
-                    bill = line.move_id
+                    percentage = (account_percentage or 0.0) / 100.0
 
                     # Calculate this line's contribution to the project
                     # Use price_total (includes taxes) to match bill.amount_total
@@ -424,42 +1309,70 @@ class ProjectAnalytics(models.Model):
                     if bill.move_type == 'in_refund':
                         line_amount = -abs(line_amount)  # Ensure negative
 
-                    result['total'] += line_amount
-
-                    _logger.debug(f"Matched vendor bill line {line.id}: {bill.name}, amount={line_amount}")
+                    result[analytic_account_id]['total'] += line_amount
 
             except Exception as e:
-                _logger.warning(f"Error parsing analytic_distribution for bill line {line.id}: {e}")
+                _logger.warning("Error parsing analytic_distribution for bill line %s: %s", line.id, e)
                 continue
 
-        _logger.info(f"Matched {matched_lines} vendor bill lines for this project. Total: {result['total']}")
+        AnalyticsProfiler.current().count(rows=len(bill_lines), matched=matched_lines)
+        _logger.debug("Matched %d vendor bill line allocation(s) for %d analytic account(s)", matched_lines, len(result))
         return result
 
     def _get_skonto_accounts(self):
         """
         Get configurable Skonto account codes from system parameters.
         Falls back to German chart of accounts defaults if not configured.
-        
+
+        Read from the cached analytics configuration, see
+        ir.config_parameter._get_project_analytics_config().
+
         Returns:
             dict: {'customer': [list of codes], 'vendor': [list of codes]}
         """
-        ICP = self.env['ir.config_parameter'].sudo()
-        
-        customer_accounts = ICP.get_param(
-            'project_analytics.customer_skonto_accounts',
-            '7300,7301,7302,7303,2130'  # Default for German SKR03/SKR04
-        ).split(',')
-        
-        vendor_accounts = ICP.get_param(
-            'project_analytics.vendor_skonto_accounts',
-            '4730,4731,4732,4733,2670'  # Default for German SKR03/SKR04
-        ).split(',')
-        
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
         return {
-            'customer': [acc.strip() for acc in customer_accounts if acc.strip()],
-            'vendor': [acc.strip() for acc in vendor_accounts if acc.strip()]
+            'customer': list(config.customer_skonto_accounts),
+            'vendor': list(config.vendor_skonto_accounts),
         }
 
+    @api.model
+    @tools.ormcache()
+    def _get_skonto_matcher(self):
+        """
+        Compile the configured Skonto account prefixes into a SkontoPrefixMatcher.
+
+        Cached per registry. Writing any ir.config_parameter clears the registry cache
+        (in all workers), so changes to project_analytics.*_skonto_accounts are picked
+        up without a query per project.
+        """
+        skonto_accounts = self._get_skonto_accounts()
+        return SkontoPrefixMatcher(skonto_accounts['customer'], skonto_accounts['vendor'])
+
+    def _get_skonto_account_ids(self):
+        """
+        Resolve the configured Skonto prefixes to account ids of the current companies.
+
+        Used by the SQL aggregation to filter with account_id = ANY(...) instead of
+        matching codes per line.
+
+        Returns:
+            dict: {'customer': set of account ids, 'vendor': set of account ids}
+        """
+        result = {'customer': set(), 'vendor': set()}
+        matcher = self._get_skonto_matcher()
+        if not matcher.prefixes:
+            return result
+
+        domain = expression.OR([[('code', '=like', f'{prefix}%')] for prefix in matcher.prefixes])
+        for account in self.env['account.account'].search(domain):
+            is_customer_skonto, is_vendor_skonto = matcher.classify(account.code)
+            if is_customer_skonto:
+                result['customer'].add(account.id)
+            if is_vendor_skonto:
+                result['vendor'].add(account.id)
+        return result
+
     def _get_skonto_from_analytic(self, analytic_account):
         """
         Get Skonto (cash discounts) by querying analytic lines from discount accounts.
@@ -483,24 +1396,29 @@ class ProjectAnalytics(models.Model):
         """
         result = {'customer_skonto': 0.0, 'vendor_skonto': 0.0}
 
-        # Get configurable account codes
-        skonto_accounts = self._get_skonto_accounts()
+        # Cached prefix matcher for the configured account codes
+        matcher = self._get_skonto_matcher()
 
         # Get all analytic lines for this account
-        analytic_lines = self.env['account.analytic.line'].search([
+        analytic_lines = self.env['account.analytic.line'].search(self._get_analytics_date_domain() + [
             ('account_id', '=', analytic_account.id)
         ])
 
+        AnalyticsProfiler.current().count(rows=len(analytic_lines))
+
         # Prefetch for performance
         analytic_lines.mapped('move_line_id.account_id.code')
         analytic_lines.mapped('move_line_id.move_id.move_type')
 
+        # Each general account is classified once, not once per line
+        classification_by_account = {}
+
         for line in analytic_lines:
             if not line.move_line_id or not line.move_line_id.account_id:
                 continue
 
-            account_code = line.move_line_id.account_id.code
-            if not account_code:
+            account = line.move_line_id.account_id
+            if not account.code:
                 continue
 
             # Skip Skonto that belongs to invoices/bills
@@ -512,19 +1430,19 @@ class ProjectAnalytics(models.Model):
                     # (it's already counted in the payment/residual amount)
                     continue
 
+            if account.id not in classification_by_account:
+                classification_by_account[account.id] = matcher.classify(account.code)
+            is_customer_skonto, is_vendor_skonto = classification_by_account[account.id]
+
             # Customer Skonto (Gewährte Skonti) - expense accounts + liability
             # These reduce our revenue/profit (customer got discount)
-            for customer_acc in skonto_accounts['customer']:
-                if account_code.startswith(customer_acc):
-                    result['customer_skonto'] += abs(line.amount)
-                    break
+            if is_customer_skonto:
+                result['customer_skonto'] += abs(line.amount)
 
             # Vendor Skonto (Erhaltene Skonti) - income accounts + asset
             # These increase our profit (we got discount from vendor)
-            for vendor_acc in skonto_accounts['vendor']:
-                if account_code.startswith(vendor_acc):
-                    result['vendor_skonto'] += abs(line.amount)
-                    break
+            if is_vendor_skonto:
+                result['vendor_skonto'] += abs(line.amount)
 
         return result
 
@@ -540,11 +1458,13 @@ class ProjectAnalytics(models.Model):
         result = {'hours': 0.0, 'hours_adjusted': 0.0, 'costs': 0.0}
 
         # Find all timesheet lines for this analytic account
-        timesheet_lines = self.env['account.analytic.line'].search([
+        timesheet_lines = self.env['account.analytic.line'].search(self._get_analytics_date_domain() + [
             ('account_id', '=', analytic_account.id),
             ('is_timesheet', '=', True)
         ])
 
+        AnalyticsProfiler.current().count(rows=len(timesheet_lines))
+
         # Prefetch employee_id for performance
         timesheet_lines.mapped('employee_id.faktor_hfc')
 
@@ -575,12 +1495,14 @@ class ProjectAnalytics(models.Model):
         other_costs = 0.0
 
         # Find all cost lines (negative amounts, not timesheets)
-        cost_lines = self.env['account.analytic.line'].search([
+        cost_lines = self.env['account.analytic.line'].search(self._get_analytics_date_domain() + [
             ('account_id', '=', analytic_account.id),
             ('amount', '<', 0),
             ('is_timesheet', '=', False)
         ])
 
+        AnalyticsProfiler.current().count(rows=len(cost_lines))
+
         # Prefetch for performance
         cost_lines.mapped('move_line_id.move_id.move_type')
 
@@ -650,6 +1572,17 @@ class ProjectAnalytics(models.Model):
             'target': 'current',
         }
 
+    def action_view_analytics_contributions(self):
+        """
+        Open the invoice and bill lines behind the financial figures of this project,
+        grouped by figure. Reads the stored project.analytics.contribution rows.
+        """
+        self.ensure_one()
+        action = self.env['ir.actions.act_window']._for_xml_id('project_statistic.action_project_analytics_contribution')
+        action['name'] = f'{action["name"]} - {self.name}'
+        action['domain'] = [('project_id', '=', self.id)]
+        return action
+
     def action_open_project_dashboard(self):
         """
         Open the standard project dashboard/form view for this project.
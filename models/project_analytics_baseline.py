@@ -0,0 +1,173 @@
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsBaseline(models.Model):
+    _name = 'project.analytics.baseline'
+    _description = 'Project Analytics Frozen Baseline'
+    _order = 'analytic_account_id, company_id'
+
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account',
+        string='Analytic Account',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    lock_date = fields.Date(
+        string='Lock Date',
+        required=True,
+        help="Company lock date the baseline was computed for. It covers all journal items up to this date."
+    )
+    config_fingerprint = fields.Char(
+        string='Configuration',
+        help="Technical: Skonto configuration the baseline was computed with."
+    )
+
+    # Figures of the journal items up to the lock date
+    customer_invoiced_amount = fields.Float(string='Total Invoiced Amount', readonly=True)
+    vendor_bills_total = fields.Float(string='Vendor Bills Total', readonly=True)
+    customer_skonto_taken = fields.Float(string='Customer Cash Discounts (Skonto)', readonly=True)
+    vendor_skonto_received = fields.Float(string='Vendor Cash Discounts Received', readonly=True)
+    other_costs = fields.Float(string='Other Costs', readonly=True)
+
+    _sql_constraints = [
+        ('account_company_uniq', 'unique(analytic_account_id, company_id)',
+         'There can only be one baseline per analytic account and company.'),
+    ]
+
+    @api.model
+    def _get_config_fingerprint(self):
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
+        return repr((config.customer_skonto_accounts, config.vendor_skonto_accounts))
+
+    @api.model
+    def _get_baselines(self, analytic_accounts, lock_date):
+        """
+        Frozen figures of the given analytic accounts up to lock_date, for the
+        current company.
+
+        A baseline is computed once and reused as long as the company lock date and
+        the Skonto configuration are unchanged and no lock date exception was granted
+        since. Changing the analytic distribution of a journal item it covers drops
+        it, see _invalidate_for_move_lines(). Entries reversed after the lock date are not taken out here, see
+        project.project._get_frozen_move_totals().
+
+        Returns:
+            dict: {analytic_account_id: {'invoiced', 'vendor', 'customer_skonto',
+                   'vendor_skonto', 'other_costs'}}
+        """
+        company = self.env.company
+        fingerprint = self._get_config_fingerprint()
+        exception_date = self._get_last_lock_exception_date(company)
+        baselines = self.sudo().search([
+            ('analytic_account_id', 'in', analytic_accounts.ids),
+            ('company_id', '=', company.id),
+        ])
+        valid = baselines.filtered(lambda baseline: (
+            baseline.lock_date == lock_date
+            and baseline.config_fingerprint == fingerprint
+            and (not exception_date or baseline.write_date > exception_date)
+        ))
+
+        missing = analytic_accounts - valid.analytic_account_id
+        if missing:
+            values_by_account = self._compute_baseline_values(missing, lock_date)
+            baseline_by_account = {baseline.analytic_account_id.id: baseline for baseline in baselines}
+            to_create = []
+            for account_id, vals in values_by_account.items():
+                vals.update(lock_date=lock_date, config_fingerprint=fingerprint)
+                baseline = baseline_by_account.get(account_id)
+                if baseline:
+                    baseline.write(vals)
+                else:
+                    to_create.append(dict(vals, analytic_account_id=account_id, company_id=company.id))
+            baselines |= self.sudo().create(to_create)
+            _logger.info("Computed frozen baseline up to %s for %d analytic account(s) of company %s",
+                         lock_date, len(missing), company.name)
+
+        return {
+            baseline.analytic_account_id.id: {
+                'invoiced': baseline.customer_invoiced_amount,
+                'vendor': baseline.vendor_bills_total,
+                'customer_skonto': baseline.customer_skonto_taken,
+                'vendor_skonto': baseline.vendor_skonto_received,
+                'other_costs': baseline.other_costs,
+            }
+            for baseline in baselines
+        }
+
+    @api.model
+    def _compute_baseline_values(self, analytic_accounts, lock_date):
+        """
+        Aggregate the journal items up to lock_date: invoices and bills (reversed
+        entries only skipped for reversals up to lock_date) and the analytic lines
+        of journal items (Skonto and other costs).
+
+        Returns:
+            dict: {analytic_account_id: {field_name: value}}
+        """
+        Project = self.env['project.project'].with_context(
+            project_analytics_date_from=None,
+            project_analytics_date_to=lock_date,
+        )
+        move_totals = Project._get_move_line_totals_sql(analytic_accounts, reversals_until=lock_date)
+        analytic_totals = Project._get_analytic_line_totals_sql(
+            analytic_accounts, frozen_until=lock_date, frozen_only=True)
+        return {
+            account_id: {
+                'customer_invoiced_amount': move_totals[account_id]['invoiced'],
+                'vendor_bills_total': move_totals[account_id]['vendor'],
+                'customer_skonto_taken': analytic_totals[account_id]['customer_skonto'],
+                'vendor_skonto_received': analytic_totals[account_id]['vendor_skonto'],
+                'other_costs': analytic_totals[account_id]['other_costs'],
+            }
+            for account_id in analytic_accounts.ids
+        }
+
+    @api.model
+    def _invalidate_for_move_lines(self, lines, analytic_account_ids):
+        """
+        Drop the baselines of the given analytic accounts that cover one of the
+        journal items, after their analytic distribution changed. Odoo allows this
+        change on locked entries, the next recomputation rebuilds the baselines.
+        The frozen monthly buckets of the items are unfrozen as well, see
+        project.analytics.bucket._unfreeze_for_move_lines().
+        """
+        if not analytic_account_ids:
+            return
+        self.env['project.analytics.bucket']._unfreeze_for_move_lines(lines, analytic_account_ids)
+        first_date_by_company = {}
+        for line in lines:
+            if line.date:
+                company_id = line.company_id.id
+                first_date_by_company[company_id] = min(first_date_by_company.get(company_id, line.date), line.date)
+        for company_id, first_date in first_date_by_company.items():
+            baselines = self.sudo().search([
+                ('analytic_account_id', 'in', list(analytic_account_ids)),
+                ('company_id', '=', company_id),
+                ('lock_date', '>=', first_date),
+            ])
+            if baselines:
+                _logger.info("Dropped frozen baseline of %d analytic account(s): analytic distribution "
+                             "changed on locked journal items", len(baselines))
+                baselines.unlink()
+
+    @api.model
+    def _get_last_lock_exception_date(self, company):
+        """When the last lock date exception of the company was granted, if any."""
+        if 'account.lock_exception' not in self.env:
+            return None
+        exception = self.env['account.lock_exception'].sudo().with_context(active_test=False).search(
+            [('company_id', '=', company.id)], order='create_date desc', limit=1,
+        )
+        return exception.create_date or None
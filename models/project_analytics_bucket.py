@@ -0,0 +1,373 @@
+from odoo import models, fields, api
+from dateutil.relativedelta import relativedelta
+import logging
+
+from .analytics_profiler import AnalyticsProfiler
+
+_logger = logging.getLogger(__name__)
+
+# Raw monthly figures (see project.project._compute_monthly_totals) -> bucket fields
+BUCKET_FIELDS = {
+    'invoiced': 'customer_invoiced_amount',
+    'paid': 'customer_paid_amount',
+    'vendor': 'vendor_bills_total',
+    'customer_skonto': 'customer_skonto_taken',
+    'vendor_skonto': 'vendor_skonto_received',
+    'hours': 'total_hours_booked',
+    'hours_adjusted': 'total_hours_booked_adjusted',
+    'costs': 'labor_costs',
+    'other_costs': 'other_costs',
+}
+EMPTY_TOTALS = dict.fromkeys(BUCKET_FIELDS, 0.0)
+
+# Technical fields holding the frozen figures of a closed month
+FROZEN_BASE_FIELDS = (
+    'frozen_invoiced_amount', 'frozen_vendor_bills_total',
+    'customer_skonto_taken', 'vendor_skonto_received', 'move_other_costs',
+)
+
+
+class ProjectAnalyticsBucket(models.Model):
+    _name = 'project.analytics.bucket'
+    _description = 'Project Financial Figures per Month'
+    _order = 'month desc, project_id, company_id'
+    _rec_name = 'project_id'
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Project',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    month = fields.Date(
+        string='Month',
+        required=True,
+        index=True,
+        help="First day of the month these figures belong to (accounting date of journal items, date of analytic lines)."
+    )
+    frozen = fields.Boolean(
+        string='Frozen',
+        readonly=True,
+        help="The month ends before the company lock date: its journal items can no longer change and are not rescanned."
+    )
+    last_computed = fields.Datetime(string='Last Computed', readonly=True)
+    frozen_at = fields.Datetime(
+        string='Frozen At',
+        readonly=True,
+        help="When the frozen base of the month was computed. A lock date exception granted later recomputes it."
+    )
+    config_fingerprint = fields.Char(
+        string='Configuration',
+        readonly=True,
+        help="Technical: Skonto configuration the frozen base was computed with."
+    )
+
+    # Project dimensions, stored for grouping
+    partner_id = fields.Many2one(
+        related='project_id.partner_id',
+        string='Name of Client',
+        store=True,
+    )
+    user_id = fields.Many2one(
+        related='project_id.user_id',
+        string='Head of Project',
+        store=True,
+    )
+
+    # Monthly figures - all additive, a period is the sum of its months
+    customer_invoiced_amount = fields.Float(string='Total Invoiced Amount', readonly=True, aggregator='sum')
+    customer_paid_amount = fields.Float(string='Total Paid Amount', readonly=True, aggregator='sum')
+    customer_outstanding_amount = fields.Float(string='Outstanding Amount', readonly=True, aggregator='sum')
+    vendor_bills_total = fields.Float(string='Vendor Bills Total', readonly=True, aggregator='sum')
+    customer_skonto_taken = fields.Float(string='Customer Cash Discounts (Skonto)', readonly=True, aggregator='sum')
+    vendor_skonto_received = fields.Float(string='Vendor Cash Discounts Received', readonly=True, aggregator='sum')
+    total_hours_booked = fields.Float(string='Total Hours Booked', readonly=True, aggregator='sum')
+    total_hours_booked_adjusted = fields.Float(string='Total Hours Booked Bereinigt', readonly=True, aggregator='sum')
+    labor_costs = fields.Float(string='Labor Costs', readonly=True, aggregator='sum')
+    other_costs = fields.Float(string='Other Costs', readonly=True, aggregator='sum')
+    total_costs_net = fields.Float(string='Net Costs (without tax)', readonly=True, aggregator='sum')
+    profit_loss = fields.Float(string='Profit/Loss Amount', readonly=True, aggregator='sum')
+    # Frozen base of closed months (technical), see _refresh_buckets()
+    frozen_invoiced_amount = fields.Float(string='Frozen Invoiced Amount', readonly=True)
+    frozen_vendor_bills_total = fields.Float(string='Frozen Vendor Bills Total', readonly=True)
+    move_other_costs = fields.Float(
+        string='Other Costs from Journal Items',
+        readonly=True,
+        help="Technical: part of the other costs booked through journal items, frozen with the month."
+    )
+
+    _sql_constraints = [
+        ('project_company_month_uniq', 'unique(project_id, company_id, month)',
+         'There can only be one monthly bucket per project, company and month.'),
+    ]
+
+    @api.model
+    def _month_range(self, date_from, date_to):
+        """First days of all months between date_from and date_to (both included)."""
+        month = fields.Date.start_of(date_from, 'month')
+        months = []
+        while month <= date_to:
+            months.append(month)
+            month += relativedelta(months=1)
+        return months
+
+    @api.model
+    def _refresh_buckets(self, projects, date_from, date_to, companies=None):
+        """
+        Bring the monthly buckets of the given projects and period up to date.
+
+        Open months are recomputed from scratch. Months that end before the company
+        lock date are aggregated once into a frozen base (like the frozen baseline of
+        the snapshots, see project.analytics.baseline). The base is computed again
+        when the Skonto configuration changed, a lock date exception was granted
+        since or a journal item of the month got a new analytic distribution (see
+        _unfreeze_for_move_lines()); otherwise only what the lock date does not
+        protect is read for them:
+        - the outstanding amount of invoices that are still open and entries reversed
+          after the lock date, see project.project._get_frozen_move_totals()
+        - analytic lines without journal item (timesheets, manual costs)
+
+        Args:
+            projects: Recordset of project.project
+            date_from, date_to: period, extended to whole months
+            companies: Recordset of res.company, defaults to the allowed companies
+        """
+        if not projects:
+            return
+        months = self._month_range(date_from, date_to)
+        now = fields.Datetime.now()
+        Baseline = self.env['project.analytics.baseline']
+        fingerprint = Baseline._get_config_fingerprint()
+        with AnalyticsProfiler.current().phase('buckets'):
+            for company in (companies or self.env.companies):
+                lock_date = company._get_project_analytics_lock_date()
+                exception_date = Baseline._get_last_lock_exception_date(company)
+                closed = [month for month in months
+                          if lock_date and month + relativedelta(months=1, days=-1) <= lock_date]
+                open_months = [month for month in months if month not in closed]
+                existing = self.sudo().search([
+                    ('project_id', 'in', projects.ids),
+                    ('company_id', '=', company.id),
+                    ('month', 'in', months),
+                ])
+                bucket_by_key = {(bucket.project_id.id, bucket.month): bucket for bucket in existing}
+                # A closed month is only frozen once every project has its frozen bucket
+                frozen_keys = {
+                    key for key, bucket in bucket_by_key.items()
+                    if bucket.frozen
+                    and bucket.config_fingerprint == fingerprint
+                    and (not exception_date or bucket.frozen_at > exception_date)
+                }
+                to_freeze = [
+                    month for month in closed
+                    if not all((project_id, month) in frozen_keys for project_id in projects.ids)
+                ]
+
+                company_projects = projects.with_context(allowed_company_ids=[company.id])
+                open_totals = freeze_totals = moveless_totals = still_open_totals = reversed_totals = {}
+                if open_months:
+                    open_totals = self._with_period(company_projects, open_months)._compute_monthly_totals()
+                if to_freeze:
+                    freeze_totals = self._with_period(company_projects, to_freeze)._compute_monthly_totals(
+                        move_options={'reversals_until': lock_date},
+                        analytic_options={'frozen_until': lock_date, 'frozen_only': True},
+                    )
+                if closed:
+                    closed_projects = self._with_period(company_projects, closed)
+                    moveless_totals = closed_projects._compute_monthly_totals(
+                        move_options=False, analytic_options={'moveless_only': True})
+                    still_open_totals = closed_projects._compute_monthly_totals(
+                        move_options={'open_moves_only': True, 'reversals_until': lock_date}, analytic_options=False)
+                    reversed_totals = closed_projects._compute_monthly_totals(
+                        move_options={'reversed_after': lock_date}, analytic_options=False)
+
+                to_create = []
+                for project in projects:
+                    for month in months:
+                        bucket = bucket_by_key.get((project.id, month))
+                        if month in closed:
+                            # Closed months always get a bucket, so that they are never scanned again
+                            if month in to_freeze:
+                                base = self._get_frozen_base(freeze_totals.get(project.id, {}).get(month))
+                            else:
+                                base = {fname: bucket[fname] for fname in FROZEN_BASE_FIELDS}
+                            vals = self._get_frozen_bucket_values(
+                                base,
+                                moveless_totals.get(project.id, {}).get(month),
+                                still_open_totals.get(project.id, {}).get(month),
+                                reversed_totals.get(project.id, {}).get(month),
+                            )
+                            vals['frozen'] = True
+                            if month in to_freeze:
+                                vals.update(frozen_at=now, config_fingerprint=fingerprint)
+                        else:
+                            totals = open_totals.get(project.id, {}).get(month)
+                            if not totals and not bucket:
+                                continue
+                            vals = self._get_bucket_values(totals)
+                            vals.update(frozen_invoiced_amount=0.0, frozen_vendor_bills_total=0.0, move_other_costs=0.0,
+                                        frozen=False, frozen_at=False, config_fingerprint=False)
+                        vals['last_computed'] = now
+                        if bucket:
+                            bucket.write(vals)
+                        else:
+                            to_create.append(dict(vals, project_id=project.id, company_id=company.id, month=month))
+                if to_create:
+                    self.sudo().create(to_create)
+
+    @api.model
+    def _unfreeze_for_move_lines(self, lines, analytic_account_ids):
+        """
+        Mark the months of the given journal items as no longer frozen for the
+        projects of the analytic accounts, after their analytic distribution
+        changed. The next refresh computes their frozen base again.
+        """
+        projects_by_account = self.env['project.project']._get_analytic_account_project_map()
+        project_ids = {
+            project_id
+            for account_id in analytic_account_ids
+            for project_id in projects_by_account.get(account_id, ())
+        }
+        months_by_company = {}
+        for line in lines:
+            if line.date:
+                months_by_company.setdefault(line.company_id.id, set()).add(fields.Date.start_of(line.date, 'month'))
+        if not project_ids or not months_by_company:
+            return
+        for company_id, months in months_by_company.items():
+            buckets = self.sudo().search([
+                ('project_id', 'in', list(project_ids)),
+                ('company_id', '=', company_id),
+                ('month', 'in', list(months)),
+                ('frozen', '=', True),
+            ])
+            if buckets:
+                _logger.info("Unfroze %d monthly bucket(s): analytic distribution changed on locked journal items",
+                             len(buckets))
+                buckets.write({'frozen': False})
+
+    @api.model
+    def _with_period(self, projects, months):
+        """projects with the context date range covering the given (sorted) months."""
+        return projects.with_context(
+            project_analytics_date_from=months[0],
+            project_analytics_date_to=months[-1] + relativedelta(months=1, days=-1),
+        )
+
+    @api.model
+    def _get_bucket_values(self, totals):
+        """Bucket field values from the raw figures of one month."""
+        totals = dict(EMPTY_TOTALS, **(totals or {}))
+        vals = {fname: totals[key] for key, fname in BUCKET_FIELDS.items()}
+        return self._with_derived_values(vals)
+
+    @api.model
+    def _get_frozen_base(self, totals):
+        """Frozen base values from the raw figures of the journal items of a closed month."""
+        totals = dict(EMPTY_TOTALS, **(totals or {}))
+        return {
+            'frozen_invoiced_amount': totals['invoiced'],
+            'frozen_vendor_bills_total': totals['vendor'],
+            'customer_skonto_taken': totals['customer_skonto'],
+            'vendor_skonto_received': totals['vendor_skonto'],
+            'move_other_costs': totals['other_costs'],
+        }
+
+    @api.model
+    def _get_frozen_bucket_values(self, base, moveless_totals, still_open_totals, reversed_totals):
+        """
+        Values of a closed month: the frozen base plus still open invoices, later
+        reversals and analytic lines without journal item, read live.
+        """
+        moveless_totals = dict(EMPTY_TOTALS, **(moveless_totals or {}))
+        frozen = self.env['project.project']._get_frozen_move_totals(
+            {'invoiced': base['frozen_invoiced_amount'], 'vendor': base['frozen_vendor_bills_total']},
+            dict(EMPTY_TOTALS, **(still_open_totals or {})),
+            dict(EMPTY_TOTALS, **(reversed_totals or {})),
+        )
+        vals = dict(base)
+        vals.update({
+            'customer_invoiced_amount': frozen['invoiced'],
+            'customer_paid_amount': frozen['paid'],
+            'vendor_bills_total': frozen['vendor'],
+            'total_hours_booked': moveless_totals['hours'],
+            'total_hours_booked_adjusted': moveless_totals['hours_adjusted'],
+            'labor_costs': moveless_totals['costs'],
+            'other_costs': base['move_other_costs'] + moveless_totals['other_costs'],
+        })
+        return self._with_derived_values(vals)
+
+    @api.model
+    def _with_derived_values(self, vals):
+        vals['customer_outstanding_amount'] = vals['customer_invoiced_amount'] - vals['customer_paid_amount']
+        vals['total_costs_net'] = vals['labor_costs'] + vals['other_costs']
+        vals['profit_loss'] = (
+            vals['customer_invoiced_amount'] - vals['customer_skonto_taken']
+            - (vals['vendor_bills_total'] - vals['vendor_skonto_received'])
+            - vals['total_costs_net']
+        )
+        return vals
+
+    @api.model
+    def _get_period_values(self, projects, date_from, date_to):
+        """
+        Financial figures of the given projects for a period, summed from the
+        monthly buckets of the allowed companies (the period is extended to whole
+        months). Only open and missing months are computed.
+
+        Returns:
+            dict: {project_id: {field_name: value}} for all fields in FINANCIAL_FIELDS
+        """
+        date_from = fields.Date.start_of(date_from, 'month')
+        date_to = fields.Date.end_of(date_to, 'month')
+        self._refresh_buckets(projects, date_from, date_to)
+
+        groups = self.sudo()._read_group(
+            [('project_id', 'in', projects.ids),
+             ('company_id', 'in', self.env.companies.ids),
+             ('month', '>=', date_from),
+             ('month', '<=', date_to)],
+            ['project_id'],
+            [f'{fname}:sum' for fname in BUCKET_FIELDS.values()],
+        )
+        sums_by_project = {
+            project.id: dict(zip(BUCKET_FIELDS, sums))
+            for project, *sums in groups
+        }
+
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
+        hourly_rate = self.env.context.get('custom_hourly_rate') or config.default_hourly_rate
+        Project = self.env['project.project']
+        values_by_project = {}
+        for project_id in projects.ids:
+            totals = dict.fromkeys(BUCKET_FIELDS, 0.0)
+            totals.update(sums_by_project.get(project_id, {}))
+            values_by_project[project_id] = Project._build_financial_values(
+                {'invoiced': totals['invoiced'], 'paid': totals['paid']},
+                {'total': totals['vendor']},
+                totals,
+                hourly_rate,
+            )
+        return values_by_project
+
+    @api.model
+    def action_open_period_analysis(self, projects, date_from, date_to):
+        """Refresh the buckets of a period and open them grouped by project."""
+        date_from = fields.Date.start_of(date_from, 'month')
+        date_to = fields.Date.end_of(date_to, 'month')
+        self._refresh_buckets(projects, date_from, date_to)
+        action = self.env['ir.actions.act_window']._for_xml_id('project_statistic.action_project_analytics_bucket')
+        action['domain'] = [
+            ('project_id', 'in', projects.ids),
+            ('month', '>=', date_from),
+            ('month', '<=', date_to),
+        ]
+        return action
@@ -0,0 +1,219 @@
+from odoo import models, fields, api
+from odoo.tools import sql
+import logging
+
+from .analytics_profiler import AnalyticsProfiler
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsContribution(models.Model):
+    """
+    Share of one invoice or bill line in the figures of a project.
+
+    Built with the same rules as project.project._get_move_line_totals_sql(), so the
+    contributions of a project and company add up to its invoiced, paid and vendor
+    bill figures. Refreshed per line by the journal item, posting and reconciliation
+    hooks and rebuilt from the whole history only by the nightly precomputation and
+    forced or wizard refreshes, so the drill-down never parses analytic
+    distributions again.
+    """
+    _name = 'project.analytics.contribution'
+    _description = 'Project Financial Contribution'
+    _order = 'date desc, id desc'
+    _rec_name = 'move_line_id'
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Project',
+        required=True,
+        ondelete='cascade',
+        readonly=True,
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+        readonly=True,
+    )
+    move_line_id = fields.Many2one(
+        'account.move.line',
+        string='Journal Item',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        readonly=True,
+    )
+    move_id = fields.Many2one(
+        'account.move',
+        string='Journal Entry',
+        required=True,
+        ondelete='cascade',
+        readonly=True,
+    )
+    partner_id = fields.Many2one(related='move_id.partner_id', string='Partner')
+    kind = fields.Selection(
+        [('invoice', 'Customer Invoice'), ('vendor_bill', 'Vendor Bill')],
+        string='Figure',
+        required=True,
+        readonly=True,
+        help="Customer invoices and credit notes count towards the invoiced and paid amounts, "
+             "vendor bills and refunds towards the vendor bills total."
+    )
+    date = fields.Date(string='Accounting Date', readonly=True)
+    percentage = fields.Float(string='Distribution (%)', readonly=True)
+    amount = fields.Float(
+        string='Amount',
+        readonly=True,
+        aggregator='sum',
+        help="Part of the line total booked on the project, negative for credit notes and refunds."
+    )
+    paid_amount = fields.Float(
+        string='Paid Amount',
+        readonly=True,
+        aggregator='sum',
+        help="Paid part of the amount (amount × paid ratio of the invoice), customer invoices only."
+    )
+
+    def init(self):
+        # Drill-down of one figure: project, kind and newest lines first
+        sql.create_index(
+            self.env.cr, 'project_analytics_contribution_project_kind_date_index',
+            self._table, ['project_id', 'kind', 'date DESC'],
+        )
+
+    @api.model
+    def _rebuild(self, projects, company):
+        """
+        Replace the contributions of the given projects in one company, see
+        project.analytics.snapshot._compute_and_store().
+        """
+        with AnalyticsProfiler.current().phase('contributions'):
+            self.env.cr.execute(
+                f"DELETE FROM {self._table} WHERE project_id = ANY(%s) AND company_id = %s",
+                [projects.ids, company.id],
+            )
+            account_by_project, _analytic_accounts = projects._get_project_analytic_accounts()
+            self._insert_contributions(
+                [(account.id, project_id) for project_id, account in account_by_project.items() if account],
+                [company.id],
+            )
+        self.invalidate_model()
+        self.env['project.project'].invalidate_model(['analytics_contribution_ids'])
+
+    @api.model
+    def _refresh_move_lines(self, lines):
+        """
+        Recompute the contributions of the given journal items after they changed.
+
+        Lines of entries reversed by one of them are included: posting a reversal
+        removes the contributions of the reversed entry, resetting or cancelling it
+        restores them.
+        """
+        lines |= lines.move_id.reversed_entry_id.line_ids
+        if not lines:
+            return
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE move_line_id = ANY(%s)", [lines.ids])
+        account_ids = {
+            key
+            for line in lines
+            if line.analytic_distribution and line.parent_state == 'posted'
+            for key in line.analytic_distribution
+        }
+        projects_by_account = self.env['project.project']._get_analytic_account_project_map()
+        pairs = [
+            (account_id, project_id)
+            for account_id, project_ids in projects_by_account.items()
+            if str(account_id) in account_ids
+            for project_id in project_ids
+        ]
+        self._insert_contributions(pairs, lines.company_id.ids, lines.ids)
+        self.invalidate_model()
+        self.env['project.project'].invalidate_model(['analytics_contribution_ids'])
+
+    @api.model
+    def _insert_contributions(self, pairs, company_ids, line_ids=None):
+        """
+        Insert the contributions of posted invoice and bill lines.
+
+        Args:
+            pairs: list of (analytic_account_id, project_id)
+            company_ids: companies of the lines
+            line_ids: only these journal items (default: all lines of the accounts)
+        """
+        if not pairs or not company_ids:
+            return
+        self.env['account.move.line'].flush_model([
+            'analytic_distribution', 'parent_state', 'display_type', 'company_id',
+            'price_total', 'account_id', 'move_id', 'date',
+        ])
+        self.env['account.move'].flush_model([
+            'move_type', 'amount_total', 'amount_residual', 'reversed_entry_id',
+        ])
+        self.env['account.account'].flush_model(['account_type'])
+
+        line_filter = "AND line.id = ANY(%(line_ids)s)" if line_ids is not None else ""
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (project_id, company_id, move_line_id, move_id, kind, date,
+                                       percentage, amount, paid_amount,
+                                       create_uid, create_date, write_uid, write_date)
+            SELECT contribution.project_id, contribution.company_id, contribution.move_line_id,
+                   contribution.move_id, contribution.kind, contribution.date, contribution.percentage,
+                   contribution.amount,
+                   CASE WHEN contribution.kind = 'invoice'
+                        THEN contribution.amount * contribution.payment_ratio
+                        ELSE 0.0
+                   END,
+                   %(uid)s, (now() at time zone 'UTC'), %(uid)s, (now() at time zone 'UTC')
+              FROM (
+                    SELECT project.project_id,
+                           line.company_id,
+                           line.id AS move_line_id,
+                           move.id AS move_id,
+                           CASE WHEN move.move_type IN ('out_invoice', 'out_refund')
+                                THEN 'invoice' ELSE 'vendor_bill'
+                           END AS kind,
+                           line.date,
+                           dist.percentage::numeric AS percentage,
+                           CASE WHEN move.move_type IN ('out_refund', 'in_refund')
+                                THEN -ABS(line.price_total * dist.percentage::numeric / 100.0)
+                                ELSE line.price_total * dist.percentage::numeric / 100.0
+                           END AS amount,
+                           CASE WHEN move.amount_total <> 0
+                                THEN (move.amount_total - move.amount_residual) / move.amount_total
+                                ELSE 0.0
+                           END AS payment_ratio
+                      FROM account_move_line line
+                      JOIN account_move move ON move.id = line.move_id
+                      JOIN account_account account ON account.id = line.account_id
+                     CROSS JOIN LATERAL jsonb_each_text(line.analytic_distribution) AS dist(account_key, percentage)
+                      JOIN unnest(%(account_ids)s::int[], %(project_ids)s::int[]) AS project(account_id, project_id)
+                        ON project.account_id::text = dist.account_key
+                     WHERE line.analytic_distribution IS NOT NULL
+                       AND line.parent_state = 'posted'
+                       AND line.display_type IS NULL
+                       AND line.analytic_distribution ?| %(account_key_list)s
+                       AND line.company_id IN %(company_ids)s
+                       {line_filter}
+                       AND move.reversed_entry_id IS NULL
+                       AND NOT EXISTS (
+                            SELECT 1 FROM account_move reversal
+                             WHERE reversal.reversed_entry_id = move.id
+                       )
+                       AND (
+                            (move.move_type IN ('out_invoice', 'out_refund')
+                             AND account.account_type IN ('income', 'income_other'))
+                         OR (move.move_type IN ('in_invoice', 'in_refund')
+                             AND account.account_type = 'expense')
+                       )
+                   ) contribution
+        """, {
+            'uid': self.env.uid,
+            'account_ids': [account_id for account_id, _project_id in pairs],
+            'project_ids': [project_id for _account_id, project_id in pairs],
+            'account_key_list': sorted({str(account_id) for account_id, _project_id in pairs}),
+            'company_ids': tuple(company_ids),
+            'line_ids': list(line_ids or ()),
+        })
+        _logger.debug("Stored %d project contribution(s)", self.env.cr.rowcount)
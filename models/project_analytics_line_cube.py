@@ -0,0 +1,134 @@
+from odoo import models, fields, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsLineCube(models.Model):
+    """
+    Materialized view with the analytic line figures pre-aggregated per analytic
+    account, company and month.
+
+    Read by project.project._get_analytic_line_totals_sql() as a fast path instead of
+    scanning account_analytic_line. Analytic accounts with lines changed since the
+    last refresh are listed in project_analytics_line_cube_dirty and always read
+    live, so the cube never serves outdated figures.
+    """
+    _name = 'project.analytics.line.cube'
+    _description = 'Project Analytics Analytic Line Cube'
+    _auto = False
+    _table = 'project_analytics_line_cube'
+    _dirty_table = 'project_analytics_line_cube_dirty'
+
+    account_id = fields.Many2one('account.analytic.account', string='Analytic Account', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    month = fields.Date(string='Month', readonly=True)
+    is_timesheet = fields.Boolean(string='Timesheet', readonly=True)
+    is_vendor_bill = fields.Boolean(string='Vendor Bill', readonly=True)
+    has_move_line = fields.Boolean(string='Journal Item', readonly=True)
+    skonto_account_id = fields.Integer(
+        string='Skonto Candidate Account',
+        readonly=True,
+        help="Technical: financial account of lines from non-invoice journal entries (0 otherwise), "
+             "matched against the Skonto accounts when read."
+    )
+    hours = fields.Float(string='Hours', readonly=True)
+    hours_adjusted = fields.Float(string='Hours Bereinigt', readonly=True)
+    amount_abs = fields.Float(string='Absolute Amount', readonly=True)
+    cost_abs = fields.Float(string='Costs', readonly=True)
+    skonto_abs = fields.Float(string='Skonto Candidate Amount', readonly=True)
+    line_count = fields.Integer(string='Lines', readonly=True)
+
+    def init(self):
+        """
+        Create the materialized view (empty until the first refresh, so installing
+        and upgrading stay fast), its indexes and the dirty account table.
+        """
+        if not tools.table_kind(self.env.cr, self._table):
+            self.env.cr.execute(f"""
+                CREATE MATERIALIZED VIEW {self._table} AS
+                SELECT row_number() OVER () AS id,
+                       analytic_line.account_id,
+                       analytic_line.company_id,
+                       date_trunc('month', analytic_line.date)::date AS month,
+                       analytic_line.is_timesheet IS TRUE AS is_timesheet,
+                       COALESCE(move.move_type IN ('in_invoice', 'in_refund'), FALSE) AS is_vendor_bill,
+                       analytic_line.move_line_id IS NOT NULL AS has_move_line,
+                       COALESCE(CASE WHEN move.move_type NOT IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+                                     THEN line.account_id END, 0) AS skonto_account_id,
+                       SUM(COALESCE(analytic_line.unit_amount, 0.0)) AS hours,
+                       SUM(COALESCE(analytic_line.unit_amount, 0.0)
+                           * COALESCE(NULLIF(employee.faktor_hfc, 0.0), 1.0)) AS hours_adjusted,
+                       SUM(ABS(COALESCE(analytic_line.amount, 0.0))) AS amount_abs,
+                       SUM(CASE WHEN analytic_line.amount < 0 THEN -analytic_line.amount ELSE 0.0 END) AS cost_abs,
+                       SUM(CASE WHEN move.move_type NOT IN ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+                                THEN ABS(COALESCE(analytic_line.amount, 0.0)) ELSE 0.0 END) AS skonto_abs,
+                       COUNT(*) AS line_count
+                  FROM account_analytic_line analytic_line
+                  LEFT JOIN account_move_line line ON line.id = analytic_line.move_line_id
+                  LEFT JOIN account_move move ON move.id = line.move_id
+                  LEFT JOIN hr_employee employee ON employee.id = analytic_line.employee_id
+                 WHERE analytic_line.account_id IS NOT NULL
+                 GROUP BY 2, 3, 4, 5, 6, 7, 8
+                  WITH NO DATA
+            """)
+        # REFRESH ... CONCURRENTLY needs a unique index over plain columns
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {self._table}_key_uniq
+                ON {self._table} (account_id, company_id, month, is_timesheet, is_vendor_bill,
+                                  has_move_line, skonto_account_id)
+        """)
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self._dirty_table} (
+                account_id integer PRIMARY KEY,
+                marked_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'UTC')
+            )
+        """)
+
+    @api.model
+    def _is_populated(self):
+        """Whether the cube has been refreshed at least once."""
+        self.env.cr.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = %s", [self._table])
+        row = self.env.cr.fetchone()
+        return bool(row and row[0])
+
+    @api.model
+    def _mark_dirty(self, account_ids):
+        """
+        Read the given analytic accounts live until the next refresh.
+
+        Touches existing rows (instead of ignoring the conflict), so a concurrent
+        refresh that would drop the mark fails with a serialization error and is
+        retried instead of losing it.
+        """
+        account_ids = sorted({account_id for account_id in account_ids if account_id})
+        if not account_ids:
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO {self._dirty_table} (account_id)
+            SELECT unnest(%s::int[])
+            ON CONFLICT (account_id) DO UPDATE SET marked_at = (now() at time zone 'UTC')
+        """, [account_ids])
+
+    @api.model
+    def _get_dirty_account_ids(self, account_ids):
+        self.env.cr.execute(
+            f"SELECT account_id FROM {self._dirty_table} WHERE account_id = ANY(%s)", [list(account_ids)]
+        )
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _refresh_cube(self):
+        """
+        Refresh the cube and clear the dirty accounts.
+
+        Both run in the same transaction, i.e. on the same snapshot: exactly the
+        changes contained in the refreshed cube are unmarked. The first refresh is a
+        plain one, later refreshes run CONCURRENTLY so readers are never blocked.
+        """
+        self.env['account.analytic.line'].flush_model()
+        self.env['hr.employee'].flush_model(['faktor_hfc'])
+        concurrently = 'CONCURRENTLY' if self._is_populated() else ''
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW {concurrently} {self._table}")
+        self.env.cr.execute(f"DELETE FROM {self._dirty_table}")
+        _logger.info("Refreshed analytic line cube (%s)", concurrently.lower() or 'initial')
@@ -0,0 +1,74 @@
+from odoo import models, fields, api
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsProfile(models.Model):
+    _name = 'project.analytics.profile'
+    _description = 'Project Analytics Profile'
+    _order = 'id desc'
+
+    operation = fields.Char(string='Operation', readonly=True)
+    engine = fields.Selection(
+        [('sql', 'SQL'), ('orm', 'ORM')],
+        string='Engine',
+        readonly=True
+    )
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    project_count = fields.Integer(string='Projects', readonly=True, aggregator='sum')
+    query_count = fields.Integer(string='SQL Queries', readonly=True, aggregator='sum')
+    row_count = fields.Integer(string='Rows Scanned', readonly=True, aggregator='sum')
+    matched_lines = fields.Integer(
+        string='Matched Allocations',
+        readonly=True,
+        aggregator='sum',
+        help="Analytic distribution entries that matched one of the computed projects (ORM engine)."
+    )
+    duration = fields.Float(string='Duration (s)', digits=(16, 4), readonly=True, aggregator='sum')
+    phase_details = fields.Text(
+        string='Phases',
+        readonly=True,
+        help="Wall time (seconds) and SQL queries per phase as JSON."
+    )
+
+    @api.model
+    def _record(self, profiler):
+        """
+        Store a finished AnalyticsProfiler when the project_analytics.profiling_enabled
+        system parameter is set. Its summary is only logged at DEBUG: refreshes also
+        run when views are opened, INFO would flood the logs.
+
+        Args:
+            profiler: finished AnalyticsProfiler
+        """
+        stats = profiler.as_dict()
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug(
+                "Project analytics %s (%s engine): %d project(s), %d queries, %d rows, %d matched allocation(s) "
+                "in %.3fs, phases: %s",
+                stats['operation'], stats['engine'], stats['project_count'], stats['queries'],
+                stats['rows'], stats['matched_lines'], stats['duration'], stats['phases'],
+            )
+
+        if not self.env['ir.config_parameter']._get_project_analytics_config().profiling_enabled:
+            return self.browse()
+        return self.sudo().create({
+            'operation': stats['operation'],
+            'engine': stats['engine'],
+            'user_id': self.env.uid,
+            'project_count': stats['project_count'],
+            'query_count': stats['queries'],
+            'row_count': stats['rows'],
+            'matched_lines': stats['matched_lines'],
+            'duration': stats['duration'],
+            'phase_details': json.dumps(stats['phases'], indent=2),
+        })
+
+    @api.autovacuum
+    def _gc_profiles(self):
+        """Drop profiles older than 30 days."""
+        self.sudo().search([
+            ('create_date', '<', fields.Datetime.subtract(fields.Datetime.now(), days=30)),
+        ]).unlink()
@@ -0,0 +1,143 @@
+from odoo import models, fields, api
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsQueue(models.Model):
+    _name = 'project.analytics.queue'
+    _description = 'Project Analytics Recompute Queue'
+    _order = 'id'
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Project',
+        required=True,
+        ondelete='cascade',
+        help="Project whose financial snapshot has to be recomputed."
+    )
+
+    _sql_constraints = [
+        ('project_uniq', 'unique(project_id)', 'A project can only be queued once.'),
+    ]
+
+    @api.model
+    def _enqueue(self, project_ids):
+        """
+        Mark projects as dirty so the queue worker recomputes their snapshots.
+
+        Only appends to the queue (duplicates are ignored by the unique constraint),
+        never computes and never commits, so it is cheap enough to be called from
+        account.move.line create/write/unlink.
+
+        Args:
+            project_ids: iterable of project.project ids
+        """
+        project_ids = sorted(set(project_ids))
+        if not project_ids:
+            return
+
+        self.env.cr.execute("""
+            INSERT INTO project_analytics_queue (project_id, create_date, write_date, create_uid, write_uid)
+            SELECT project_id, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC', %(uid)s, %(uid)s
+              FROM unnest(%(project_ids)s) AS project_id
+            ON CONFLICT (project_id) DO NOTHING
+        """, {'project_ids': project_ids, 'uid': self.env.uid})
+
+        # Wake up the worker once per transaction instead of once per call
+        precommit_data = self.env.cr.precommit.data
+        if not precommit_data.get('project_analytics.queue_triggered'):
+            precommit_data['project_analytics.queue_triggered'] = True
+            cron = self.env.ref('project_statistic.ir_cron_project_analytics_queue', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+
+    @api.model
+    def _dequeue(self, projects):
+        """
+        Remove the given projects from the queue after their snapshots were
+        recomputed for all companies. Rows locked by a running queue worker are left
+        to it (SKIP LOCKED), so this never waits for a worker transaction.
+        """
+        if not projects:
+            return
+        self.env.cr.execute("""
+            DELETE FROM project_analytics_queue
+             WHERE id IN (
+                    SELECT id
+                      FROM project_analytics_queue
+                     WHERE project_id = ANY(%s)
+                       FOR UPDATE SKIP LOCKED
+             )
+        """, [projects.ids])
+
+    @api.model
+    def _get_queued_project_ids(self, projects):
+        """Ids of the given projects that wait in the queue for a recomputation."""
+        self.env.cr.execute(
+            "SELECT project_id FROM project_analytics_queue WHERE project_id = ANY(%s)", [projects.ids]
+        )
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _cron_process_queue(self, batch_size=None):
+        """
+        Drain the queue: recompute the snapshots of dirty projects in batches.
+
+        Every batch runs in its own transaction (committed after each batch outside of
+        tests). Rows are locked with SKIP LOCKED so concurrent workers never process
+        the same project twice.
+
+        Args:
+            batch_size: number of projects recomputed per transaction,
+                defaults to the project_analytics.queue_batch_size parameter
+        """
+        if not batch_size:
+            batch_size = self.env['ir.config_parameter']._get_project_analytics_config().queue_batch_size
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        companies = self.env['res.company'].sudo().search([])
+        Snapshot = self.env['project.analytics.snapshot'].with_context(project_analytics_operation='queue')
+        processed = 0
+
+        while True:
+            self.env.cr.execute("""
+                SELECT id, project_id
+                  FROM project_analytics_queue
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [batch_size])
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+
+            projects = self.env['project.project'].with_context(active_test=False).browse(
+                {project_id for _queue_id, project_id in rows}
+            ).exists()
+            try:
+                with self.env.cr.savepoint():
+                    Snapshot._refresh_projects(projects, companies)
+            except Exception as e:
+                _logger.error("Error recomputing queued projects %s, retrying one by one: %s", projects.ids, e)
+                for project in projects:
+                    try:
+                        with self.env.cr.savepoint():
+                            Snapshot._refresh_projects(project, companies)
+                    except Exception as project_error:
+                        _logger.error(
+                            "Could not recompute financial data for project %s, dropping it from the queue: %s",
+                            project.id, project_error, exc_info=True
+                        )
+
+            self.env.cr.execute(
+                "DELETE FROM project_analytics_queue WHERE id IN %s",
+                [tuple(queue_id for queue_id, _project_id in rows)]
+            )
+            processed += len(projects)
+            if auto_commit:
+                self.env.cr.commit()
+
+        if processed:
+            _logger.info("Recomputed financial data for %d queued project(s)", processed)
+        return processed
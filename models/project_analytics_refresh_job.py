@@ -0,0 +1,308 @@
+from odoo import models, fields, api, tools, _
+import logging
+import threading
+import uuid
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsRefreshJob(models.Model):
+    _name = 'project.analytics.refresh.job'
+    _description = 'Project Analytics Refresh Job'
+    _order = 'id desc'
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Requested By',
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.user,
+    )
+    state = fields.Selection(
+        [('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')],
+        string='Status',
+        required=True,
+        readonly=True,
+        default='pending',
+        index=True,
+    )
+    project_ids = fields.Many2many(
+        'project.project',
+        'project_analytics_refresh_job_project_rel',
+        'job_id',
+        'project_id',
+        string='Projects',
+        readonly=True,
+    )
+    company_ids = fields.Many2many(
+        'res.company',
+        string='Companies',
+        readonly=True,
+        help="Companies whose snapshots are recomputed (the companies selected when the job was started)."
+    )
+    hourly_rate = fields.Float(string='Hourly Rate', readonly=True)
+    date_from = fields.Date(
+        string='Period Start',
+        readonly=True,
+        help="With a period the job refreshes the monthly buckets of the period instead of the snapshots."
+    )
+    date_to = fields.Date(string='Period End', readonly=True)
+    group_key = fields.Char(
+        string='Refresh',
+        readonly=True,
+        index=True,
+        help="Technical: shared by all partitions of one refresh."
+    )
+    partition_index = fields.Integer(string='Partition', readonly=True, default=1)
+    partition_count = fields.Integer(string='Partitions', readonly=True, default=1)
+    analytic_account_range = fields.Char(
+        string='Analytic Accounts',
+        readonly=True,
+        help="Range of analytic account ids covered by this partition."
+    )
+    project_count = fields.Integer(string='Projects', readonly=True)
+    done_count = fields.Integer(
+        string='Processed',
+        readonly=True,
+        help="Projects already recomputed. Every chunk is committed, an interrupted job resumes after the last one."
+    )
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+    date_done = fields.Datetime(string='Finished', readonly=True)
+    error_message = fields.Text(string='Error', readonly=True)
+
+    @api.depends('done_count', 'project_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = 100.0 * job.done_count / job.project_count if job.project_count else 100.0
+
+    @api.model
+    def _create_job(self, projects, hourly_rate, companies=None, partitions=None, date_from=None, date_to=None):
+        """
+        Queue a recomputation of the given projects and wake up the worker.
+
+        The projects are split into partitions of consecutive analytic accounts, one
+        job each, so the worker threads can compute them in parallel (see
+        _cron_process_jobs()). Every project belongs to exactly one partition and its
+        snapshot rows are only written by that partition.
+
+        Args:
+            projects: Recordset of project.project
+            hourly_rate: rate for the adjusted labor costs
+            companies: Recordset of res.company, defaults to the allowed companies
+            partitions: number of partitions, defaults to the
+                project_analytics.refresh_workers parameter
+            date_from, date_to: period whose monthly buckets are refreshed instead
+                of the snapshots, see project.analytics.bucket._refresh_buckets()
+
+        Returns:
+            project.analytics.refresh.job recordset, one record per partition
+        """
+        if partitions is None:
+            partitions = self.env['ir.config_parameter']._get_project_analytics_config().refresh_workers
+        group_key = uuid.uuid4().hex
+        vals_list = []
+        parts = self._partition_projects(projects, partitions)
+        for index, (part, account_range) in enumerate(parts, start=1):
+            vals_list.append({
+                'user_id': self.env.uid,
+                'project_ids': [(6, 0, part.ids)],
+                'company_ids': [(6, 0, (companies or self.env.companies).ids)],
+                'hourly_rate': hourly_rate,
+                'date_from': date_from,
+                'date_to': date_to,
+                'project_count': len(part),
+                'group_key': group_key,
+                'partition_index': index,
+                'partition_count': len(parts),
+                'analytic_account_range': account_range,
+            })
+        jobs = self.sudo().create(vals_list)
+        cron = self.env.ref('project_statistic.ir_cron_project_analytics_refresh_job', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return jobs
+
+    @api.model
+    def _partition_projects(self, projects, partitions):
+        """
+        Split projects into at most `partitions` parts of consecutive analytic
+        account ids (projects without analytic account first), as resolved by
+        project.project._get_project_analytic_accounts(). All projects of one
+        analytic account stay in the same part, so two workers never compute the
+        baseline of the same account. The split only depends on the ids, so a
+        re-run partitions the same way.
+
+        Returns:
+            list of (project.project recordset, analytic account range label)
+        """
+        account_by_project, _analytic_accounts = projects._get_project_analytic_accounts()
+        project_ids_by_account = {}
+        for project_id, account in account_by_project.items():
+            project_ids_by_account.setdefault(account.id if account else 0, []).append(project_id)
+
+        partitions = max(1, min(partitions or 1, len(projects)))
+        part_ids = [[] for _index in range(partitions)]
+        part_accounts = [[] for _index in range(partitions)]
+        assigned = 0
+        for account_id in sorted(project_ids_by_account):
+            project_ids = sorted(project_ids_by_account[account_id])
+            # A part is chosen by the position of the group's first project
+            index = assigned * partitions // len(projects)
+            part_ids[index].extend(project_ids)
+            if account_id:
+                part_accounts[index].append(account_id)
+            assigned += len(project_ids)
+
+        return [
+            (projects.browse(ids), '%s-%s' % (min(accounts), max(accounts)) if accounts else '')
+            for ids, accounts in zip(part_ids, part_accounts)
+            if ids
+        ]
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=None):
+        """
+        Process pending and interrupted refresh jobs chunk by chunk.
+
+        With project_analytics.refresh_workers > 1 the partitions are computed in
+        parallel: additional threads, each with its own cursor, take the next free
+        job with SKIP LOCKED, so no job is processed twice. Threads share the GIL,
+        so only the SQL-bound part (the aggregation queries, run by PostgreSQL while
+        the threads wait) gets faster; distribution parsing, Skonto matching and ORM
+        writes do not. The number of threads is capped by the database connection
+        pool, see _get_worker_count(). Each chunk is committed
+        (outside of tests) together with the job progress, so a worker hitting
+        limit_time_real loses at most one chunk and the next run continues where it
+        stopped.
+
+        Args:
+            batch_size: number of projects recomputed per transaction,
+                defaults to the project_analytics.queue_batch_size parameter
+        """
+        config = self.env['ir.config_parameter']._get_project_analytics_config()
+        batch_size = batch_size or config.queue_batch_size
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+
+        threads = []
+        if auto_commit:
+            for index in range(self._get_worker_count(config) - 1):
+                thread = threading.Thread(
+                    target=self._process_jobs_in_thread,
+                    args=(batch_size,),
+                    name='project_analytics_refresh_%d' % (index + 1),
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        self._process_jobs(batch_size, auto_commit)
+        for thread in threads:
+            thread.join()
+
+    @api.model
+    def _get_worker_count(self, config):
+        """
+        Number of refresh threads: the project_analytics.refresh_workers parameter,
+        but at most half of the connection pool of this process (db_maxconn), so
+        the cursors of the workers never exhaust it.
+        """
+        max_workers = max(1, tools.config['db_maxconn'] // 2)
+        if config.refresh_workers > max_workers:
+            _logger.warning("project_analytics.refresh_workers (%s) exceeds the database connection pool, "
+                            "using %s worker(s)", config.refresh_workers, max_workers)
+        return max(1, min(config.refresh_workers, max_workers))
+
+    @api.model
+    def _process_jobs_in_thread(self, batch_size):
+        """Worker thread of _cron_process_jobs(), running on its own cursor."""
+        threading.current_thread().dbname = self.env.cr.dbname
+        try:
+            with self.pool.cursor() as cr:
+                self.with_env(self.env(cr=cr))._process_jobs(batch_size, auto_commit=True)
+        except Exception as e:
+            _logger.error("Refresh worker thread failed: %s", e, exc_info=True)
+
+    @api.model
+    def _process_jobs(self, batch_size, auto_commit):
+        """Process chunks of the next free job until no job is left."""
+        while True:
+            self.env.cr.execute("""
+                SELECT id
+                  FROM project_analytics_refresh_job
+                 WHERE state IN ('pending', 'running')
+                 ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            job = self.sudo().browse(row[0])
+            job._process_chunk(batch_size)
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _process_chunk(self, batch_size):
+        """Recompute the next chunk of projects of this job and store the progress."""
+        self.ensure_one()
+        # Archived projects keep their place, otherwise the chunks after them would shift
+        project_ids = sorted(self.with_context(active_test=False).project_ids.ids)
+        chunk = project_ids[self.done_count:self.done_count + batch_size]
+        projects = self.env['project.project'].with_context(active_test=False).browse(chunk).exists()
+        try:
+            with self.env.cr.savepoint():
+                if self.date_from:
+                    Bucket = self.env['project.analytics.bucket'].with_user(self.user_id).with_context(
+                        custom_hourly_rate=self.hourly_rate,
+                        project_analytics_operation='wizard_period',
+                    )
+                    Bucket.sudo()._refresh_buckets(projects, self.date_from, self.date_to, self.company_ids)
+                else:
+                    Snapshot = self.env['project.analytics.snapshot'].with_user(self.user_id).with_context(
+                        custom_hourly_rate=self.hourly_rate,
+                        project_analytics_operation='wizard',
+                        # Jobs run for the wizard and the nightly precomputation, both rebuild the drill-down
+                        project_analytics_rebuild_contributions=True,
+                    )
+                    Snapshot.sudo()._refresh_projects(projects, self.company_ids)
+        except Exception as e:
+            _logger.error("Refresh job %s failed on projects %s: %s", self.id, projects.ids, e, exc_info=True)
+            self.write({'state': 'failed', 'error_message': str(e), 'date_done': fields.Datetime.now()})
+            self._notify_user(_("The financial data could not be recalculated: %s", e), 'danger')
+            return
+
+        done_count = min(self.done_count + batch_size, len(project_ids))
+        if done_count < len(project_ids):
+            self.write({'state': 'running', 'done_count': done_count})
+            return
+        self.write({'state': 'done', 'done_count': done_count, 'date_done': fields.Datetime.now()})
+        _logger.info("Refresh job %s recomputed %d project(s)", self.id, done_count)
+        if self.date_from:
+            message = _("Monthly figures from %(date_from)s to %(date_to)s have been recalculated for %(count)s "
+                        "project(s), see Projekt Statistik → Nach Monat.", date_from=self.date_from,
+                        date_to=self.date_to, count=done_count)
+        elif self.partition_count > 1:
+            message = _("Financial data has been recalculated for %(count)s project(s) with hourly rate of "
+                        "%(rate)s€ (part %(index)s of %(total)s).", count=done_count, rate=self.hourly_rate,
+                        index=self.partition_index, total=self.partition_count)
+        else:
+            message = _("Financial data has been recalculated for %(count)s project(s) with hourly rate of %(rate)s€.",
+                        count=done_count, rate=self.hourly_rate)
+        self._notify_user(message, 'success')
+
+    def _notify_user(self, message, notification_type):
+        """Send a notification to the user who started the job."""
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'simple_notification', {
+            'title': _('Financial Data Refresh'),
+            'message': message,
+            'type': notification_type,
+            'sticky': notification_type == 'danger',
+        })
+
+    @api.autovacuum
+    def _gc_jobs(self):
+        """Drop finished jobs older than 30 days."""
+        self.sudo().search([
+            ('state', 'in', ('done', 'failed')),
+            ('create_date', '<', fields.Datetime.subtract(fields.Datetime.now(), days=30)),
+        ]).unlink()
@@ -0,0 +1,381 @@
+from odoo import models, fields, api
+import logging
+from datetime import timedelta
+
+from .analytics_profiler import AnalyticsProfiler
+from .project_analytics import FINANCIAL_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectAnalyticsSnapshot(models.Model):
+    _name = 'project.analytics.snapshot'
+    _description = 'Project Financial Snapshot'
+    _order = 'project_id, company_id'
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Project',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        help="Company whose invoices, bills and analytic lines these figures are computed from."
+    )
+    last_computed = fields.Datetime(
+        string='Last Computed',
+        readonly=True,
+        help="When these figures were last recomputed from invoices, bills and analytic lines."
+    )
+
+    # Project dimensions, stored for grouping, sorting and filtering
+    partner_id = fields.Many2one(
+        related='project_id.partner_id',
+        string='Name of Client',
+        store=True,
+        index=True,
+    )
+    user_id = fields.Many2one(
+        related='project_id.user_id',
+        string='Head of Project',
+        store=True,
+        index=True,
+    )
+    stage_id = fields.Many2one(
+        related='project_id.stage_id',
+        string='Stage',
+        store=True,
+    )
+    date_start = fields.Date(
+        related='project_id.date_start',
+        string='Start Date',
+        store=True,
+    )
+    date = fields.Date(
+        related='project_id.date',
+        string='Expiration Date',
+        store=True,
+    )
+    project_active = fields.Boolean(
+        related='project_id.active',
+        string='Active Project',
+        store=True,
+    )
+
+    # Financial figures (see project.project for their definitions)
+    customer_invoiced_amount = fields.Float(string='Total Invoiced Amount', readonly=True, aggregator='sum')
+    customer_paid_amount = fields.Float(string='Total Paid Amount', readonly=True, aggregator='sum')
+    customer_outstanding_amount = fields.Float(string='Outstanding Amount', readonly=True, aggregator='sum', index=True)
+    vendor_bills_total = fields.Float(string='Vendor Bills Total', readonly=True, aggregator='sum')
+    customer_skonto_taken = fields.Float(string='Customer Cash Discounts (Skonto)', readonly=True, aggregator='sum')
+    vendor_skonto_received = fields.Float(string='Vendor Cash Discounts Received', readonly=True, aggregator='sum')
+    total_costs_net = fields.Float(string='Net Costs (without tax)', readonly=True, aggregator='sum')
+    total_costs_with_tax = fields.Float(string='Total Costs (with tax)', readonly=True, aggregator='sum')
+    profit_loss = fields.Float(string='Profit/Loss Amount', readonly=True, aggregator='sum', index=True)
+    negative_difference = fields.Float(string='Negative Differences (losses)', readonly=True, aggregator='sum')
+    total_hours_booked = fields.Float(string='Total Hours Booked', readonly=True, aggregator='sum')
+    total_hours_booked_adjusted = fields.Float(string='Total Hours Booked Bereinigt', readonly=True, aggregator='sum')
+    labor_costs = fields.Float(string='Labor Costs', readonly=True, aggregator='sum')
+    labor_costs_adjusted = fields.Float(string='Labor Costs Bereinigt', readonly=True, aggregator='sum', index=True)
+
+    _sql_constraints = [
+        ('project_company_uniq', 'unique(project_id, company_id)',
+         'There can only be one financial snapshot per project and company.'),
+    ]
+
+    @api.model
+    def _refresh_projects(self, projects, companies=None):
+        """
+        Recompute the financial figures of the given projects and store them.
+
+        Figures are computed separately for every company, so each snapshot row only
+        contains the invoices, bills and analytic lines of its own company.
+
+        Every call is measured with an AnalyticsProfiler (unless one is already
+        active) and recorded via project.analytics.profile._record(). The context key
+        project_analytics_operation names the operation in the profile.
+
+        Args:
+            projects: Recordset of project.project
+            companies: Recordset of res.company, defaults to the allowed companies
+        """
+        if not projects:
+            return
+        if AnalyticsProfiler.current().active:
+            self._compute_and_store(projects, companies)
+            return
+        with AnalyticsProfiler(self.env.cr, self.env.context.get('project_analytics_operation', 'refresh')) as profiler:
+            profiler.engine = projects._get_aggregation_engine()
+            self._compute_and_store(projects, companies)
+        self.env['project.analytics.profile']._record(profiler)
+
+    @api.model
+    def _compute_and_store(self, projects, companies=None):
+        """
+        Compute and store the snapshots per company, see _refresh_projects().
+
+        The line-level contributions are kept up to date by the journal item hooks.
+        They are only rebuilt from the whole history with the context key
+        project_analytics_rebuild_contributions (nightly precomputation, forced and
+        wizard refreshes), never for the stale-on-read recomputations.
+        """
+        profiler = AnalyticsProfiler.current()
+        profiler.count(projects=len(projects))
+        for company in (companies or self.env.companies):
+            # Snapshots always hold the whole history, never a context period
+            company_projects = projects.with_context(
+                allowed_company_ids=[company.id],
+                project_analytics_date_from=None,
+                project_analytics_date_to=None,
+            )
+            values_by_project = company_projects._compute_financial_values()
+            with profiler.phase('store'):
+                self._store_values(company, values_by_project)
+            if self.env.context.get('project_analytics_rebuild_contributions'):
+                self.env['project.analytics.contribution'].sudo()._rebuild(company_projects, company)
+
+        # Queued projects recomputed for every company are no longer dirty
+        if companies and companies >= self.env['res.company'].sudo().search([]):
+            self.env['project.analytics.queue']._dequeue(projects)
+
+    @api.model
+    def _store_values(self, company, values_by_project):
+        """
+        Create or update the snapshot rows of one company.
+
+        Args:
+            company: res.company record
+            values_by_project: {project_id: {field_name: value}}
+        """
+        existing = self.sudo().search([
+            ('company_id', '=', company.id),
+            ('project_id', 'in', list(values_by_project)),
+        ])
+        snapshot_by_project = {snapshot.project_id.id: snapshot for snapshot in existing}
+        now = fields.Datetime.now()
+
+        to_create = []
+        for project_id, values in values_by_project.items():
+            vals = dict(values, last_computed=now)
+            snapshot = snapshot_by_project.get(project_id)
+            if snapshot:
+                snapshot.write(vals)
+            else:
+                to_create.append(dict(vals, project_id=project_id, company_id=company.id))
+        if to_create:
+            self.sudo().create(to_create)
+
+        # The recomputed figures already contain the changes queued so far
+        pending = self.env.cr.precommit.data.get('project_analytics.snapshot_deltas')
+        if pending:
+            for project_id in values_by_project:
+                pending.pop((project_id, company.id), None)
+
+        _logger.debug("Stored financial snapshot for %d project(s) of company %s", len(values_by_project), company.name)
+
+    @api.model
+    def _add_deltas(self, deltas):
+        """
+        Schedule incremental changes of the stored invoice and bill figures.
+
+        Deltas are collected for the whole transaction and written with a single
+        UPDATE right before commit, see _flush_deltas(). Missing snapshots are not
+        created: they are computed in full when first read. A full recomputation
+        drops the pending deltas of its snapshots, see _store_values().
+
+        Args:
+            deltas: {(project_id, company_id): [invoiced, paid, vendor]}
+        """
+        data = self.env.cr.precommit.data
+        pending = data.get('project_analytics.snapshot_deltas')
+        if pending is None:
+            pending = data['project_analytics.snapshot_deltas'] = {}
+            self.env.cr.precommit.add(self._flush_deltas)
+        for key, delta in deltas.items():
+            totals = pending.setdefault(key, [0.0, 0.0, 0.0])
+            for index, value in enumerate(delta):
+                totals[index] += value
+
+    def _flush_deltas(self):
+        """Apply the deltas collected by _add_deltas() to the snapshot rows."""
+        pending = self.env.cr.precommit.data.pop('project_analytics.snapshot_deltas', {})
+        pending = {key: delta for key, delta in pending.items() if any(delta)}
+        if not pending:
+            return
+        self.env.cr.execute("""
+            UPDATE project_analytics_snapshot AS snapshot
+               SET customer_invoiced_amount = snapshot.customer_invoiced_amount + delta.invoiced,
+                   customer_paid_amount = snapshot.customer_paid_amount + delta.paid,
+                   customer_outstanding_amount = snapshot.customer_outstanding_amount + delta.invoiced - delta.paid,
+                   vendor_bills_total = snapshot.vendor_bills_total + delta.vendor,
+                   profit_loss = snapshot.profit_loss + delta.invoiced - delta.vendor,
+                   negative_difference = ABS(LEAST(0, snapshot.profit_loss + delta.invoiced - delta.vendor)),
+                   write_date = (now() at time zone 'UTC')
+              FROM unnest(%s::int[], %s::int[], %s::float8[], %s::float8[], %s::float8[])
+                   AS delta(project_id, company_id, invoiced, paid, vendor)
+             WHERE snapshot.project_id = delta.project_id
+               AND snapshot.company_id = delta.company_id
+        """, [
+            [project_id for project_id, _company_id in pending],
+            [company_id for _project_id, company_id in pending],
+            [delta[0] for delta in pending.values()],
+            [delta[1] for delta in pending.values()],
+            [delta[2] for delta in pending.values()],
+        ])
+        self.invalidate_model()
+        _logger.debug("Applied incremental changes to %d financial snapshot(s)", len(pending))
+
+    @api.model
+    def _cron_reconcile_snapshots(self):
+        """
+        Nightly precomputation: recompute all active projects in full.
+
+        Keeps every snapshot younger than project_analytics.snapshot_ttl_minutes, so
+        views serve stored figures during the day. Incremental changes only cover
+        invoices, bills and payments; the full recomputation also corrects any drift
+        (e.g. changed Skonto configuration, timesheets, concurrent updates). It runs
+        as partitioned background refresh jobs, computed in parallel with
+        project_analytics.refresh_workers > 1.
+        """
+        projects = self.env['project.project'].sudo().search([])
+        if not projects:
+            return
+        companies = self.env['res.company'].sudo().search([])
+        hourly_rate = self.env['ir.config_parameter']._get_project_analytics_config().default_hourly_rate
+        jobs = self.env['project.analytics.refresh.job']._create_job(projects, hourly_rate, companies)
+        _logger.info("Queued %d project(s) in %d partition(s) for the nightly snapshot precomputation",
+                     len(projects), len(jobs))
+
+    @api.model
+    def _get_project_values(self, projects):
+        """
+        Read the financial figures of the given projects from their snapshots.
+
+        Only stale rows are recomputed: a project/company pair without a snapshot or
+        with a snapshot older than project_analytics.snapshot_ttl_minutes is computed
+        and stored first. Projects waiting in the recompute queue are computed for all
+        companies like the queue worker does, which takes them out of the queue. All
+        others are served as stored. Figures of the allowed companies are summed per
+        project.
+
+        Returns:
+            dict: {project_id: {field_name: value}} for every project in projects
+        """
+        values_by_project = {project_id: dict.fromkeys(FINANCIAL_FIELDS, 0.0) for project_id in projects.ids}
+        if not values_by_project:
+            return values_by_project
+
+        snapshots, queued, stale_by_company = self._get_stale_projects(projects)
+        if queued:
+            self.sudo()._refresh_projects(queued, self.env['res.company'].sudo().search([]))
+        for company, stale in stale_by_company.items():
+            self._refresh_projects(stale, company)
+        if queued or stale_by_company:
+            snapshots = self.sudo().search([
+                ('project_id', 'in', projects.ids),
+                ('company_id', 'in', self.env.companies.ids),
+            ])
+
+        for snapshot in snapshots:
+            values = values_by_project[snapshot.project_id.id]
+            for fname in FINANCIAL_FIELDS:
+                values[fname] += snapshot[fname]
+
+        # Losses are not additive across companies
+        for values in values_by_project.values():
+            values['negative_difference'] = abs(min(0, values['profit_loss']))
+
+        return values_by_project
+
+    @api.model
+    def _get_stale_projects(self, projects):
+        """
+        Projects whose snapshots can not be served as stored, see _get_project_values().
+
+        Returns:
+            tuple: (stored snapshots of the allowed companies,
+                    projects waiting in the recompute queue,
+                    {company: other projects without snapshot or with an expired one})
+        """
+        snapshots = self.sudo().search([
+            ('project_id', 'in', projects.ids),
+            ('company_id', 'in', self.env.companies.ids),
+        ])
+        expired_before = self._get_expiry_limit()
+        fresh = {
+            (snapshot.project_id.id, snapshot.company_id.id)
+            for snapshot in snapshots
+            if not (expired_before and snapshot.last_computed and snapshot.last_computed < expired_before)
+        }
+        queued_ids = self.env['project.analytics.queue']._get_queued_project_ids(projects)
+        stale_by_company = {}
+        for company in self.env.companies:
+            stale = projects.filtered(lambda p: p.id not in queued_ids and (p.id, company.id) not in fresh)
+            if stale:
+                stale_by_company[company] = stale
+        return snapshots, projects.filtered(lambda p: p.id in queued_ids), stale_by_company
+
+    @api.model
+    def _get_expiry_limit(self):
+        """
+        Snapshots computed before this datetime are expired, see the
+        project_analytics.snapshot_ttl_minutes parameter (0 = never expire).
+        """
+        ttl = self.env['ir.config_parameter']._get_project_analytics_config().snapshot_ttl_minutes
+        if ttl <= 0:
+            return None
+        return fields.Datetime.now() - timedelta(minutes=ttl)
+
+    @api.model
+    def _get_last_computed(self, projects):
+        """
+        When the figures of the given projects were last fully recomputed.
+
+        Returns:
+            dict: {project_id: oldest last_computed of the allowed companies}
+        """
+        groups = self.sudo()._read_group(
+            [('project_id', 'in', projects.ids), ('company_id', 'in', self.env.companies.ids)],
+            ['project_id'],
+            ['last_computed:min'],
+        )
+        return {project.id: last_computed for project, last_computed in groups}
+
+    @api.model
+    def action_open_analytics_dashboard(self):
+        """
+        Open the Projektstatistik dashboard on the stored snapshots.
+
+        Nothing is computed here: projects without snapshot or with an expired one
+        are handed to a background refresh job (unless one is already pending or
+        running for them), queued projects are left to the queue worker. The user is
+        notified when the job is done.
+        """
+        projects = self.env['project.project'].search([])
+        _snapshots, _queued, stale_by_company = self._get_stale_projects(projects)
+        stale = self.env['project.project'].union(*stale_by_company.values())
+        if stale:
+            running = self.env['project.analytics.refresh.job'].sudo().search([
+                ('state', 'in', ('pending', 'running')),
+                ('date_from', '=', False),
+            ])
+            stale -= running.project_ids
+        if stale:
+            config = self.env['ir.config_parameter']._get_project_analytics_config()
+            self.env['project.analytics.refresh.job']._create_job(stale, config.default_hourly_rate)
+            _logger.info("Handed %d project(s) without current snapshot to a background refresh", len(stale))
+        return self.env['ir.actions.act_window']._for_xml_id('project_statistic.action_project_analytics_report')
+
+    def action_open_analytics_form(self):
+        """
+        Open the project analytics form of the snapshot's project.
+        Called when clicking a row in the dashboard list view.
+        """
+        self.ensure_one()
+        return self.project_id.action_open_analytics_form()
@@ -0,0 +1,32 @@
+from odoo import models
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    def _get_project_analytics_lock_date(self):
+        """
+        Date up to which the journal items of the company can no longer change.
+
+        Only the global locks count (fiscalyear_lock_date, hard_lock_date, and
+        period_lock_date on versions that still have it); sale/purchase/tax lock
+        dates leave other journals open. While a lock date exception is active,
+        entries can still be posted before the lock date, so nothing is locked.
+
+        Returns:
+            date or None
+        """
+        self.ensure_one()
+        lock_dates = [
+            self[fname]
+            for fname in ('fiscalyear_lock_date', 'hard_lock_date', 'period_lock_date')
+            if fname in self._fields and self[fname]
+        ]
+        if not lock_dates:
+            return None
+        if 'account.lock_exception' in self.env and self.env['account.lock_exception'].sudo().search_count([
+            ('company_id', '=', self.id),
+            ('state', '=', 'active'),
+        ], limit=1):
+            return None
+        return max(lock_dates)
@@ -0,0 +1,46 @@
+class SkontoPrefixMatcher:
+    """
+    Prefix trie over the configured Skonto account codes.
+
+    Classifies an account code as customer Skonto (Gewährte Skonti) and/or vendor
+    Skonto (Erhaltene Skonti) in a single walk over the code, instead of testing
+    every configured prefix with startswith().
+
+    Example:
+        matcher = SkontoPrefixMatcher(['7300', '2130'], ['4730', '2670'])
+        matcher.classify('730010')  # -> (True, False)
+    """
+
+    _KINDS = None  # trie key holding the kinds of prefixes ending at a node
+
+    def __init__(self, customer_prefixes, vendor_prefixes):
+        self.customer_prefixes = tuple(customer_prefixes)
+        self.vendor_prefixes = tuple(vendor_prefixes)
+        self._root = {}
+        for kind, prefixes in (('customer', self.customer_prefixes), ('vendor', self.vendor_prefixes)):
+            for prefix in prefixes:
+                node = self._root
+                for char in prefix:
+                    node = node.setdefault(char, {})
+                node.setdefault(self._KINDS, set()).add(kind)
+
+    def classify(self, code):
+        """
+        Classify an account code.
+
+        Returns:
+            tuple: (is_customer_skonto, is_vendor_skonto)
+        """
+        node = self._root
+        kinds = set(node.get(self._KINDS, ()))
+        for char in code or '':
+            node = node.get(char)
+            if node is None:
+                break
+            kinds.update(node.get(self._KINDS, ()))
+        return 'customer' in kinds, 'vendor' in kinds
+
+    @property
+    def prefixes(self):
+        """All configured prefixes, customer and vendor."""
+        return self.customer_prefixes + self.vendor_prefixes
@@ -1 +1,2 @@
 from . import test_project_analytics
+from . import test_benchmark
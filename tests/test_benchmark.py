@@ -0,0 +1,272 @@
+"""
+Benchmarks for the project analytics hot paths at realistic data volumes.
+
+Not part of the standard test run. Run them explicitly with:
+
+    odoo-bin -c odoo.conf -d your_database --test-tags /project_statistic:project_analytics_benchmark
+
+Besides timings, the query plans of the main analytics predicates are recorded with
+and without the module's indexes (models/analytics_indexes.py).
+
+Scenario sizes can be overridden with PROJECT_ANALYTICS_BENCH_SCENARIOS, a JSON list of
+{"name", "projects", "move_lines", "timesheets", "skonto_postings"} objects. Results are
+written as JSON to PROJECT_ANALYTICS_BENCH_OUTPUT (default: logged).
+"""
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.project_statistic.models.analytics_indexes import ANALYTICS_INDEXES
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_SCENARIOS = [
+    {'name': 'small', 'projects': 20, 'move_lines': 500, 'timesheets': 500, 'skonto_postings': 20},
+    {'name': 'medium', 'projects': 100, 'move_lines': 5000, 'timesheets': 5000, 'skonto_postings': 200},
+]
+
+LINES_PER_MOVE = 20
+
+
+@tagged('post_install', '-at_install', '-standard', 'project_analytics_benchmark')
+class TestProjectAnalyticsBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+        cls.partner = cls.env['res.partner'].create({'name': 'Benchmark Customer'})
+        cls.project_plan = cls.env.ref('analytic.analytic_plan_projects')
+        cls.income_account = cls.env['account.account'].search([('account_type', '=', 'income')], limit=1)
+        cls.expense_account = cls.env['account.account'].search([('account_type', '=', 'expense')], limit=1)
+        cls.offset_account = cls.env['account.account'].search([('account_type', '=', 'asset_current')], limit=1)
+        cls.skonto_account = cls.env['account.account'].search([('code', '=like', '7300%')], limit=1)
+        if not cls.skonto_account:
+            cls.skonto_account = cls.env['account.account'].create({
+                'name': 'Gewährte Skonti',
+                'code': '7300',
+                'account_type': 'expense',
+            })
+        cls.misc_journal = cls.env['account.journal'].search([
+            ('type', '=', 'general'),
+            ('company_id', '=', cls.env.company.id),
+        ], limit=1)
+        cls.employees = cls.env['hr.employee'].create([
+            {'name': f'Benchmark Employee {index}', 'faktor_hfc': faktor}
+            for index, faktor in enumerate((0.8, 1.0, 1.2, 1.5))
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        payload = json.dumps({'benchmark': 'project_analytics', 'results': cls.results}, indent=2)
+        output = os.environ.get('PROJECT_ANALYTICS_BENCH_OUTPUT')
+        if output:
+            with open(output, 'w') as bench_file:
+                bench_file.write(payload)
+        else:
+            _logger.info("Project analytics benchmark results:\n%s", payload)
+        super().tearDownClass()
+
+    # ------------------------------------------------------------
+    # Synthetic data
+    # ------------------------------------------------------------
+
+    def _generate_dataset(self, scenario):
+        """
+        Create N projects, M invoice/bill lines with split analytic distributions,
+        K timesheets and skonto postings. Deterministic for a given scenario.
+        """
+        rng = random.Random(scenario['name'])
+
+        analytic_accounts = self.env['account.analytic.account'].create([
+            {'name': f"Bench {scenario['name']} {index}", 'plan_id': self.project_plan.id}
+            for index in range(scenario['projects'])
+        ])
+        projects = self.env['project.project'].create([
+            {'name': account.name, 'analytic_account_id': account.id}
+            for account in analytic_accounts
+        ])
+
+        def distribution():
+            accounts = rng.sample(analytic_accounts.ids, k=min(rng.randint(1, 3), len(analytic_accounts)))
+            share = round(100.0 / len(accounts), 2)
+            return {str(account_id): share for account_id in accounts}
+
+        # Invoice and bill lines
+        move_vals = []
+        for move_index in range(0, scenario['move_lines'], LINES_PER_MOVE):
+            customer = move_index % (2 * LINES_PER_MOVE) == 0
+            move_vals.append({
+                'move_type': rng.choice(['out_invoice', 'out_invoice', 'out_refund'] if customer
+                                        else ['in_invoice', 'in_invoice', 'in_refund']),
+                'partner_id': self.partner.id,
+                'invoice_date': fields.Date.today(),
+                'invoice_line_ids': [(0, 0, {
+                    'name': f'Bench line {move_index + line_index}',
+                    'quantity': 1,
+                    'price_unit': rng.randint(50, 5000),
+                    'account_id': (self.income_account if customer else self.expense_account).id,
+                    'analytic_distribution': distribution(),
+                }) for line_index in range(min(LINES_PER_MOVE, scenario['move_lines'] - move_index))],
+            })
+        moves = self.env['account.move'].create(move_vals)
+        moves.action_post()
+
+        # Skonto postings (journal entries with analytic distribution)
+        skonto_moves = self.env['account.move'].create([{
+            'move_type': 'entry',
+            'journal_id': self.misc_journal.id,
+            'date': fields.Date.today(),
+            'line_ids': [
+                (0, 0, {
+                    'name': 'Bench Skonto',
+                    'account_id': self.skonto_account.id,
+                    'debit': amount,
+                    'analytic_distribution': distribution(),
+                }),
+                (0, 0, {
+                    'name': 'Bench Skonto Offset',
+                    'account_id': self.offset_account.id,
+                    'credit': amount,
+                }),
+            ],
+        } for amount in (rng.randint(5, 200) for _index in range(scenario['skonto_postings']))])
+        skonto_moves.action_post()
+
+        # Timesheets
+        self.env['account.analytic.line'].create([{
+            'name': f'Bench timesheet {index}',
+            'project_id': project.id,
+            'account_id': project.analytic_account_id.id,
+            'employee_id': rng.choice(self.employees.ids),
+            'unit_amount': rng.choice((0.5, 1.0, 2.0, 4.0, 8.0)),
+            'amount': -rng.randint(20, 600),
+        } for index, project in ((index, rng.choice(projects)) for index in range(scenario['timesheets']))])
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        return projects, moves
+
+    # ------------------------------------------------------------
+    # Measurement
+    # ------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _measure(self, scenario, operation, **extra):
+        """Record query count, wall time and peak Python memory of the wrapped block."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries_before = self.cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+            self.env.flush_all()
+        finally:
+            wall_time = time.perf_counter() - start
+            _current, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results.append(dict(
+                scenario=scenario['name'],
+                operation=operation,
+                projects=scenario['projects'],
+                move_lines=scenario['move_lines'],
+                timesheets=scenario['timesheets'],
+                skonto_postings=scenario['skonto_postings'],
+                queries=self.cr.sql_log_count - queries_before,
+                wall_time_s=round(wall_time, 4),
+                peak_memory_kb=round(peak_memory / 1024, 1),
+                **extra,
+            ))
+
+    def _explain(self, query, params):
+        """Plan of the query: total estimated cost and the scan nodes it uses."""
+        self.cr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = self.cr.fetchone()[0][0]['Plan']
+        scans = []
+
+        def collect(node):
+            if 'Scan' in node['Node Type']:
+                scans.append(' '.join(filter(None, [node['Node Type'], node.get('Index Name')])))
+            for child in node.get('Plans', ()):
+                collect(child)
+
+        collect(plan)
+        return {'total_cost': plan['Total Cost'], 'scans': scans}
+
+    def _compare_plans(self, scenario, projects):
+        """Record the plans of the hot path predicates with and without the module indexes."""
+        account_ids = projects.analytic_account_id.ids[:5]
+        queries = {
+            'move_lines_by_distribution': ("""
+                SELECT line.id FROM account_move_line line
+                 WHERE line.analytic_distribution IS NOT NULL
+                   AND line.parent_state = 'posted'
+                   AND line.display_type IS NULL
+                   AND line.analytic_distribution ?| %s
+            """, [[str(account_id) for account_id in account_ids]]),
+            'analytic_lines_by_account': ("""
+                SELECT account_id, SUM(amount) FROM account_analytic_line
+                 WHERE account_id IN %s AND company_id = %s GROUP BY account_id
+            """, [tuple(account_ids), self.env.company.id]),
+            'timesheets_by_account': ("""
+                SELECT id FROM account_analytic_line WHERE account_id IN %s AND is_timesheet
+            """, [tuple(account_ids)]),
+            'costs_by_account': ("""
+                SELECT id FROM account_analytic_line WHERE account_id IN %s AND amount < 0
+            """, [tuple(account_ids)]),
+        }
+        self.cr.execute("ANALYZE account_move_line")
+        self.cr.execute("ANALYZE account_analytic_line")
+        with_indexes = {name: self._explain(*query) for name, query in queries.items()}
+        # Drop the indexes temporarily, rolling back to the savepoint restores them
+        self.cr.execute("SAVEPOINT project_analytics_plans")
+        try:
+            for index_name in ANALYTICS_INDEXES:
+                self.cr.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+            without_indexes = {name: self._explain(*query) for name, query in queries.items()}
+        finally:
+            self.cr.execute("ROLLBACK TO SAVEPOINT project_analytics_plans")
+        for name in queries:
+            self.results.append(dict(
+                scenario=scenario['name'],
+                operation=f'plan:{name}',
+                move_lines=scenario['move_lines'],
+                timesheets=scenario['timesheets'],
+                with_indexes=with_indexes[name],
+                without_indexes=without_indexes[name],
+            ))
+
+    def _run_scenario(self, scenario):
+        projects, moves = self._generate_dataset(scenario)
+        self._compare_plans(scenario, projects)
+
+        for engine in ('sql', 'orm'):
+            engine_projects = projects.with_context(project_analytics_engine=engine)
+            with self._measure(scenario, '_compute_financial_data', engine=engine):
+                engine_projects._compute_financial_data()
+
+        lines = moves.line_ids.filtered('analytic_distribution')
+        with self._measure(scenario, '_get_project_analytics_contributions', lines=len(lines)):
+            lines._get_project_analytics_contributions()
+
+        wizard = self.env['project.refresh.wizard'].with_context(
+            active_model='project.project', active_ids=projects.ids,
+        ).create({'hourly_rate': 70.0})
+        with self._measure(scenario, 'project.refresh.wizard'):
+            wizard.action_refresh_financial_data()
+
+    def test_benchmark_scenarios(self):
+        scenarios = json.loads(os.environ.get('PROJECT_ANALYTICS_BENCH_SCENARIOS') or 'null') or DEFAULT_SCENARIOS
+        for scenario in scenarios:
+            with self.subTest(scenario=scenario['name']):
+                self._run_scenario(scenario)
@@ -1,5 +1,16 @@
+import csv
+import io
+from unittest.mock import patch
+
+from dateutil.relativedelta import relativedelta
+
 from odoo.tests.common import TransactionCase
 from odoo import fields
+from odoo.tools import sql
+
+from odoo.addons.project_statistic.models.analytics_indexes import ANALYTICS_INDEXES
+from odoo.addons.project_statistic.models.analytics_profiler import AnalyticsProfiler
+from odoo.addons.project_statistic.models.project_analytics import FINANCIAL_FIELDS
 
 
 class TestProjectAnalytics(TransactionCase):
@@ -35,6 +46,24 @@ class TestProjectAnalytics(TransactionCase):
             ('account_type', '=', 'expense')
         ], limit=1)
 
+    def _create_posted_invoice(self, amount, date):
+        invoice = self.Invoice.create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': date,
+            'date': date,
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Test Service',
+                'quantity': 1,
+                'price_unit': amount,
+                'tax_ids': [(6, 0, [])],
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 100.0},
+            })],
+        })
+        invoice.action_post()
+        return invoice
+
     def test_01_project_without_analytic_account(self):
         """Test that projects without analytic accounts don't crash"""
         project_no_analytic = self.Project.create({
@@ -180,3 +209,855 @@ class TestProjectAnalytics(TransactionCase):
 
         expected_profit = self.project.customer_invoiced_amount - self.project.vendor_bills_total - self.project.total_costs_net
         self.assertAlmostEqual(self.project.profit_loss, expected_profit, places=2)
+
+    def test_07_batch_split_distribution(self):
+        """Test that one batch fills every project a split invoice line touches"""
+        second_analytic = self.AnalyticAccount.create({
+            'name': 'Second Project Analytic',
+            'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+        })
+        second_project = self.Project.create({
+            'name': 'Second Project',
+            'analytic_account_id': second_analytic.id,
+        })
+
+        invoice = self.Invoice.create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Shared Work',
+                'quantity': 1,
+                'price_unit': 1000.0,
+                'account_id': self.income_account.id,
+                'analytic_distribution': {
+                    str(self.analytic_account.id): 60,
+                    str(second_analytic.id): 40,
+                },
+            })],
+        })
+        invoice.action_post()
+
+        projects = self.project | second_project
+        projects._compute_financial_data()
+
+        self.assertAlmostEqual(
+            self.project.customer_invoiced_amount,
+            invoice.amount_total * 0.6,
+            places=2,
+        )
+        self.assertAlmostEqual(
+            second_project.customer_invoiced_amount,
+            invoice.amount_total * 0.4,
+            places=2,
+        )
+        self.assertEqual(
+            self.project._get_customer_invoices_from_analytic(self.analytic_account),
+            projects._get_customer_invoices_batch(self.analytic_account)[self.analytic_account.id],
+        )
+
+    def test_08_sql_engine_matches_orm(self):
+        """Test that the SQL aggregation returns the same totals as the ORM scan"""
+        invoice = self.Invoice.create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Revenue Item',
+                'quantity': 1,
+                'price_unit': 1500.0,
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 75},
+            })],
+        })
+        invoice.action_post()
+
+        refund = self.Invoice.create({
+            'move_type': 'out_refund',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Credit Note',
+                'quantity': 1,
+                'price_unit': 200.0,
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 100},
+            })],
+        })
+        refund.action_post()
+
+        bill = self.Invoice.create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Cost Item',
+                'quantity': 1,
+                'price_unit': 400.0,
+                'account_id': self.expense_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 50},
+            })],
+        })
+        bill.action_post()
+
+        sql_totals = self.project._get_move_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        orm_project = self.project.with_context(project_analytics_engine='orm')
+        orm_customer = orm_project._get_customer_invoices_from_analytic(self.analytic_account)
+        orm_vendor = orm_project._get_vendor_bills_from_analytic(self.analytic_account)
+
+        self.assertAlmostEqual(sql_totals['invoiced'], orm_customer['invoiced'], places=2)
+        self.assertAlmostEqual(sql_totals['paid'], orm_customer['paid'], places=2)
+        self.assertAlmostEqual(sql_totals['vendor'], orm_vendor['total'], places=2)
+
+    def test_09_snapshot_stored(self):
+        """Test that recomputation stores one snapshot per project and company"""
+        self.project._compute_financial_data()
+
+        snapshot = self.env['project.analytics.snapshot'].search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+        self.assertEqual(len(snapshot), 1)
+        self.assertTrue(snapshot.last_computed)
+        self.assertEqual(snapshot.profit_loss, self.project.profit_loss)
+
+        self.project._compute_financial_data()
+        self.assertEqual(self.env['project.analytics.snapshot'].search_count([
+            ('project_id', '=', self.project.id),
+        ]), 1)
+
+    def test_10_dashboard_groupable_and_sortable(self):
+        """Test that the dashboard figures support read_group, order and domain filtering"""
+        bill = self.Invoice.create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Loss Making Cost',
+                'quantity': 1,
+                'price_unit': 900.0,
+                'account_id': self.expense_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 100},
+            })],
+        })
+        bill.action_post()
+
+        # Opening the dashboard computes nothing, missing snapshots go to a background refresh
+        Snapshot = self.env['project.analytics.snapshot']
+        Job = self.env['project.analytics.refresh.job']
+        with patch.object(type(Snapshot), '_refresh_projects') as refresh_projects:
+            Snapshot.action_open_analytics_dashboard()
+        refresh_projects.assert_not_called()
+        jobs = Job.search([('project_ids', 'in', self.project.ids), ('state', '=', 'pending')])
+        self.assertTrue(jobs)
+        Snapshot.action_open_analytics_dashboard()
+        self.assertEqual(Job.search([('project_ids', 'in', self.project.ids), ('state', '=', 'pending')]), jobs)
+        Job._cron_process_jobs()
+
+        losses = Snapshot.search([('profit_loss', '<', 0)], order='profit_loss asc', limit=20)
+        self.assertIn(self.project, losses.project_id)
+
+        groups = Snapshot.read_group(
+            [('project_id', '=', self.project.id)], ['profit_loss:sum'], ['company_id'],
+        )
+        self.assertAlmostEqual(groups[0]['profit_loss'], self.project.profit_loss, places=2)
+
+    def test_11_move_line_hook_queues_project(self):
+        """Test that changes without a delta only queue the project and the worker refreshes it"""
+        Queue = self.env['project.analytics.queue']
+        refund = self.Invoice.create({
+            'move_type': 'out_refund',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Queued Work',
+                'quantity': 1,
+                'price_unit': 300.0,
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 100},
+            })],
+        })
+        refund.action_post()
+
+        self.assertEqual(Queue.search_count([('project_id', '=', self.project.id)]), 1)
+
+        Queue._cron_process_queue()
+
+        self.assertFalse(Queue.search_count([('project_id', '=', self.project.id)]))
+        snapshot = self.env['project.analytics.snapshot'].search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+        self.assertAlmostEqual(snapshot.customer_invoiced_amount, -refund.amount_total, places=2)
+
+    def test_12_analytic_account_project_map(self):
+        """Test that the cached account-to-project map follows project changes"""
+        project_map = self.Project._get_analytic_account_project_map()
+        self.assertIn(self.project.id, project_map[self.analytic_account.id])
+
+        other_analytic = self.AnalyticAccount.create({
+            'name': 'Other Project Analytic',
+            'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+        })
+        self.project.write({'analytic_account_id': other_analytic.id})
+
+        project_map = self.Project._get_analytic_account_project_map()
+        self.assertIn(self.project.id, project_map[other_analytic.id])
+        self.assertNotIn(self.project.id, project_map.get(self.analytic_account.id, ()))
+
+        # The snapshot computation resolves the same account, archived projects included
+        self.project.active = False
+        self.assertEqual(self.Project._get_project_analytic_account(self.project), other_analytic)
+        self.assertIn(self.project.id, self.Project._get_analytic_account_project_map()[other_analytic.id])
+
+    def test_13_analytic_line_query_matches_orm(self):
+        """Test that the grouped analytic line query matches the per-project ORM helpers"""
+        skonto_account = self.env['account.account'].search([
+            ('code', '=like', '7300%')
+        ], limit=1)
+
+        if not skonto_account:
+            skonto_account = self.env['account.account'].create({
+                'name': 'Gewährte Skonti',
+                'code': '7300',
+                'account_type': 'expense',
+            })
+
+        self.AnalyticLine.create({
+            'name': 'Customer Skonto',
+            'account_id': self.analytic_account.id,
+            'amount': -40.0,
+            'move_line_id': self.InvoiceLine.create({
+                'name': 'Skonto Entry',
+                'account_id': skonto_account.id,
+                'debit': 40.0,
+                'credit': 0.0,
+            }).id,
+        })
+        self.AnalyticLine.create({
+            'name': 'Material',
+            'account_id': self.analytic_account.id,
+            'amount': -120.0,
+        })
+
+        sql_totals = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        orm_totals = self.project.with_context(
+            project_analytics_engine='orm'
+        )._get_analytic_line_totals(self.analytic_account)[self.analytic_account.id]
+
+        for key, value in orm_totals.items():
+            self.assertAlmostEqual(sql_totals[key], value, places=2, msg=key)
+
+    def test_14_faktor_hfc_sql_matches_python(self):
+        """Test that SQL-side Faktor HFC weighting equals the Python timesheet loop"""
+        senior = self.env['hr.employee'].create({'name': 'Senior', 'faktor_hfc': 1.5})
+        junior = self.env['hr.employee'].create({'name': 'Junior', 'faktor_hfc': 0.75})
+        unset = self.env['hr.employee'].create({'name': 'No Faktor', 'faktor_hfc': 0.0})
+
+        for employee, hours in ((senior, 8.0), (junior, 6.5), (unset, 3.0), (senior, 1.25)):
+            self.AnalyticLine.create({
+                'name': f'Timesheet {employee.name}',
+                'project_id': self.project.id,
+                'account_id': self.analytic_account.id,
+                'employee_id': employee.id,
+                'unit_amount': hours,
+                'amount': -hours * 50.0,
+            })
+
+        python_data = self.project._get_timesheet_costs(self.analytic_account)
+        sql_data = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+
+        self.assertAlmostEqual(python_data['hours_adjusted'], 8.0 * 1.5 + 6.5 * 0.75 + 3.0 + 1.25 * 1.5, places=4)
+        self.assertAlmostEqual(sql_data['hours_adjusted'], python_data['hours_adjusted'], places=4)
+        self.assertAlmostEqual(sql_data['hours'], python_data['hours'], places=4)
+        self.assertAlmostEqual(sql_data['costs'], python_data['costs'], places=4)
+
+    def test_15_skonto_prefix_matcher(self):
+        """Test the cached Skonto prefix matcher and its invalidation"""
+        matcher = self.Project._get_skonto_matcher()
+        self.assertEqual(matcher.classify('730050'), (True, False))
+        self.assertEqual(matcher.classify('4731'), (False, True))
+        self.assertEqual(matcher.classify('8400'), (False, False))
+        self.assertEqual(matcher.classify(''), (False, False))
+
+        self.env['ir.config_parameter'].sudo().set_param(
+            'project_analytics.customer_skonto_accounts', '84'
+        )
+        matcher = self.Project._get_skonto_matcher()
+        self.assertEqual(matcher.classify('8400'), (True, False))
+        self.assertEqual(matcher.classify('730050'), (False, False))
+
+    def test_16_cached_config(self):
+        """Test that analytics parameters are parsed into typed, cached values"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('project_analytics.default_hourly_rate', '80')
+        ICP.set_param('project_analytics.vendor_skonto_accounts', ' 4730, ,2670 ')
+
+        config = ICP._get_project_analytics_config()
+        self.assertEqual(config.default_hourly_rate, 80.0)
+        self.assertEqual(config.vendor_skonto_accounts, ('4730', '2670'))
+
+        ICP.set_param('project_analytics.default_hourly_rate', 'not a number')
+        self.assertEqual(ICP._get_project_analytics_config().default_hourly_rate, 66.0)
+
+    def test_17_profiler_instrumentation(self):
+        """Test that the profiler collects counters per phase and profiles are stored on demand"""
+        invoice = self.Invoice.create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Test Service',
+                'quantity': 1,
+                'price_unit': 1000.0,
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 100.0},
+            })],
+        })
+        invoice.action_post()
+
+        with AnalyticsProfiler(self.env.cr, 'test') as profiler:
+            self.project._compute_financial_data()
+        stats = profiler.as_dict()
+        self.assertEqual(stats['project_count'], 1)
+        self.assertGreaterEqual(stats['matched_lines'], 1)
+        self.assertIn('move_lines', stats['phases'])
+        self.assertIn('analytic_lines', stats['phases'])
+        self.assertIn('store', stats['phases'])
+
+        with AnalyticsProfiler(self.env.cr, 'test') as profiler:
+            self.project.with_context(project_analytics_engine='orm')._compute_financial_data()
+        self.assertTrue({'customer', 'vendor', 'skonto', 'timesheet', 'other_costs'} <= set(profiler.phase_times))
+        self.assertFalse(AnalyticsProfiler.current().active)
+
+        Profile = self.env['project.analytics.profile']
+        self.env['ir.config_parameter'].sudo().set_param('project_analytics.profiling_enabled', 'True')
+        profiles_before = Profile.search_count([])
+        self.project._compute_financial_data()
+        profile = Profile.search([], limit=1)
+        self.assertEqual(Profile.search_count([]), profiles_before + 1)
+        self.assertEqual(profile.operation, 'refresh')
+        self.assertEqual(profile.engine, 'sql')
+        self.assertEqual(profile.project_count, 1)
+
+    def test_18_date_range(self):
+        """Test that the context date range restricts all figures to the period"""
+        this_month = fields.Date.start_of(fields.Date.today(), 'month')
+        last_month = this_month - relativedelta(months=1)
+        self._create_posted_invoice(1000.0, last_month)
+        self._create_posted_invoice(500.0, this_month)
+
+        total = self.project._compute_financial_values()[self.project.id]
+        self.assertAlmostEqual(total['customer_invoiced_amount'], 1500.0, places=2)
+
+        for engine in ('sql', 'orm'):
+            period = self.project.with_context(
+                project_analytics_engine=engine,
+                project_analytics_date_from=this_month,
+            )._compute_financial_values()[self.project.id]
+            self.assertAlmostEqual(period['customer_invoiced_amount'], 500.0, places=2, msg=engine)
+
+        # Snapshots always hold the whole history
+        self.project.with_context(project_analytics_date_from=this_month)._compute_financial_data()
+        self.assertAlmostEqual(self.project.customer_invoiced_amount, 1500.0, places=2)
+
+        # Period figures summed from monthly buckets
+        Bucket = self.env['project.analytics.bucket']
+        period = Bucket._get_period_values(self.project, last_month, fields.Date.today())[self.project.id]
+        self.assertAlmostEqual(period['customer_invoiced_amount'], 1500.0, places=2)
+        self.assertEqual(Bucket.search_count([('project_id', '=', self.project.id)]), 2)
+        period = Bucket._get_period_values(self.project, this_month, this_month)[self.project.id]
+        self.assertAlmostEqual(period['customer_invoiced_amount'], 500.0, places=2)
+
+    def test_19_frozen_buckets(self):
+        """Test that closed months are frozen but keep payments and timesheets live"""
+        this_month = fields.Date.start_of(fields.Date.today(), 'month')
+        last_month = this_month - relativedelta(months=1)
+        invoice = self._create_posted_invoice(1000.0, last_month)
+
+        Bucket = self.env['project.analytics.bucket']
+        lock_date = this_month - relativedelta(days=1)
+        with patch.object(type(self.env.company), '_get_project_analytics_lock_date', lambda company: lock_date):
+            Bucket._refresh_buckets(self.project, last_month, this_month)
+            bucket = Bucket.search([('project_id', '=', self.project.id), ('month', '=', last_month)])
+            self.assertTrue(bucket.frozen)
+            self.assertAlmostEqual(bucket.customer_invoiced_amount, 1000.0, places=2)
+            self.assertAlmostEqual(bucket.customer_paid_amount, 0.0, places=2)
+
+            self.env['account.payment.register'].with_context(
+                active_model='account.move', active_ids=invoice.ids,
+            ).create({'payment_date': this_month})._create_payments()
+            self.AnalyticLine.create({
+                'name': 'Late timesheet',
+                'project_id': self.project.id,
+                'account_id': self.analytic_account.id,
+                'date': last_month,
+                'unit_amount': 4.0,
+            })
+
+            Bucket._refresh_buckets(self.project, last_month, this_month)
+            self.assertTrue(bucket.frozen)
+            self.assertAlmostEqual(bucket.customer_invoiced_amount, 1000.0, places=2)
+            self.assertAlmostEqual(bucket.customer_paid_amount, 1000.0, places=2)
+            self.assertAlmostEqual(bucket.customer_outstanding_amount, 0.0, places=2)
+            self.assertAlmostEqual(bucket.total_hours_booked, 4.0, places=2)
+
+            # A new distribution on a locked line unfreezes the month, the next refresh freezes it again
+            other_account = self.AnalyticAccount.create({
+                'name': 'Other Project Account',
+                'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+            })
+            invoice.invoice_line_ids.analytic_distribution = {str(other_account.id): 100.0}
+            self.assertFalse(bucket.frozen)
+            Bucket._refresh_buckets(self.project, last_month, this_month)
+            self.assertTrue(bucket.frozen)
+            self.assertAlmostEqual(bucket.customer_invoiced_amount, 0.0, places=2)
+
+            # So does a change of the Skonto configuration
+            frozen_at = bucket.frozen_at
+            with patch.object(type(self.env['project.analytics.baseline']), '_get_config_fingerprint',
+                              lambda baseline: 'changed'):
+                Bucket._refresh_buckets(self.project, last_month, this_month)
+            self.assertEqual(bucket.config_fingerprint, 'changed')
+            self.assertGreaterEqual(bucket.frozen_at, frozen_at)
+
+        # Without lock date the month is open again and recomputed from scratch
+        Bucket._refresh_buckets(self.project, last_month, this_month)
+        self.assertFalse(bucket.frozen)
+        self.assertAlmostEqual(bucket.customer_paid_amount, 0.0, places=2)
+
+    def test_20_frozen_baseline(self):
+        """Test that figures with a frozen baseline before the lock date equal a full scan"""
+        this_month = fields.Date.start_of(fields.Date.today(), 'month')
+        last_month = this_month - relativedelta(months=1)
+        lock_date = this_month - relativedelta(days=1)
+        paid_invoice = self._create_posted_invoice(1000.0, last_month)
+        reversed_invoice = self._create_posted_invoice(300.0, last_month)
+        self._create_posted_invoice(500.0, this_month)
+
+        def assert_matches_full_scan():
+            with_baseline = self.project._compute_financial_values()[self.project.id]
+            full_scan = self.project.with_context(
+                project_analytics_engine='orm'
+            )._compute_financial_values()[self.project.id]
+            for fname in ('customer_invoiced_amount', 'customer_paid_amount', 'vendor_bills_total', 'profit_loss'):
+                self.assertAlmostEqual(with_baseline[fname], full_scan[fname], places=2, msg=fname)
+            return with_baseline
+
+        Baseline = self.env['project.analytics.baseline']
+        with patch.object(type(self.env.company), '_get_project_analytics_lock_date', lambda company: lock_date):
+            values = assert_matches_full_scan()
+            self.assertAlmostEqual(values['customer_invoiced_amount'], 1800.0, places=2)
+            baseline = Baseline.search([('analytic_account_id', '=', self.analytic_account.id)])
+            self.assertEqual(len(baseline), 1)
+            self.assertEqual(baseline.lock_date, lock_date)
+            self.assertAlmostEqual(baseline.customer_invoiced_amount, 1300.0, places=2)
+
+            # Payment of a locked invoice and a reversal after the lock date stay live
+            self.env['account.payment.register'].with_context(
+                active_model='account.move', active_ids=paid_invoice.ids,
+            ).create({'payment_date': this_month})._create_payments()
+            reversal = reversed_invoice._reverse_moves([{'date': this_month, 'invoice_date': this_month}])
+            reversal.action_post()
+
+            values = assert_matches_full_scan()
+            self.assertAlmostEqual(values['customer_invoiced_amount'], 1500.0, places=2)
+            self.assertAlmostEqual(values['customer_paid_amount'], 1000.0, places=2)
+            self.assertEqual(Baseline.search_count([('analytic_account_id', '=', self.analytic_account.id)]), 1)
+            self.assertAlmostEqual(baseline.customer_invoiced_amount, 1300.0, places=2)
+
+            # A new distribution on a locked line drops the baseline, the next computation rebuilds it
+            other_account = self.AnalyticAccount.create({
+                'name': 'Other Project Account',
+                'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+            })
+            paid_invoice.invoice_line_ids.analytic_distribution = {str(other_account.id): 100.0}
+            self.assertFalse(baseline.exists())
+            values = assert_matches_full_scan()
+            self.assertAlmostEqual(values['customer_invoiced_amount'], 500.0, places=2)
+
+    def test_21_incremental_snapshot_update(self):
+        """Test that move line deltas keep the snapshot equal to a full recomputation"""
+        Snapshot = self.env['project.analytics.snapshot']
+        Queue = self.env['project.analytics.queue']
+        self.project._compute_financial_data()
+        snapshot = Snapshot.search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+
+        def assert_matches_full_recompute():
+            self.env.cr.precommit.run()
+            expected = self.project._compute_financial_values()[self.project.id]
+            for fname in ('customer_invoiced_amount', 'customer_paid_amount', 'customer_outstanding_amount',
+                          'vendor_bills_total', 'profit_loss', 'negative_difference'):
+                self.assertAlmostEqual(snapshot[fname], expected[fname], places=2, msg=fname)
+
+        invoice = self._create_posted_invoice(1000.0, fields.Date.today())
+        bill = self.Invoice.create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Split Cost',
+                'quantity': 1,
+                'price_unit': 1500.0,
+                'tax_ids': [(6, 0, [])],
+                'account_id': self.expense_account.id,
+                'analytic_distribution': {str(self.analytic_account.id): 50.0},
+            })],
+        })
+        bill.action_post()
+        assert_matches_full_recompute()
+        self.assertAlmostEqual(snapshot.customer_invoiced_amount, 1000.0, places=2)
+        self.assertAlmostEqual(snapshot.vendor_bills_total, 750.0, places=2)
+
+        # Changing the distribution of a posted line only applies its difference
+        bill.invoice_line_ids.analytic_distribution = {str(self.analytic_account.id): 100.0}
+        assert_matches_full_recompute()
+        self.assertAlmostEqual(snapshot.profit_loss, -500.0, places=2)
+
+        invoice.button_draft()
+        assert_matches_full_recompute()
+        self.assertAlmostEqual(snapshot.customer_invoiced_amount, 0.0, places=2)
+        self.assertFalse(Queue.search_count([('project_id', '=', self.project.id)]))
+
+        Snapshot._cron_reconcile_snapshots()
+        self.assertTrue(self.env['project.analytics.refresh.job'].search([
+            ('project_ids', 'in', self.project.ids), ('state', '=', 'pending'),
+        ]))
+
+    def test_22_payment_updates_paid_amount(self):
+        """Test that reconciling and unreconciling a payment only updates the paid figures"""
+        Queue = self.env['project.analytics.queue']
+        invoice = self._create_posted_invoice(1000.0, fields.Date.today())
+        self.project._compute_financial_data()
+        snapshot = self.env['project.analytics.snapshot'].search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+
+        payment = self.env['account.payment.register'].with_context(
+            active_model='account.move', active_ids=invoice.ids,
+        ).create({'amount': 400.0, 'payment_difference_handling': 'open'})._create_payments()
+        self.env.cr.precommit.run()
+        self.assertAlmostEqual(snapshot.customer_invoiced_amount, 1000.0, places=2)
+        self.assertAlmostEqual(snapshot.customer_paid_amount, 400.0, places=2)
+        self.assertAlmostEqual(snapshot.customer_outstanding_amount, 600.0, places=2)
+        self.assertFalse(Queue.search_count([('project_id', '=', self.project.id)]))
+
+        payment.move_id.line_ids.remove_move_reconcile()
+        self.env.cr.precommit.run()
+        self.assertAlmostEqual(snapshot.customer_paid_amount, 0.0, places=2)
+        self.assertAlmostEqual(snapshot.customer_outstanding_amount, 1000.0, places=2)
+
+    def test_23_background_refresh_job(self):
+        """Test that refresh jobs recompute in chunks and resume after an interruption"""
+        projects = self.project | self.Project.create([
+            {'name': 'Background Project %s' % index} for index in range(2)
+        ])
+        Job = self.env['project.analytics.refresh.job']
+        job = Job._create_job(projects, 80.0)
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.project_count, 3)
+
+        # First chunk only, as if the worker was killed afterwards
+        job._process_chunk(2)
+        self.assertEqual(job.state, 'running')
+        self.assertEqual(job.done_count, 2)
+
+        # Archiving a processed project does not skip the remaining ones
+        projects.sorted('id')[0].active = False
+        Job._cron_process_jobs(batch_size=2)
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.done_count, 3)
+        self.assertEqual(job.progress, 100.0)
+        self.assertEqual(self.env['project.analytics.snapshot'].search_count([
+            ('project_id', 'in', projects.ids),
+            ('company_id', '=', self.env.company.id),
+        ]), 3)
+
+    def test_24_partitioned_refresh(self):
+        """Test that partitions split projects by analytic account deterministically"""
+        accounts = self.AnalyticAccount.create([{
+            'name': 'Partition %s' % index,
+            'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+        } for index in range(4)])
+        projects = self.project | self.Project.create([
+            {'name': 'Partition Project %s' % index, 'analytic_account_id': account.id}
+            for index, account in enumerate(accounts)
+        ])
+        Job = self.env['project.analytics.refresh.job']
+
+        parts = Job._partition_projects(projects, 2)
+        self.assertEqual([len(part) for part, _range in parts], [3, 2])
+        self.assertEqual(sum((part for part, _range in parts), self.Project), projects)
+        self.assertLess(max(parts[0][0].analytic_account_id.ids), min(parts[1][0].analytic_account_id.ids))
+        self.assertEqual([part.ids for part, _range in Job._partition_projects(projects, 2)],
+                         [part.ids for part, _range in parts])
+
+        # Projects sharing an analytic account are never split across partitions
+        sharing = self.Project.create([
+            {'name': 'Shared Account Project %s' % index, 'analytic_account_id': accounts[1].id}
+            for index in range(3)
+        ])
+        for part, _range in Job._partition_projects(projects | sharing, 3):
+            self.assertTrue(not (part & sharing) or sharing <= part)
+
+        jobs = Job._create_job(projects, 70.0, partitions=2)
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(len(set(jobs.mapped('group_key'))), 1)
+        Job._cron_process_jobs()
+        self.assertEqual(set(jobs.mapped('state')), {'done'})
+        self.assertEqual(self.env['project.analytics.snapshot'].search_count([
+            ('project_id', 'in', projects.ids),
+            ('company_id', '=', self.env.company.id),
+        ]), 5)
+
+    def test_25_snapshot_ttl_and_dirty_projects(self):
+        """Test that expired and queued snapshots are recomputed on read, fresh ones are served"""
+        Snapshot = self.env['project.analytics.snapshot']
+        self.env['ir.config_parameter'].sudo().set_param('project_analytics.snapshot_ttl_minutes', '60')
+        self.project._compute_financial_data()
+        snapshot = Snapshot.search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+        self.assertEqual(self.project.financial_data_as_of, snapshot.last_computed)
+
+        two_hours_ago = fields.Datetime.subtract(fields.Datetime.now(), hours=2)
+        snapshot.write({'last_computed': two_hours_ago})
+        Snapshot._get_project_values(self.project)
+        self.assertGreater(snapshot.last_computed, two_hours_ago)
+
+        thirty_minutes_ago = fields.Datetime.subtract(fields.Datetime.now(), minutes=30)
+        snapshot.write({'last_computed': thirty_minutes_ago})
+        Snapshot._get_project_values(self.project)
+        self.assertEqual(snapshot.last_computed, thirty_minutes_ago)
+
+        Queue = self.env['project.analytics.queue']
+        Queue._enqueue(self.project.ids)
+        Snapshot._get_project_values(self.project)
+        self.assertGreater(snapshot.last_computed, thirty_minutes_ago)
+
+        # The recomputation takes the project out of the queue, the next read is served as stored
+        self.assertFalse(Queue.search_count([('project_id', '=', self.project.id)]))
+        with patch.object(type(Snapshot), '_refresh_projects') as refresh_projects:
+            Snapshot._get_project_values(self.project)
+        refresh_projects.assert_not_called()
+
+        snapshot.write({'last_computed': thirty_minutes_ago})
+        self.project.action_force_refresh_financial_data()
+        self.assertGreater(snapshot.last_computed, thirty_minutes_ago)
+
+    def test_26_analytic_line_cube(self):
+        """Test that the cube fast path equals the live query and changed accounts are read live"""
+        Cube = self.env['project.analytics.line.cube']
+        employee = self.env['hr.employee'].create({'name': 'Cube Employee', 'faktor_hfc': 1.5})
+        self.AnalyticLine.create([{
+            'name': 'Material',
+            'account_id': self.analytic_account.id,
+            'amount': -120.0,
+        }, {
+            'name': 'Work',
+            'account_id': self.analytic_account.id,
+            'employee_id': employee.id,
+            'project_id': self.project.id,
+            'unit_amount': 4.0,
+            'amount': -200.0,
+        }])
+        live = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+
+        Cube._refresh_cube()
+        self.assertTrue(Cube._is_populated())
+        self.assertFalse(Cube._get_dirty_account_ids(self.analytic_account.ids))
+        from_cube = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        for key, value in live.items():
+            self.assertAlmostEqual(from_cube[key], value, places=2, msg=key)
+
+        # Changes after the refresh are never served from the stale cube
+        self.AnalyticLine.create({
+            'name': 'More Material',
+            'account_id': self.analytic_account.id,
+            'amount': -80.0,
+        })
+        employee.faktor_hfc = 2.0
+        self.assertEqual(Cube._get_dirty_account_ids(self.analytic_account.ids), {self.analytic_account.id})
+        totals = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        self.assertAlmostEqual(totals['other_costs'], live['other_costs'] + 80.0, places=2)
+        self.assertAlmostEqual(totals['hours_adjusted'], 8.0, places=2)
+
+        Cube._refresh_cube()
+        refreshed = self.project._get_analytic_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        for key, value in totals.items():
+            self.assertAlmostEqual(refreshed[key], value, places=2, msg=key)
+
+    def test_27_reversal_move_ids(self):
+        """Test that reversed entries and their reversals are skipped via one precomputed set"""
+        kept = self._create_posted_invoice(200.0, fields.Date.today())
+        reversed_invoice = self._create_posted_invoice(300.0, fields.Date.today())
+        reversal = reversed_invoice._reverse_moves([{'date': fields.Date.today()}])
+        reversal.action_post()
+
+        moves = kept | reversed_invoice | reversal
+        self.assertEqual(self.Project._get_reversal_move_ids(moves.ids), set((reversed_invoice | reversal).ids))
+
+        orm_project = self.project.with_context(project_analytics_engine='orm')
+        orm_totals = orm_project._get_customer_invoices_from_analytic(self.analytic_account)
+        sql_totals = self.project._get_move_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        self.assertAlmostEqual(orm_totals['invoiced'], 200.0, places=2)
+        self.assertAlmostEqual(sql_totals['invoiced'], orm_totals['invoiced'], places=2)
+
+    def test_28_payment_ratio_shared_across_projects(self):
+        """Test that one payment ratio per invoice serves every project it is split across"""
+        accounts = self.analytic_account | self.AnalyticAccount.create([{
+            'name': 'Split %s' % index,
+            'plan_id': self.env.ref('analytic.analytic_plan_projects').id,
+        } for index in range(2)])
+        invoice = self.Invoice.create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'name': 'Shared Work %s' % index,
+                'quantity': 1,
+                'price_unit': 600.0,
+                'tax_ids': [(6, 0, [])],
+                'account_id': self.income_account.id,
+                'analytic_distribution': {str(account.id): 100.0 / len(accounts) for account in accounts},
+            }) for index in range(2)],
+        })
+        invoice.action_post()
+        self.env['account.payment.register'].with_context(
+            active_model='account.move', active_ids=invoice.ids,
+        ).create({'amount': 300.0, 'payment_difference_handling': 'open'})._create_payments()
+
+        self.assertAlmostEqual(self.Project._get_payment_ratios(invoice.ids)[invoice.id], 0.25, places=4)
+        orm_totals = self.Project._get_customer_invoices_batch(accounts)
+        sql_totals = self.Project._get_move_line_totals_sql(accounts)
+        for account in accounts:
+            self.assertAlmostEqual(orm_totals[account.id]['invoiced'], 400.0, places=2)
+            self.assertAlmostEqual(orm_totals[account.id]['paid'], 100.0, places=2)
+            self.assertAlmostEqual(sql_totals[account.id]['paid'], orm_totals[account.id]['paid'], places=2)
+
+    def test_29_analytics_indexes(self):
+        """Test that the module indexes exist and the SQL engine filters with the GIN-supported operator"""
+        for index_name, (table, _expressions, _method, _where, columns) in ANALYTICS_INDEXES.items():
+            if all(sql.column_exists(self.env.cr, table, column) for column in columns):
+                self.assertTrue(sql.index_exists(self.env.cr, index_name), index_name)
+
+        self._create_posted_invoice(250.0, fields.Date.today())
+        totals = self.project._get_move_line_totals_sql(self.analytic_account)[self.analytic_account.id]
+        self.assertAlmostEqual(totals['invoiced'], 250.0, places=2)
+
+    def test_30_streaming_export(self):
+        """Test that the export streams one row per project, or per project and month with a period"""
+        today = fields.Date.today()
+        self._create_posted_invoice(250.0, today)
+        other_project = self.Project.create({'name': 'Project Without Figures'})
+        wizard = self.env['project.analytics.export.wizard'].with_context(
+            active_model='project.project', active_ids=[self.project.id, other_project.id],
+        ).create({'file_format': 'csv'})
+
+        rows = list(csv.reader(io.StringIO(b''.join(wizard._iter_export()).decode())))
+        self.assertEqual(len(rows), 3)
+        invoiced_column = 3 + FINANCIAL_FIELDS.index('customer_invoiced_amount')
+        row_by_project = {row[0]: row for row in rows[1:]}
+        self.assertAlmostEqual(float(row_by_project[self.project.name][invoiced_column]), 250.0, places=2)
+        self.assertAlmostEqual(float(row_by_project[other_project.name][invoiced_column]), 0.0, places=2)
+
+        # With a period: one row per project and month with figures, read in chunks
+        rows = list(self.Project.browse([self.project.id, other_project.id])._iter_analytics_export_rows(
+            today, today, chunk_size=1))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], fields.Date.to_string(fields.Date.start_of(today, 'month')))
+        self.assertAlmostEqual(rows[1][4 + FINANCIAL_FIELDS.index('customer_invoiced_amount')], 250.0, places=2)
+
+        wizard.file_format = 'xlsx'
+        self.assertEqual(b''.join(wizard._iter_export())[:2], b'PK')
+
+    def test_31_contributions(self):
+        """Test that the stored contributions add up to the figures and follow posting and payments"""
+        Contribution = self.env['project.analytics.contribution']
+        invoice = self._create_posted_invoice(1000.0, fields.Date.today())
+        self.project._compute_financial_data()
+
+        contributions = Contribution.search([('project_id', '=', self.project.id)])
+        self.assertEqual(contributions.move_id, invoice)
+        self.assertEqual(set(contributions.mapped('kind')), {'invoice'})
+        self.assertAlmostEqual(sum(contributions.mapped('amount')), self.project.customer_invoiced_amount, places=2)
+        self.assertEqual(self.project.analytics_contribution_ids, contributions)
+
+        # Payments update the paid share of the lines
+        self.env['account.payment.register'].with_context(
+            active_model='account.move', active_ids=invoice.ids,
+        ).create({'amount': 250.0, 'payment_difference_handling': 'open'})._create_payments()
+        contributions = Contribution.search([('project_id', '=', self.project.id)])
+        self.assertAlmostEqual(sum(contributions.mapped('paid_amount')), 250.0, places=2)
+
+        # Reset to draft removes them, posting again brings them back
+        invoice.button_draft()
+        self.assertFalse(Contribution.search_count([('project_id', '=', self.project.id)]))
+        invoice.action_post()
+        self.assertAlmostEqual(
+            sum(Contribution.search([('project_id', '=', self.project.id)]).mapped('amount')), 1000.0, places=2)
+
+        # Only forced refreshes rebuild them from the whole history
+        Contribution.search([('project_id', '=', self.project.id)]).unlink()
+        self.env['project.analytics.snapshot']._refresh_projects(self.project)
+        self.assertFalse(Contribution.search_count([('project_id', '=', self.project.id)]))
+        self.project.action_force_refresh_financial_data()
+        self.assertAlmostEqual(
+            sum(Contribution.search([('project_id', '=', self.project.id)]).mapped('amount')), 1000.0, places=2)
+
+    def test_32_recompute_drops_pending_deltas(self):
+        """Test that a change is counted once when its snapshot is recomputed in the same transaction"""
+        self.project._compute_financial_data()
+        snapshot = self.env['project.analytics.snapshot'].search([
+            ('project_id', '=', self.project.id),
+            ('company_id', '=', self.env.company.id),
+        ])
+
+        self._create_posted_invoice(1000.0, fields.Date.today())
+        self.project.action_force_refresh_financial_data()
+        self.env.cr.precommit.run()
+        self.assertAlmostEqual(snapshot.customer_invoiced_amount, 1000.0, places=2)
+        self.assertAlmostEqual(snapshot.customer_outstanding_amount, 1000.0, places=2)
+
+    def test_33_reversal_removes_contributions(self):
+        """Test that posting a credit note reversing an invoice removes the invoice's contributions"""
+        Contribution = self.env['project.analytics.contribution']
+        invoice = self._create_posted_invoice(500.0, fields.Date.today())
+        self.assertTrue(Contribution.search_count([('move_id', '=', invoice.id)]))
+
+        reversal = invoice._reverse_moves([{'date': fields.Date.today()}])
+        reversal.action_post()
+        self.assertFalse(Contribution.search_count([('move_id', 'in', (invoice | reversal).ids)]))
+
+        # Resetting the reversal brings the invoice back
+        reversal.button_draft()
+        self.assertTrue(Contribution.search_count([('move_id', '=', invoice.id)]))
+
+    def test_34_period_refresh_job(self):
+        """Test that large period selections refresh the monthly buckets in a background job"""
+        self.env['ir.config_parameter'].sudo().set_param('project_analytics.queue_batch_size', '1')
+        self._create_posted_invoice(1000.0, fields.Date.today())
+        projects = self.project | self.Project.create({'name': 'Period Job Project'})
+        this_month = fields.Date.start_of(fields.Date.today(), 'month')
+
+        Bucket = self.env['project.analytics.bucket']
+        wizard = self.env['project.refresh.wizard'].with_context(
+            active_model='project.project', active_ids=projects.ids,
+        ).create({'hourly_rate': 80.0, 'date_from': this_month})
+        with patch.object(type(Bucket), '_refresh_buckets') as refresh_buckets:
+            action = wizard.action_refresh_financial_data()
+        refresh_buckets.assert_not_called()
+        self.assertEqual(action['tag'], 'display_notification')
+
+        job = self.env['project.analytics.refresh.job'].search([('project_ids', 'in', self.project.ids)], limit=1)
+        self.assertEqual(job.date_from, this_month)
+        self.assertEqual(job.date_to, fields.Date.end_of(fields.Date.today(), 'month'))
+        self.env['project.analytics.refresh.job']._cron_process_jobs()
+        self.assertEqual(job.state, 'done')
+        bucket = Bucket.search([('project_id', '=', self.project.id), ('month', '=', this_month)])
+        self.assertAlmostEqual(bucket.customer_invoiced_amount, 1000.0, places=2)
@@ -1 +1,2 @@
 from . import project_refresh_wizard
+from . import project_analytics_export_wizard
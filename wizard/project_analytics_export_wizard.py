@@ -0,0 +1,82 @@
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+from ..models.analytics_export import EXPORT_FORMATS, iter_csv, iter_xlsx
+
+
+class ProjectAnalyticsExportWizard(models.TransientModel):
+    _name = 'project.analytics.export.wizard'
+    _description = 'Project Financial Data Export Wizard'
+
+    def _default_project_ids(self):
+        active_ids = self.env.context.get('active_ids', [])
+        if self.env.context.get('active_model') == 'project.analytics.snapshot':
+            return self.env['project.analytics.snapshot'].browse(active_ids).project_id
+        if self.env.context.get('active_model') == 'project.project':
+            return self.env['project.project'].browse(active_ids)
+        return self.env['project.project']
+
+    project_ids = fields.Many2many(
+        'project.project',
+        string='Projekte',
+        default=_default_project_ids,
+        help='Projects to export. Leave empty to export all projects.'
+    )
+    file_format = fields.Selection(
+        [('xlsx', 'Excel (XLSX)'), ('csv', 'CSV')],
+        string='Format',
+        required=True,
+        default='xlsx',
+    )
+    hourly_rate = fields.Float(
+        string='Stundensatz (€)',
+        default=lambda self: self.env['ir.config_parameter']._get_project_analytics_config().default_hourly_rate,
+        required=True,
+        help='Hourly rate for the adjusted labor costs of the monthly figures.'
+    )
+    date_from = fields.Date(
+        string='Von',
+        help='Optional start of the period. With a period one row per project and month is exported instead of the overall totals.'
+    )
+    date_to = fields.Date(
+        string='Bis',
+        help='Optional end of the period (defaults to today). The period is extended to whole months.'
+    )
+
+    def action_export(self):
+        """
+        Download the export. The file is generated by the export controller while it
+        is sent, see _iter_export().
+        """
+        self.ensure_one()
+        if self.date_from and self.date_from > (self.date_to or fields.Date.context_today(self)):
+            raise UserError(_("The start of the period must be before its end."))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/project_statistic/export/{self.id}',
+            'target': 'self',
+        }
+
+    def _get_export_filename(self):
+        self.ensure_one()
+        extension = EXPORT_FORMATS[self.file_format][1]
+        return f'Projektstatistik_{fields.Date.context_today(self)}.{extension}'
+
+    def _iter_export(self):
+        """
+        The export file as byte blocks, written while the rows are computed.
+
+        Yields:
+            bytes
+        """
+        self.ensure_one()
+        projects = self.project_ids or self.env['project.project'].search([])
+        projects = projects.with_context(
+            custom_hourly_rate=self.hourly_rate,
+            project_analytics_operation='export',
+        )
+        date_to = self.date_from and (self.date_to or fields.Date.context_today(self))
+        rows = projects._iter_analytics_export_rows(self.date_from, date_to)
+        if self.file_format == 'xlsx':
+            return iter_xlsx(rows, 'Projektstatistik')
+        return iter_csv(rows)
@@ -1,4 +1,5 @@
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
 
 
 class ProjectRefreshWizard(models.TransientModel):
@@ -7,27 +8,57 @@ class ProjectRefreshWizard(models.TransientModel):
 
     hourly_rate = fields.Float(
         string='Stundensatz (€)',
-        default=lambda self: float(self.env['ir.config_parameter'].sudo().get_param(
-            'project_analytics.default_hourly_rate', '66.0'
-        )),
+        default=lambda self: self.env['ir.config_parameter']._get_project_analytics_config().default_hourly_rate,
         required=True,
         help='Hourly rate for calculating adjusted labor costs (Labor Costs Bereinigt).'
     )
+    date_from = fields.Date(
+        string='Von',
+        help='Optional start of the period. With a period the monthly figures are refreshed and shown instead of the overall totals.'
+    )
+    date_to = fields.Date(
+        string='Bis',
+        help='Optional end of the period (defaults to today). The period is extended to whole months.'
+    )
 
     def action_refresh_financial_data(self):
         """
         Refresh financial data for selected projects with the specified hourly rate.
+        Selections larger than one queue batch are handed to a background
+        project.analytics.refresh.job so the request never blocks a worker.
         """
         self.ensure_one()
 
-        # Get active project IDs from context
-        active_ids = self.env.context.get('active_ids', [])
-        if not active_ids:
+        projects = self._get_active_projects()
+        if not projects:
             return {'type': 'ir.actions.act_window_close'}
 
+        if self.date_from:
+            return self._action_open_period_analysis(projects)
+
+        # Larger selections are recomputed in the background, chunk by chunk
+        batch_size = self.env['ir.config_parameter']._get_project_analytics_config().queue_batch_size
+        if len(projects) > batch_size:
+            self.env['project.analytics.refresh.job']._create_job(projects, self.hourly_rate)
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Financial Data Refresh Started'),
+                    'message': _('Financial data of %s project(s) is recalculated in the background. '
+                                 'You will be notified when it is done.', len(projects)),
+                    'type': 'info',
+                    'sticky': False,
+                    'next': {'type': 'ir.actions.act_window_close'},
+                }
+            }
+
         # Store the hourly rate in context for use in computation
-        projects = self.env['project.project'].browse(active_ids)
-        projects = projects.with_context(custom_hourly_rate=self.hourly_rate)
+        projects = projects.with_context(
+            custom_hourly_rate=self.hourly_rate,
+            project_analytics_operation='wizard',
+            project_analytics_rebuild_contributions=True,
+        )
 
         # Trigger recomputation
         projects._compute_financial_data()
@@ -42,3 +73,50 @@ class ProjectRefreshWizard(models.TransientModel):
                 'sticky': False,
             }
         }
+
+    def _action_open_period_analysis(self, projects):
+        """
+        Refresh the monthly buckets of the selected period and open them.
+        Closed (frozen) months are not rescanned. Like the overall refresh,
+        selections larger than one queue batch are refreshed by a background job.
+        """
+        date_to = self.date_to or fields.Date.context_today(self)
+        if self.date_from > date_to:
+            raise UserError(_("The start of the period must be before its end."))
+
+        batch_size = self.env['ir.config_parameter']._get_project_analytics_config().queue_batch_size
+        if len(projects) > batch_size:
+            self.env['project.analytics.refresh.job']._create_job(
+                projects, self.hourly_rate,
+                date_from=fields.Date.start_of(self.date_from, 'month'),
+                date_to=fields.Date.end_of(date_to, 'month'),
+            )
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Financial Data Refresh Started'),
+                    'message': _('Monthly figures of %s project(s) are recalculated in the background. '
+                                 'You will be notified when they are available in Projekt Statistik → Nach Monat.',
+                                 len(projects)),
+                    'type': 'info',
+                    'sticky': False,
+                    'next': {'type': 'ir.actions.act_window_close'},
+                }
+            }
+
+        Bucket = self.env['project.analytics.bucket'].with_context(
+            custom_hourly_rate=self.hourly_rate,
+            project_analytics_operation='wizard_period',
+        )
+        return Bucket.action_open_period_analysis(projects, self.date_from, date_to)
+
+    def _get_active_projects(self):
+        """
+        Get the selected projects from context.
+        The wizard is opened from project records and from the dashboard snapshots.
+        """
+        active_ids = self.env.context.get('active_ids', [])
+        if self.env.context.get('active_model') == 'project.analytics.snapshot':
+            return self.env['project.analytics.snapshot'].browse(active_ids).project_id
+        return self.env['project.project'].browse(active_ids)